@@ -121,6 +121,17 @@ aws cloudformation deploy \
 
 echo -e "${GREEN}✅ Lambda functions deployed${NC}"
 
+# Conversations stored before head items existed need one to appear in the sidebar (safe to rerun)
+echo -e "${YELLOW}🗂️  Backfilling conversation heads...${NC}"
+aws lambda invoke \
+  --function-name "${STACK_NAME_PREFIX}-lambda-conversation" \
+  --payload '{"action": "backfill_heads"}' \
+  --cli-binary-format raw-in-base64-out \
+  --region $REGION \
+  /tmp/backfill-heads.json > /dev/null \
+  && echo -e "${GREEN}✅ Conversation heads: $(cat /tmp/backfill-heads.json)${NC}" \
+  || echo -e "${RED}⚠️  Head backfill failed; rerun it with --payload '{\"action\": \"backfill_heads\"}'${NC}"
+
 # 6. Deploy API Gateway with Authentication
 echo -e "${YELLOW}📦 Step 6/9: Deploying API Gateway with Authentication...${NC}"
 aws cloudformation deploy \
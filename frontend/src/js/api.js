@@ -7,6 +7,13 @@ class ApiService {
         // API Gateway URL - to be replaced during deployment
         this.apiUrl = 'YOUR_API_GATEWAY_URL';
         this.token = null;
+        // IndexedDB cache of conversation history, keyed by the signed-in user
+        this.cacheUser = null;
+        this.historyCachePromise = null;
+        // Transient query failures are retried with the same Idempotency-Key
+        this.queryRetries = 2;
+        // Queued queries (202) are polled for this long before giving up
+        this.jobTimeoutMs = 5 * 60 * 1000;
     }
 
     /**
@@ -30,6 +37,7 @@ class ApiService {
                         exp: payload.exp,
                         iss: payload.iss
                     });
+                    this.cacheUser = payload.email || payload['cognito:username'] || payload.sub || null;
                     
                     // Check if token is expired
                     const now = Math.floor(Date.now() / 1000);
@@ -49,6 +57,7 @@ class ApiService {
     clearToken() {
         console.log('🔐 DEBUG: Clearing token');
         this.token = null;
+        this.cacheUser = null;
     }
 
     /**
@@ -79,6 +88,64 @@ class ApiService {
      * @returns {Promise} Promise with API response
      */
     async sendQuery(query, conversationId = null) {
+        // One key per question: a retry replays the first answer instead of asking again
+        const idempotencyKey = (window.crypto && crypto.randomUUID)
+            ? crypto.randomUUID()
+            : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+        
+        for (let attempt = 0; ; attempt++) {
+            try {
+                return await this.postQuery(query, conversationId, idempotencyKey);
+            } catch (error) {
+                if (!error.retryable || attempt >= this.queryRetries) {
+                    throw error;
+                }
+                const delayMs = (error.retryAfter || 2 ** attempt) * 1000;
+                console.warn(`🔁 DEBUG: Retrying query in ${delayMs}ms (attempt ${attempt + 1})`);
+                await new Promise(resolve => setTimeout(resolve, delayMs));
+            }
+        }
+    }
+
+    /**
+     * Poll a queued query until its answer is ready
+     * @param {string} jobId - Job ID from the 202 response
+     * @param {number} pollAfterSeconds - Suggested polling interval
+     * @returns {Promise} Promise with the same body a direct answer would have
+     */
+    async waitForJob(jobId, pollAfterSeconds = 2) {
+        const deadline = Date.now() + this.jobTimeoutMs;
+        console.log('⏳ DEBUG: Query queued as job:', jobId);
+        
+        while (Date.now() < deadline) {
+            await new Promise(resolve => setTimeout(resolve, pollAfterSeconds * 1000));
+            
+            const response = await fetch(`${this.apiUrl}/jobs/${encodeURIComponent(jobId)}`, {
+                method: 'GET',
+                headers: this.getHeaders(),
+                cache: 'no-store'
+            });
+            if (!response.ok) {
+                throw new Error(`Failed to check on the queued question: ${response.status}`);
+            }
+            
+            const job = await response.json();
+            if (job.status === 'done') {
+                return job.result;
+            }
+            if (job.status === 'failed') {
+                throw new Error((job.result && job.result.error) || 'The queued question could not be answered.');
+            }
+            pollAfterSeconds = job.poll_after_seconds || pollAfterSeconds;
+        }
+        
+        throw new Error('The service is busy and your question is still queued. Please try again shortly.');
+    }
+
+    /**
+     * POST one query attempt; errors worth retrying are marked `retryable`
+     */
+    async postQuery(query, conversationId, idempotencyKey) {
         try {
             console.log('📤 DEBUG: Sending query:', { 
                 query, 
@@ -88,6 +155,7 @@ class ApiService {
             });
             
             const headers = this.getHeaders();
+            headers['Idempotency-Key'] = idempotencyKey;
             const body = JSON.stringify({ 
                 query,
                 conversation_id: conversationId 
@@ -133,12 +201,24 @@ class ApiService {
                     throw new Error(errorData.error || 'Internal server error occurred. Please try again.');
                 } else if (response.status === 400) {
                     throw new Error(errorData.error || 'Invalid request. Please check your input.');
+                } else if (response.status === 409 || response.status === 502 || response.status === 504) {
+                    // Still processing, or the gateway gave up on a slow answer: safe to retry with the same key
+                    const error = new Error(errorData.error || errorData.message || 'The request timed out. Please try again.');
+                    error.retryable = true;
+                    error.retryAfter = parseInt(response.headers.get('Retry-After'), 10) || null;
+                    throw error;
                 } else {
                     throw new Error(errorData.error || `API request failed: ${response.statusText}`);
                 }
             }
             
-            const data = await response.json();
+            let data = await response.json();
+            
+            // 202: the endpoint is saturated and the query was queued; wait for the job instead
+            if (response.status === 202 && data.job_id) {
+                data = await this.waitForJob(data.job_id, data.poll_after_seconds);
+            }
+            
             console.log('📥 DEBUG: API Response preview:', {
                 hasResponse: !!data.response,
                 concept: data.concept,
@@ -158,7 +238,9 @@ class ApiService {
             
             // Handle network errors
             if (error.name === 'TypeError' && error.message.includes('fetch')) {
-                throw new Error('Unable to connect to the server. Please check your internet connection and try again.');
+                const networkError = new Error('Unable to connect to the server. Please check your internet connection and try again.');
+                networkError.retryable = true;
+                throw networkError;
             }
             
             // Re-throw other errors as-is
@@ -199,20 +281,32 @@ class ApiService {
         }
     }
 
-        /**
+    /**
      * Get conversation history from DynamoDB
      * @param {string} conversationId - Optional specific conversation ID
-     * @returns {Promise} Promise with conversation history
+     * @param {Object} options - Optional view ('full' or 'summary'), limit, cursor,
+     *                           since (synced_at of an earlier response) and etag (its version)
+     * @returns {Promise} Promise with conversation history and next_cursor, or
+     *                    { notModified: true } when the server answered 304
      */
-    async getConversationHistory(conversationId = null) {
+    async getConversationHistory(conversationId = null, options = {}) {
         try {
             console.log('📤 DEBUG: Getting conversation history from DynamoDB:', { 
                 conversationId,
+                view: options.view || 'full',
+                hasCursor: !!options.cursor,
                 hasToken: !!this.token 
             });
             
             const headers = this.getHeaders();
-            const params = conversationId ? `?conversation_id=${conversationId}` : '';
+            const searchParams = new URLSearchParams();
+            if (conversationId) searchParams.set('conversation_id', conversationId);
+            if (options.view) searchParams.set('view', options.view);
+            if (options.limit) searchParams.set('limit', options.limit);
+            if (options.cursor) searchParams.set('cursor', options.cursor);
+            if (options.since !== undefined && options.since !== null) searchParams.set('since', options.since);
+            if (options.etag) headers['If-None-Match'] = options.etag;
+            const params = searchParams.toString() ? `?${searchParams.toString()}` : '';
             
             console.log('📤 DEBUG: Request details:', {
                 url: `${this.apiUrl}/conversation${params}`,
@@ -220,9 +314,11 @@ class ApiService {
                 headers: headers
             });
             
+            // The IndexedDB cache does the revalidation; keep the browser cache out of it
             const response = await fetch(`${this.apiUrl}/conversation${params}`, {
                 method: 'GET',
-                headers: headers
+                headers: headers,
+                cache: 'no-store'
             });
             
             console.log('📥 DEBUG: Conversation history response:', {
@@ -230,6 +326,10 @@ class ApiService {
                 statusText: response.statusText
             });
             
+            if (response.status === 304) {
+                return { notModified: true, version: options.etag };
+            }
+            
             if (!response.ok) {
                 let errorData;
                 try {
@@ -250,7 +350,8 @@ class ApiService {
             const data = await response.json();
             console.log('📥 DEBUG: Conversation data preview:', {
                 hasConversations: !!data.conversations,
-                conversationCount: data.conversations ? data.conversations.length : 0
+                conversationCount: data.conversations ? data.conversations.length : 0,
+                hasMore: !!data.next_cursor
             });
             
             return data;
@@ -267,75 +368,196 @@ class ApiService {
         }
     }
 
+
     /**
-     * Get conversation history from DynamoDB
-     * @param {string} conversationId - Optional specific conversation ID
-     * @returns {Promise} Promise with conversation history
+     * Get all conversation summaries, syncing only what changed since the cached copy
+     * @param {boolean} fullResync - Ignore the cached copy and fetch every summary
+     * @returns {Promise} Promise with summaries (newest first) and notModified
      */
-    async getConversationHistory(conversationId = null) {
-        try {
-            console.log('📤 DEBUG: Getting conversation history from DynamoDB:', { 
-                conversationId,
-                hasToken: !!this.token 
-            });
-            
-            const headers = this.getHeaders();
-            const params = conversationId ? `?conversation_id=${conversationId}` : '';
-            
-            console.log('📤 DEBUG: Request details:', {
-                url: `${this.apiUrl}/conversation${params}`,
-                method: 'GET',
-                headers: headers
-            });
-            
-            const response = await fetch(`${this.apiUrl}/conversation${params}`, {
-                method: 'GET',
-                headers: headers
+    async syncConversationSummaries(fullResync = false) {
+        const cacheKey = this.cacheUser || 'anonymous';
+        const cached = fullResync ? null : await this.readHistoryCache('summaries', cacheKey);
+        
+        const delta = await this.getConversationHistory(null, {
+            view: 'summary',
+            since: cached ? cached.syncedAt : '',
+            etag: cached ? cached.version : null
+        });
+        if (delta.notModified) {
+            console.log('📦 DEBUG: Conversation summaries unchanged, using cache');
+            return { conversations: cached.summaries, notModified: true };
+        }
+        
+        // Newer summaries replace cached ones; conversations that expired on the server are dropped
+        const byId = {};
+        (cached ? cached.summaries : []).forEach(summary => { byId[summary.conversation_id] = summary; });
+        (delta.conversations || []).forEach(summary => { byId[summary.conversation_id] = summary; });
+        const live = new Set(delta.conversation_ids || Object.keys(byId));
+        if (cached && [...live].some(id => !byId[id])) {
+            // A conversation older than the cache appeared (e.g. its head was backfilled): fetch everything again
+            console.log('📦 DEBUG: Unknown conversations in summary delta, resyncing');
+            return this.syncConversationSummaries(true);
+        }
+        const summaries = Object.values(byId)
+            .filter(summary => live.has(summary.conversation_id))
+            .sort((a, b) => (b.updated_at || '').localeCompare(a.updated_at || ''));
+        
+        console.log('📦 DEBUG: Synced conversation summaries:', {
+            changed: (delta.conversations || []).length,
+            total: summaries.length
+        });
+        await this.writeHistoryCache('summaries', cacheKey, {
+            summaries,
+            version: delta.version,
+            syncedAt: delta.synced_at || ''
+        });
+        return { conversations: summaries, notModified: false };
+    }
+
+    /**
+     * Get every interaction of one conversation, fetching only turns newer than the cached copy
+     * @param {string} conversationId - Conversation ID to load
+     * @returns {Promise<Array>} Promise with conversation items, oldest first
+     */
+    async getConversationMessages(conversationId) {
+        const cacheKey = `${this.cacheUser || 'anonymous'}|${conversationId}`;
+        const cached = await this.readHistoryCache('messages', cacheKey);
+        
+        let page = await this.getConversationHistory(conversationId, {
+            since: cached ? cached.syncedAt : '',
+            etag: cached ? cached.version : null
+        });
+        if (page.notModified) {
+            return cached.items;
+        }
+        
+        const { version, synced_at: syncedAt } = page;
+        const items = cached ? cached.items.slice() : [];
+        const known = new Set(items.map(item => item.conversation_id));
+        
+        while (true) {
+            (page.conversations || []).forEach(item => {
+                if (!known.has(item.conversation_id)) {
+                    known.add(item.conversation_id);
+                    items.push(item);
+                }
             });
-            
-            console.log('📥 DEBUG: Conversation history response:', {
-                status: response.status,
-                statusText: response.statusText
+            if (!page.next_cursor) break;
+            page = await this.getConversationHistory(conversationId, { cursor: page.next_cursor });
+        }
+        
+        items.sort((a, b) => (a.timestamp || '').localeCompare(b.timestamp || ''));
+        await this.writeHistoryCache('messages', cacheKey, { items, version, syncedAt: syncedAt || '' });
+        return items;
+    }
+
+    /**
+     * Open the IndexedDB database holding cached conversation history (once)
+     * @returns {Promise<IDBDatabase|null>} Database, or null where IndexedDB is unavailable
+     */
+    openHistoryCache() {
+        if (!this.historyCachePromise) {
+            this.historyCachePromise = new Promise(resolve => {
+                if (!window.indexedDB) {
+                    resolve(null);
+                    return;
+                }
+                const request = window.indexedDB.open('techTranslatorHistory', 1);
+                request.onupgradeneeded = () => {
+                    request.result.createObjectStore('summaries');
+                    request.result.createObjectStore('messages');
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => {
+                    console.warn('⚠️ DEBUG: IndexedDB unavailable, history will not be cached:', request.error);
+                    resolve(null);
+                };
             });
-            
-            if (!response.ok) {
-                let errorData;
-                try {
-                    errorData = await response.json();
-                } catch (e) {
-                    errorData = { error: `Request failed with status ${response.status}` };
+        }
+        return this.historyCachePromise;
+    }
+
+    /**
+     * Read one cached history record
+     * @param {string} storeName - 'summaries' or 'messages'
+     * @param {string} key - Record key
+     * @returns {Promise<Object|null>} Cached record or null
+     */
+    async readHistoryCache(storeName, key) {
+        const db = await this.openHistoryCache();
+        if (!db) return null;
+        
+        return new Promise(resolve => {
+            const request = db.transaction(storeName, 'readonly').objectStore(storeName).get(key);
+            request.onsuccess = () => resolve(request.result || null);
+            request.onerror = () => resolve(null);
+        });
+    }
+
+    /**
+     * Write one cached history record; failures only cost a full reload later
+     * @param {string} storeName - 'summaries' or 'messages'
+     * @param {string} key - Record key
+     * @param {Object} value - Record to store
+     * @returns {Promise} Resolves when the write has finished
+     */
+    async writeHistoryCache(storeName, key, value) {
+        const db = await this.openHistoryCache();
+        if (!db) return;
+        
+        return new Promise(resolve => {
+            const transaction = db.transaction(storeName, 'readwrite');
+            transaction.objectStore(storeName).put(value, key);
+            transaction.oncomplete = () => resolve();
+            transaction.onerror = () => {
+                console.warn('⚠️ DEBUG: Could not cache conversation history:', transaction.error);
+                resolve();
+            };
+        });
+    }
+
+    /**
+     * Convert conversation summaries to chat sessions whose messages load lazily
+     * @param {Array} summaries - Summary records from the summary view
+     * @returns {Object} Chat sessions object
+     */
+    convertSummariesToChats(summaries) {
+        const chatSessions = {};
+        
+        summaries.forEach(summary => {
+            const existing = chatSessions[summary.conversation_id];
+            
+            // A conversation split across two pages arrives as two partial summaries
+            if (existing) {
+                existing.turnCount += summary.turn_count;
+                if (summary.created_at < existing.createdAt) {
+                    existing.createdAt = summary.created_at;
+                    existing.title = summary.title || existing.title;
                 }
-                
-                console.error('❌ DEBUG: Conversation API Error:', errorData);
-                
-                if (response.status === 401) {
-                    throw new Error('Authentication failed. Please log in again.');
-                } else {
-                    throw new Error(errorData.error || `Failed to load conversation history: ${response.statusText}`);
+                if (summary.updated_at > existing.updatedAt) {
+                    existing.updatedAt = summary.updated_at;
+                    existing.concept = summary.concept || existing.concept;
+                    existing.audience = summary.audience || existing.audience;
                 }
+                return;
             }
             
-            const data = await response.json();
-            console.log('📥 DEBUG: Conversation data preview:', {
-                hasConversations: !!data.conversations,
-                conversationCount: data.conversations ? data.conversations.length : 0
-            });
-            
-            return data;
-            
-        } catch (error) {
-            console.error('❌ DEBUG: Error getting conversation history:', error);
-            
-            // Handle network errors
-            if (error.name === 'TypeError' && error.message.includes('fetch')) {
-                throw new Error('Unable to connect to the server. Please check your internet connection.');
-            }
-            
-            throw error;
-        }
+            chatSessions[summary.conversation_id] = {
+                id: summary.conversation_id,
+                title: summary.title || 'New Chat',
+                messages: [],
+                messagesLoaded: false,
+                turnCount: summary.turn_count,
+                concept: summary.concept || null,
+                audience: summary.audience || null,
+                createdAt: summary.created_at,
+                updatedAt: summary.updated_at
+            };
+        });
+        
+        return chatSessions;
     }
 
-
     /**
      * Convert DynamoDB conversation items to frontend chat sessions
      * @param {Array} conversationItems - Array of conversation items from DynamoDB
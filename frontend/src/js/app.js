@@ -383,7 +383,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 );
                 if (sortedChats.length > 0) {
                     console.log(`Switching to most recent chat: ${sortedChats[0].title}`);
-                    switchToChat(sortedChats[0].id);
+                    await switchToChat(sortedChats[0].id);
                 }
             }
             
@@ -404,20 +404,36 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     // New function to load chat sessions from DynamoDB
+    // Only summaries (titles and timestamps) are fetched here; messages load on first open.
+    // The API service keeps them in IndexedDB and only downloads what changed since the last sync.
     async function loadChatSessionsFromDynamoDB() {
         try {
-            console.log('📡 Loading chat sessions from DynamoDB...');
+            console.log('📡 Syncing chat summaries from DynamoDB...');
             
-            // Get conversation history from API
-            const response = await apiService.getConversationHistory();
+            const response = await apiService.syncConversationSummaries();
+            
+            // Nothing changed on the server and the sidebar is already built
+            if (response && response.notModified && Object.keys(chatSessions).length > 0) {
+                console.log('📡 Chat history unchanged');
+                return true;
+            }
             
             if (response && response.conversations && response.conversations.length > 0) {
-                console.log(`📡 Retrieved ${response.conversations.length} conversation items from DynamoDB`);
+                console.log(`📡 Loaded ${response.conversations.length} conversation summaries`);
+                
+                // Convert summaries to lazily-loaded chat sessions
+                const dynamodbChats = apiService.convertSummariesToChats(response.conversations);
                 
-                // Convert DynamoDB format to chat sessions format
-                const dynamodbChats = apiService.convertDynamoDBToChats(response.conversations);
+                // Keep already loaded messages of conversations that have not changed
+                Object.values(dynamodbChats).forEach(chat => {
+                    const existing = chatSessions[chat.id];
+                    if (existing && existing.messagesLoaded !== false && existing.updatedAt === chat.updatedAt) {
+                        chat.messages = existing.messages;
+                        chat.messagesLoaded = true;
+                    }
+                });
                 
-                // Clear existing sessions and load from DynamoDB
+                // Replace existing sessions with the synced ones
                 chatSessions = {};
                 Object.assign(chatSessions, dynamodbChats);
                 
@@ -448,6 +464,21 @@ document.addEventListener('DOMContentLoaded', function() {
             throw error;
         }
     }
+    
+    // Fetch the full messages of a summary-only chat session
+    async function loadChatMessages(chatSession) {
+        try {
+            console.log(`📡 Loading messages for conversation: ${chatSession.id}`);
+            const items = await apiService.getConversationMessages(chatSession.id);
+            const loaded = apiService.convertDynamoDBToChats(items)[chatSession.id];
+            
+            chatSession.messages = loaded ? loaded.messages : [];
+            chatSession.messagesLoaded = true;
+            saveChatSessions();
+        } catch (error) {
+            console.error('❌ Error loading conversation messages:', error);
+        }
+    }
 
     // Enhanced local storage loading (now serves as backup/merge)
     function loadLocalChatSessions() {
@@ -463,9 +494,16 @@ document.addEventListener('DOMContentLoaded', function() {
                 
                 // Merge with existing sessions (DynamoDB takes precedence)
                 Object.keys(parsedSessions).forEach(sessionId => {
-                    if (!chatSessions[sessionId]) {
+                    const session = chatSessions[sessionId];
+                    const localSession = parsedSessions[sessionId];
+                    if (!session) {
                         console.log(`📱 Adding local-only session: ${sessionId}`);
-                        chatSessions[sessionId] = parsedSessions[sessionId];
+                        chatSessions[sessionId] = localSession;
+                    } else if (session.messagesLoaded === false && localSession.messagesLoaded !== false &&
+                               localSession.messages.filter(m => m.isUser).length >= session.turnCount) {
+                        // Local copy is complete - no need to fetch the messages again
+                        session.messages = localSession.messages;
+                        session.messagesLoaded = true;
                     }
                 });
                 
@@ -613,7 +651,7 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
-    function switchToChat(conversationId) {
+    async function switchToChat(conversationId) {
         console.log('Switching to chat:', conversationId);
         
         if (!chatSessions[conversationId]) return;
@@ -621,6 +659,13 @@ document.addEventListener('DOMContentLoaded', function() {
         currentConversationId = conversationId;
         const chatSession = chatSessions[conversationId];
         
+        if (chatSession.messagesLoaded === false) {
+            await loadChatMessages(chatSession);
+            
+            // The user may have switched again while the messages were loading
+            if (currentConversationId !== conversationId) return;
+        }
+        
         if (messageContainer) {
             messageContainer.innerHTML = '';
         }
@@ -675,6 +720,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 } else {
                     chatPreview.textContent = 'New conversation';
                 }
+            } else if (chat.concept) {
+                chatPreview.textContent = `About: ${chat.concept}`;
             } else {
                 chatPreview.textContent = 'New conversation';
             }
@@ -3,19 +3,80 @@ import json
 import boto3
 import os
 import uuid
+import base64
+import hashlib
+import time
+import queue
+import threading
+import zlib
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 import logging
 from decimal import Decimal
+from profiling import profiling_configured, with_profiling  # lambda/shared, bundled by package-lambda.sh
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
+# Initialize AWS clients (resource for writes, low-level client for typed reads)
 dynamodb = boto3.resource('dynamodb')
+dynamodb_client = boto3.client('dynamodb')
 
 # Get environment variables
 CONVERSATION_TABLE = os.environ.get('CONVERSATION_TABLE')
+KNOWLEDGE_BUCKET = os.environ.get('KNOWLEDGE_BUCKET')
+COORDINATION_TABLE = os.environ.get('COORDINATION_TABLE')
+
+# A retried /query stores its interaction once: a guard item per idempotency key
+STORE_GUARD_PREFIX = 'stored#'
+DEFAULT_STORE_GUARD_TTL_SECONDS = 600
+
+# Pagination settings for history reads
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+# Summary view only reads what the sidebar needs (query is used for the title)
+SUMMARY_PROJECTION = ('base_conversation_id, conversation_id, #q, concept, audience, #ts, '
+                      'record_type, archived_turns, first_timestamp')
+SUMMARY_ATTRIBUTE_NAMES = {'#q': 'query', '#ts': 'timestamp'}
+
+# Sort key prefix of the per-conversation head item (latest context + counters)
+HEAD_PREFIX = 'HEAD#'
+HEAD_PROJECTION = 'base_conversation_id, last_timestamp, turn_count, concept, audience, title, created_at'
+
+# Conditional GET: the ETag is derived from the heads' latest write timestamps
+API_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'OPTIONS,GET,POST',
+    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,If-None-Match,X-Profile',
+    'Access-Control-Expose-Headers': 'ETag'
+}
+
+# Cold tier: old interactions are compacted per conversation into S3 and replaced
+# by one marker item, {conv_id}#!archive, which sorts before every timestamp
+ARCHIVE_MARKER = '!archive'
+ARCHIVE_PREFIX = os.environ.get('ARCHIVE_PREFIX', 'archive/')
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '7'))  # must stay below the 30-day hot TTL
+ARCHIVE_RETENTION_DAYS = int(os.environ.get('ARCHIVE_RETENTION_DAYS', '365'))
+ARCHIVE_TIME_RESERVE_MS = 20000  # stop archiving while this much invocation time is left
+
+# Warm-up settings and container lifecycle
+MAX_WARMUP_CONCURRENCY = int(os.environ.get('MAX_WARMUP_CONCURRENCY', '10'))
+DEFAULT_WARMUP_HOLD_MS = 100
+WARMUP_USER_ID = '__warmup__'
+CONTAINER_ID = uuid.uuid4().hex[:12]
+_cold_start = True
+
+# Bulk export settings (gzipped NDJSON streamed to KNOWLEDGE_BUCKET by multipart upload)
+EXPORT_PREFIX = os.environ.get('EXPORT_PREFIX', 'exports/')
+EXPORT_SCAN_SEGMENTS = int(os.environ.get('EXPORT_SCAN_SEGMENTS', '4'))
+EXPORT_PART_SIZE = 8 * 1024 * 1024  # S3 requires at least 5 MiB for every part but the last
+EXPORT_QUEUE_SIZE = 1000
+EXPORT_URL_EXPIRY_SECONDS = 3600
+_SEGMENT_DONE = object()
+_s3_client = None
 
 class DecimalEncoder(json.JSONEncoder):
     """Custom JSON encoder to handle Decimal objects from DynamoDB"""
@@ -29,6 +90,14 @@ def lambda_handler(event, context):
     Lambda function for managing conversation history - ENHANCED for API Gateway
     Handles both direct invocations and API Gateway requests
     """
+    global _cold_start
+    was_cold_start = _cold_start
+    _cold_start = False
+    
+    # Warm-up pings from the schedule or the main Lambda
+    if isinstance(event, dict) and 'warmup' in event and 'httpMethod' not in event:
+        return handle_warmup(event, context, was_cold_start)
+    
     try:
         logger.info(f"Received event: {json.dumps(event, default=str)}")
         
@@ -61,26 +130,61 @@ def handle_api_gateway_request(event, context):
         # Get query parameters
         query_params = event.get('queryStringParameters') or {}
         conversation_id = query_params.get('conversation_id')
+        view = query_params.get('view', 'full')
+        limit = query_params.get('limit')
+        cursor = query_params.get('cursor')
+        since = query_params.get('since')
+        
+        # Unchanged history: answer from the heads alone, without reading interactions.
+        # Later pages (cursor) never use the ETag; summary pages read the heads themselves.
+        heads = None if cursor and since is None else load_conversation_heads(user_id, conversation_id)
+        etag = history_etag(heads, view, conversation_id) if heads is not None else None
+        headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+        if etag and headers.get('if-none-match') == etag:
+            logger.info(f"History unchanged for {user_id}: 304")
+            return {
+                'statusCode': 304,
+                'headers': {**API_HEADERS, 'ETag': etag, 'Cache-Control': 'private, no-cache'},
+                'body': ''
+            }
         
         # Get conversation history
-        result = get_conversation(user_id, conversation_id)
+        try:
+            if since is not None:
+                result = get_conversation_delta(user_id, conversation_id, since, view, heads)
+            else:
+                result = get_conversation(user_id, conversation_id, limit=limit, cursor=cursor, view=view, heads=heads)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': str(e)}, cls=DecimalEncoder)
+            }
         
-        # Clean the conversations data to handle Decimal objects
-        conversations = result.get('conversations', [])
-        cleaned_conversations = clean_dynamodb_data(conversations)
+        body = {
+            'conversations': result.get('conversations', []),
+            'view': result.get('view', 'full'),
+            'next_cursor': result.get('next_cursor'),
+            'user_id': user_id,
+            # Clients send synced_at back as ?since= and version as If-None-Match
+            'version': etag,
+            'synced_at': latest_write(heads) if heads is not None else None
+        }
+        if 'conversation_ids' in result:
+            body['conversation_ids'] = result['conversation_ids']
         
+        # Reads already produce native types, so this is the only serialization pass
+        # (large bodies are gzipped by API Gateway, see MinimumCompressionSize)
+        response_headers = {**API_HEADERS, 'Cache-Control': 'private, no-cache'}
+        if etag:
+            response_headers['ETag'] = etag
         return {
             'statusCode': result.get('statusCode', 200),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'OPTIONS,GET,POST',
-                'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'
-            },
-            'body': json.dumps({
-                'conversations': cleaned_conversations,
-                'user_id': user_id
-            }, cls=DecimalEncoder)
+            'headers': response_headers,
+            'body': json.dumps(body, cls=DecimalEncoder)
         }
         
     except Exception as e:
@@ -94,6 +198,66 @@ def handle_api_gateway_request(event, context):
             'body': json.dumps({'error': str(e)}, cls=DecimalEncoder)
         }
 
+def handle_warmup(event, context, was_cold_start):
+    """Prime the DynamoDB connection, optionally fan out, and report whether this container was cold"""
+    started = time.time()
+    options = event['warmup'] if isinstance(event['warmup'], dict) else {}
+    concurrency = max(1, min(int(options.get('concurrency', 1)), MAX_WARMUP_CONCURRENCY))
+    hold_ms = int(options.get('hold_ms', DEFAULT_WARMUP_HOLD_MS))
+    
+    # A read of a reserved key opens the connection without touching user data
+    try:
+        dynamodb_client.get_item(
+            TableName=CONVERSATION_TABLE,
+            Key={'user_id': {'S': WARMUP_USER_ID}, 'conversation_id': {'S': WARMUP_USER_ID}}
+        )
+        primed = True
+    except Exception as e:
+        logger.error(f"Warm-up priming failed: {str(e)}")
+        primed = False
+    
+    result = {
+        'statusCode': 200,
+        'warmup': True,
+        'cold_start': was_cold_start,
+        'container_id': CONTAINER_ID,
+        'primed': primed
+    }
+    
+    if not options.get('child') and concurrency > 1:
+        function_name = context.invoked_function_arn if context else os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+        lambda_client = boto3.client('lambda')
+        
+        def ping(_):
+            try:
+                response = lambda_client.invoke(
+                    FunctionName=function_name,
+                    InvocationType='RequestResponse',
+                    Payload=json.dumps({'warmup': {'child': True, 'hold_ms': hold_ms}})
+                )
+                return json.loads(response['Payload'].read())
+            except Exception as e:
+                return {'error': str(e)}
+        
+        with ThreadPoolExecutor(max_workers=concurrency - 1) as executor:
+            reports = list(executor.map(ping, range(concurrency - 1)))
+        
+        result['fanout'] = {
+            'requested': concurrency - 1,
+            'containers': len({report.get('container_id') for report in reports if report.get('container_id')}),
+            'cold_starts': sum(1 for report in reports if report.get('cold_start')),
+            'errors': sum(1 for report in reports if 'error' in report)
+        }
+    
+    # Hold the container briefly so concurrent pings land on separate containers
+    remaining = hold_ms / 1000 - (time.time() - started)
+    if remaining > 0:
+        time.sleep(remaining)
+    
+    result['duration_ms'] = int((time.time() - started) * 1000)
+    logger.info(f"Warm-up: {json.dumps(result)}")
+    return result
+
 def handle_direct_invocation(event, context):
     """Handle direct Lambda invocations (from main Lambda)"""
     # Get action and parameters from the event
@@ -109,11 +273,35 @@ def handle_direct_invocation(event, context):
     
     # Handle the requested action
     if action == 'store':
-        return store_conversation(user_id, conversation_id, query, response, concept, audience)
+        return store_conversation(user_id, conversation_id, query, response, concept, audience,
+                                  event.get('idempotency_key'), event.get('idempotency_ttl'))
     elif action == 'get':
-        return get_conversation(user_id, conversation_id)
+        try:
+            return get_conversation(user_id, conversation_id,
+                                    limit=event.get('limit'),
+                                    cursor=event.get('cursor'),
+                                    view=event.get('view', 'full'))
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': str(e)}, cls=DecimalEncoder)
+            }
     elif action == 'get_context':
         return get_conversation_context(user_id, conversation_id)
+    elif action == 'archive':
+        return archive_old_interactions(event.get('older_than_days'), context)
+    elif action == 'backfill_heads':
+        # Without a user_id every user's conversations are checked
+        return backfill_conversation_heads(event.get('user_id'))
+    elif action == 'export':
+        try:
+            # Without a user_id every user's interactions in the date range are exported
+            return export_conversations(event.get('user_id'), event.get('start_date'), event.get('end_date'))
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': str(e)}, cls=DecimalEncoder)
+            }
     else:
         error_msg = f"Unknown action: {action}"
         logger.error(error_msg)
@@ -139,6 +327,60 @@ def clean_dynamodb_data(data):
     else:
         return data
 
+def deserialize_attribute(value):
+    """Convert one low-level DynamoDB attribute value straight to a native type"""
+    (type_code, raw), = value.items()
+    if type_code == 'S':
+        return raw
+    if type_code == 'N':
+        return int(raw) if raw.lstrip('-').isdigit() else float(raw)
+    if type_code == 'BOOL':
+        return raw
+    if type_code == 'NULL':
+        return None
+    if type_code == 'M':
+        return {key: deserialize_attribute(item) for key, item in raw.items()}
+    if type_code == 'L':
+        return [deserialize_attribute(item) for item in raw]
+    if type_code == 'SS':
+        return list(raw)
+    if type_code == 'NS':
+        return [int(n) if n.lstrip('-').isdigit() else float(n) for n in raw]
+    # B / BS are returned as-is
+    return raw
+
+def deserialize_item(raw_item):
+    """Convert a low-level DynamoDB item to a dict of native types"""
+    return {key: deserialize_attribute(value) for key, value in raw_item.items()}
+
+class ConversationRecord:
+    """One stored interaction (or archive marker), deserialized in a single pass from the wire format"""
+    __slots__ = ('user_id', 'conversation_id', 'base_conversation_id', 'query', 'response',
+                 'concept', 'audience', 'timestamp', 'ttl',
+                 'record_type', 'archived_turns', 'first_timestamp')
+    
+    def __init__(self, raw_item):
+        for field in self.__slots__:
+            value = raw_item.get(field)
+            setattr(self, field, deserialize_attribute(value) if value is not None else None)
+    
+    @classmethod
+    def from_item(cls, item):
+        """Record from an already deserialized item (scan and export iterators)"""
+        record = cls.__new__(cls)
+        for field in cls.__slots__:
+            setattr(record, field, item.get(field))
+        return record
+    
+    def to_dict(self):
+        """JSON-ready dict of the fields that were present on the item"""
+        result = {}
+        for field in self.__slots__:
+            value = getattr(self, field)
+            if value is not None:
+                result[field] = value
+        return result
+
 def extract_user_from_api_gateway_event(event):
     """Extract user ID from API Gateway Cognito authorizer context"""
     try:
@@ -206,11 +448,15 @@ def extract_user_from_api_gateway_event(event):
         logger.error(f"Error extracting user from API Gateway event: {str(e)}")
         return 'extraction_failed@anonymous.local'
 
-def store_conversation(user_id, conversation_id, query, response, concept, audience):
+def store_conversation(user_id, conversation_id, query, response, concept, audience, idempotency_key=None,
+                       idempotency_ttl=None):
     """
     Function to store a conversation in DynamoDB - ENHANCED
+    
+    With an idempotency key the interaction is written in one transaction with a
+    guard item in the coordination table, so a retried request is stored once.
     """
-    conv_id = conversation_id or str(uuid.uuid4())
+    conv_id = conversation_id or f"chat_{int(time.time() * 1000)}_{uuid.uuid4().hex[:9]}"
     
     # Calculate TTL (30 days from now)
     ttl = int((datetime.now() + timedelta(days=30)).timestamp())
@@ -234,9 +480,20 @@ def store_conversation(user_id, conversation_id, query, response, concept, audie
             'ttl': ttl
         }
         
-        table.put_item(Item=item)
+        if idempotency_key and COORDINATION_TABLE:
+            if not put_interaction_once(item, idempotency_key, idempotency_ttl or DEFAULT_STORE_GUARD_TTL_SECONDS):
+                logger.info(f"Skipped duplicate store for conversation: {conv_id}")
+                return {
+                    'statusCode': 200,
+                    'conversation_id': conv_id,
+                    'duplicate': True
+                }
+        else:
+            table.put_item(Item=item)
         logger.info(f"Stored conversation: {conv_id}")
         
+        update_conversation_head(table, user_id, conv_id, query, concept, audience, interaction_timestamp, ttl)
+        
         return {
             'statusCode': 200,
             'conversation_id': conv_id,
@@ -246,60 +503,470 @@ def store_conversation(user_id, conversation_id, query, response, concept, audie
         logger.error(f"Error storing conversation: {str(e)}", exc_info=True)
         raise e
 
-def get_conversation(user_id, conversation_id):
+def put_interaction_once(item, idempotency_key, guard_ttl):
+    """Write the interaction unless this key was already stored; returns False for a duplicate"""
+    now = int(time.time())
+    try:
+        # The resource's client serializes plain Python values, like Table.put_item
+        dynamodb.meta.client.transact_write_items(TransactItems=[
+            {
+                'Put': {
+                    'TableName': COORDINATION_TABLE,
+                    'Item': {
+                        'pk': f"{STORE_GUARD_PREFIX}{idempotency_key}",
+                        'conversation_id': item['conversation_id'],
+                        'expires_at': now + int(guard_ttl)
+                    },
+                    'ConditionExpression': 'attribute_not_exists(pk) OR expires_at < :now',
+                    'ExpressionAttributeValues': {':now': now}
+                }
+            },
+            {'Put': {'TableName': CONVERSATION_TABLE, 'Item': item}}
+        ])
+        return True
+    except dynamodb.meta.client.exceptions.TransactionCanceledException as e:
+        reasons = e.response.get('CancellationReasons', [])
+        if reasons and reasons[0].get('Code') == 'ConditionalCheckFailed':
+            return False
+        raise
+
+def update_conversation_head(table, user_id, conv_id, query, concept, audience, interaction_timestamp, ttl):
     """
-    Function to retrieve conversation(s) from DynamoDB - ENHANCED
+    Maintain the conversation head item read by get_conversation_context
+    The conditional write keeps a late, out-of-order store from overwriting a newer head
+    
+    The first turn also sets title/created_at, so a head doubles as the
+    conversation's sidebar summary for delta syncs.
     """
-    table = dynamodb.Table(CONVERSATION_TABLE)
+    head_key = {'user_id': user_id, 'conversation_id': f"{HEAD_PREFIX}{conv_id}"}
+    
+    set_clauses = [
+        'base_conversation_id = :conv_id',
+        'record_type = :record_type',
+        'last_timestamp = :ts',
+        '#ttl = :ttl',
+        'title = if_not_exists(title, :title)',
+        'created_at = if_not_exists(created_at, :ts)'
+    ]
+    values = {
+        ':conv_id': conv_id,
+        ':record_type': 'head',
+        ':ts': interaction_timestamp,
+        ':ttl': ttl,
+        ':title': conversation_title(query),
+        ':one': 1
+    }
+    
+    # Follow-ups should keep resolving to the last concept that was actually known
+    if concept and concept != 'unknown':
+        set_clauses.extend(['concept = :concept', 'audience = :audience'])
+        values[':concept'] = concept
+        values[':audience'] = audience or 'general'
+    
+    try:
+        table.update_item(
+            Key=head_key,
+            UpdateExpression=f"SET {', '.join(set_clauses)} ADD turn_count :one",
+            ConditionExpression='attribute_not_exists(last_timestamp) OR last_timestamp < :ts',
+            ExpressionAttributeNames={'#ttl': 'ttl'},
+            ExpressionAttributeValues=values
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        # A newer interaction already owns the head - only count this turn
+        logger.info(f"Conversation head for {conv_id} is newer than {interaction_timestamp}")
+        table.update_item(
+            Key=head_key,
+            UpdateExpression='ADD turn_count :one',
+            ExpressionAttributeValues={':one': 1}
+        )
+    except Exception as e:
+        # The interaction itself is stored; context falls back to the history query
+        logger.error(f"Error updating conversation head: {str(e)}", exc_info=True)
+
+def parse_page_size(limit):
+    """Clamp a requested page size to the allowed range"""
+    if limit in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        page_size = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid limit: {limit}")
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+def encode_cursor(last_evaluated_key):
+    """Turn a low-level LastEvaluatedKey into an opaque URL-safe cursor"""
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(deserialize_item(last_evaluated_key), separators=(',', ':'), sort_keys=True)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, user_id):
+    """Turn a cursor back into a low-level ExclusiveStartKey, rejecting other users' keys"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        start_key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
+    
+    if (not isinstance(start_key, dict)
+            or set(start_key.keys()) != {'user_id', 'conversation_id'}
+            or start_key.get('user_id') != user_id
+            or not isinstance(start_key.get('conversation_id'), str)):
+        raise ValueError('Invalid cursor')
+    
+    return {key: {'S': value} for key, value in start_key.items()}
+
+def conversation_title(query):
+    """Sidebar title: the first query, truncated"""
+    query = query or ''
+    return query[:30] + '...' if len(query) > 30 else query
+
+def merge_into_summary(summaries, record):
+    """Fold one interaction record into the summary of its conversation; returns that summary"""
+    base_id = record.base_conversation_id or (record.conversation_id or '').split('#')[0]
+    timestamp = record.timestamp or ''
+    # An archive marker stands for all archived turns: first query, first and last timestamps
+    first_timestamp = record.first_timestamp or timestamp
+    summary = summaries.get(base_id)
+    
+    if summary is None:
+        summary = {
+            'conversation_id': base_id,
+            'title': None,
+            'concept': None,
+            'audience': None,
+            'created_at': first_timestamp,
+            'updated_at': timestamp,
+            'turn_count': 0
+        }
+        summaries[base_id] = summary
+    
+    summary['turn_count'] += record.archived_turns or 1
+    
+    if first_timestamp <= summary['created_at']:
+        summary['title'] = conversation_title(record.query)
+        summary['created_at'] = first_timestamp
+    
+    if timestamp >= summary['updated_at']:
+        summary['updated_at'] = timestamp
+        summary['concept'] = record.concept
+        summary['audience'] = record.audience
+    return summary
+
+def get_conversation(user_id, conversation_id, limit=None, cursor=None, view='full', heads=None):
+    """
+    Function to retrieve conversation(s) from DynamoDB - paginated
+    
+    view='full' returns complete interaction items, view='summary' returns one
+    title/timestamp record per conversation. next_cursor is None on the last page.
+    """
+    if view not in ('full', 'summary'):
+        raise ValueError(f"Unknown view: {view}")
+    if view == 'summary':
+        return get_conversation_summaries(user_id, conversation_id, limit, cursor, heads)
+    
+    query_kwargs = {
+        'TableName': CONVERSATION_TABLE,
+        'Limit': parse_page_size(limit),
+        'ExpressionAttributeValues': {':user_id': {'S': user_id}}
+    }
+    if cursor:
+        query_kwargs['ExclusiveStartKey'] = decode_cursor(cursor, user_id)
     
     try:
         if conversation_id:
-            # Get all interactions for a specific conversation
+            # Get the interactions of a specific conversation, oldest first
             logger.info(f"Retrieving conversation: {conversation_id}")
-            
-            # Query using GSI or scan with filter for base_conversation_id
-            response = table.scan(
-                FilterExpression='user_id = :user_id AND base_conversation_id = :conv_id',
-                ExpressionAttributeValues={
-                    ':user_id': user_id,
-                    ':conv_id': conversation_id
-                }
-            )
-            
-            # Sort by timestamp
-            items = sorted(response.get('Items', []), key=lambda x: x.get('timestamp', ''))
-            
+            query_kwargs['KeyConditionExpression'] = 'user_id = :user_id AND begins_with(conversation_id, :prefix)'
+            query_kwargs['ExpressionAttributeValues'][':prefix'] = {'S': f"{conversation_id}#"}
         else:
-            # Get all conversations for a user (limit to recent ones)
-            logger.info(f"Retrieving all conversations for user: {user_id}")
-            response = table.scan(
-                FilterExpression='user_id = :user_id',
-                ExpressionAttributeValues={
-                    ':user_id': user_id
-                },
-                Limit=50  # Limit to avoid large responses
-            )
-            
-            # Sort by timestamp (most recent first)
-            items = sorted(response.get('Items', []), key=lambda x: x.get('timestamp', ''), reverse=True)
+            # Get recent interactions for a user; chat_<epoch_ms> ids (all ids the app creates) sort newest first
+            logger.info(f"Retrieving {view} conversations for user: {user_id}")
+            query_kwargs['KeyConditionExpression'] = 'user_id = :user_id'
+            query_kwargs['FilterExpression'] = 'NOT begins_with(conversation_id, :head)'
+            query_kwargs['ExpressionAttributeValues'][':head'] = {'S': HEAD_PREFIX}
+            query_kwargs['ScanIndexForward'] = False
         
-        logger.info(f"Retrieved {len(items)} conversation items")
+        response = dynamodb_client.query(**query_kwargs)
+        records = [ConversationRecord(raw_item) for raw_item in response.get('Items', [])]
+        next_cursor = encode_cursor(response.get('LastEvaluatedKey'))
+        
+        if conversation_id:
+            # Sort key order is already oldest-first within one conversation; the
+            # archive marker sorts first and is swapped for the archived turns
+            conversations = []
+            for record in records:
+                if record.record_type == 'archive':
+                    conversations.extend(load_archived_interactions(user_id, conversation_id))
+                else:
+                    conversations.append(record.to_dict())
+        else:
+            records.sort(key=lambda x: x.timestamp or '', reverse=True)
+            conversations = [record.to_dict() for record in records]
         
-        # Clean the items before returning
-        cleaned_items = clean_dynamodb_data(items)
+        logger.info(f"Retrieved {len(conversations)} {view} conversation records")
         
         return {
             'statusCode': 200,
-            'conversations': cleaned_items
+            'conversations': conversations,
+            'view': view,
+            'next_cursor': next_cursor
         }
     except Exception as e:
         logger.error(f"Error retrieving conversation: {str(e)}", exc_info=True)
         raise e
 
+def encode_summary_cursor(head):
+    """Keyset cursor for the summary view: the last head's (last_timestamp, conversation id)"""
+    raw = json.dumps([head.get('last_timestamp') or '', head['base_conversation_id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_summary_cursor(cursor):
+    """Turn a summary cursor back into its (last_timestamp, conversation id) position"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(position, list) or len(position) != 2 or not all(isinstance(part, str) for part in position):
+        raise ValueError('Invalid cursor')
+    return tuple(position)
+
+def summarize_conversation(user_id, conversation_id):
+    """One conversation's summary from all of its interactions, or None if it has none"""
+    query_kwargs = {
+        'TableName': CONVERSATION_TABLE,
+        'KeyConditionExpression': 'user_id = :user_id AND begins_with(conversation_id, :prefix)',
+        'ExpressionAttributeValues': {':user_id': {'S': user_id}, ':prefix': {'S': f"{conversation_id}#"}},
+        'ProjectionExpression': SUMMARY_PROJECTION,
+        'ExpressionAttributeNames': SUMMARY_ATTRIBUTE_NAMES
+    }
+    summaries = {}
+    while True:
+        response = dynamodb_client.query(**query_kwargs)
+        for raw_item in response.get('Items', []):
+            merge_into_summary(summaries, ConversationRecord(raw_item))
+        if 'LastEvaluatedKey' not in response:
+            return summaries.get(conversation_id)
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def head_summary(user_id, head):
+    """Sidebar summary of a conversation from its head item"""
+    if head.get('title') is None:
+        # Heads written before titles were recorded: summarize from the interactions
+        return summarize_conversation(user_id, head['base_conversation_id'])
+    return {
+        'conversation_id': head['base_conversation_id'],
+        'title': head['title'],
+        'concept': head.get('concept'),
+        'audience': head.get('audience'),
+        'created_at': head.get('created_at'),
+        'updated_at': head['last_timestamp'],
+        'turn_count': int(head.get('turn_count') or 0)
+    }
+
+def get_conversation_summaries(user_id, conversation_id=None, limit=None, cursor=None, heads=None):
+    """
+    Summary view, most recently active conversation first
+    
+    Pages over the head items (one per conversation) ordered by last_timestamp,
+    so a conversation is never split across pages. The cursor is a keyset
+    position: a conversation that gets a new turn moves to the first page.
+    """
+    if conversation_id:
+        heads = heads if heads is not None else load_conversation_heads(user_id, conversation_id)
+        summary = head_summary(user_id, heads[0]) if heads else summarize_conversation(user_id, conversation_id)
+        return {'statusCode': 200, 'conversations': [summary] if summary else [], 'view': 'summary',
+                'next_cursor': None}
+    
+    def position(head):
+        return head.get('last_timestamp') or '', head['base_conversation_id']
+    
+    page_size = parse_page_size(limit)
+    ordered = sorted(heads if heads is not None else load_conversation_heads(user_id), key=position, reverse=True)
+    if cursor:
+        after = decode_summary_cursor(cursor)
+        ordered = [head for head in ordered if position(head) < after]
+    page = ordered[:page_size]
+    
+    conversations = [summary for summary in (head_summary(user_id, head) for head in page) if summary]
+    logger.info(f"Retrieved {len(conversations)} summary conversation records")
+    return {
+        'statusCode': 200,
+        'conversations': conversations,
+        'view': 'summary',
+        'next_cursor': encode_summary_cursor(page[-1]) if len(ordered) > page_size else None
+    }
+
+def load_conversation_heads(user_id, conversation_id=None):
+    """
+    Head items (one per conversation) as dicts; a single GetItem when conversation_id is given
+    Heads are small, so even a long history costs a few read units.
+    """
+    if conversation_id:
+        response = dynamodb_client.get_item(
+            TableName=CONVERSATION_TABLE,
+            Key={'user_id': {'S': user_id}, 'conversation_id': {'S': f"{HEAD_PREFIX}{conversation_id}"}},
+            ProjectionExpression=HEAD_PROJECTION
+        )
+        return [deserialize_item(response['Item'])] if 'Item' in response else []
+    
+    heads = []
+    query_kwargs = {
+        'TableName': CONVERSATION_TABLE,
+        'KeyConditionExpression': 'user_id = :user_id AND begins_with(conversation_id, :head)',
+        'ExpressionAttributeValues': {':user_id': {'S': user_id}, ':head': {'S': HEAD_PREFIX}},
+        'ProjectionExpression': HEAD_PROJECTION
+    }
+    while True:
+        response = dynamodb_client.query(**query_kwargs)
+        heads.extend(deserialize_item(raw_item) for raw_item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return heads
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def latest_write(heads):
+    """Timestamp of the newest stored interaction, or None for an empty history"""
+    return max((head.get('last_timestamp') or '' for head in heads), default='') or None
+
+def history_etag(heads, view, conversation_id=None):
+    """
+    Strong ETag for the state of a history (or one conversation) in one view
+    
+    Any new turn moves a head's last_timestamp or turn_count, and expired
+    conversations drop out of the head count; the ETag describes the whole
+    history, so it is only checked for first-page requests.
+    """
+    version = (f"{len(heads)}:{sum(int(head.get('turn_count') or 0) for head in heads)}:"
+               f"{latest_write(heads) or ''}:{view}:{conversation_id or ''}")
+    return '"' + hashlib.sha256(version.encode('utf-8')).hexdigest()[:32] + '"'
+
+def get_conversation_delta(user_id, conversation_id, since, view, heads):
+    """
+    Changes since a previous response's synced_at
+    
+    Summary view returns the summaries of conversations written after `since`
+    (an empty `since` returns all of them) plus the ids of every live
+    conversation so clients can drop expired ones. With a conversation_id, the
+    full view returns only that conversation's newer interactions.
+    """
+    if conversation_id and view == 'full':
+        query_kwargs = {
+            'TableName': CONVERSATION_TABLE,
+            'KeyConditionExpression': 'user_id = :user_id AND conversation_id BETWEEN :from AND :to',
+            'ExpressionAttributeValues': {
+                ':user_id': {'S': user_id},
+                ':from': {'S': f"{conversation_id}#{since}"},
+                ':to': {'S': f"{conversation_id}#\uffff"}
+            }
+        }
+        records = []
+        while True:
+            response = dynamodb_client.query(**query_kwargs)
+            records.extend(ConversationRecord(raw_item) for raw_item in response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        conversations = []
+        for record in records:
+            # The archive marker sorts before every timestamp, so it only matches an empty since
+            if record.record_type == 'archive':
+                conversations.extend(item for item in load_archived_interactions(user_id, conversation_id)
+                                     if (item.get('timestamp') or '') > since)
+            elif (record.timestamp or '') > since:
+                conversations.append(record.to_dict())
+        return {'statusCode': 200, 'conversations': conversations, 'view': 'full', 'next_cursor': None}
+    
+    if view != 'summary':
+        raise ValueError('since requires view=summary or a conversation_id')
+    
+    changed = [head for head in heads if (head.get('last_timestamp') or '') > since]
+    conversations = [summary for summary in (head_summary(user_id, head) for head in changed) if summary]
+    conversations.sort(key=lambda summary: summary['updated_at'] or '', reverse=True)
+    
+    return {
+        'statusCode': 200,
+        'conversations': conversations,
+        'view': 'summary',
+        'next_cursor': None,
+        'conversation_ids': [head['base_conversation_id'] for head in heads]
+    }
+
+def backfill_conversation_heads(user_id=None):
+    """
+    Write head items for conversations stored before heads existed (safe to rerun)
+    
+    Delta syncs list conversations from their heads, so a conversation without
+    one would drop out of the sidebar. Each missing head is built from the
+    conversation's interactions the way the summary view summarizes them; a
+    head written by a concurrent store in the meantime is left alone.
+    """
+    read_kwargs = {
+        'ProjectionExpression': f"user_id, {SUMMARY_PROJECTION}, #ttl",
+        'ExpressionAttributeNames': {**SUMMARY_ATTRIBUTE_NAMES, '#ttl': 'ttl'}
+    }
+    if user_id:
+        items = iter_user_items(user_id, {**read_kwargs, 'ExpressionAttributeValues': {}})
+    else:
+        items = iter_scan_items(read_kwargs, EXPORT_SCAN_SEGMENTS)
+    
+    has_head = set()
+    summaries = {}
+    latest = {}
+    for item in items:
+        if item['conversation_id'].startswith(HEAD_PREFIX):
+            has_head.add((item['user_id'], item['base_conversation_id']))
+            continue
+        summary = merge_into_summary(summaries.setdefault(item['user_id'], {}), ConversationRecord.from_item(item))
+        key = (item['user_id'], summary['conversation_id'])
+        known = latest.setdefault(key, {'ttl': None, 'timestamp': '', 'concept': None, 'audience': None})
+        known['ttl'] = max(known['ttl'] or 0, item.get('ttl') or 0) or None
+        # Like update_conversation_head, keep the last concept that was actually known
+        if item.get('concept') not in (None, 'unknown') and (item.get('timestamp') or '') >= known['timestamp']:
+            known.update(timestamp=item.get('timestamp') or '', concept=item['concept'],
+                         audience=item.get('audience') or 'general')
+    
+    table = dynamodb.Table(CONVERSATION_TABLE)
+    written = 0
+    for owner, conversations in summaries.items():
+        for conv_id, summary in conversations.items():
+            if (owner, conv_id) in has_head:
+                continue
+            known = latest[(owner, conv_id)]
+            head = {
+                'user_id': owner,
+                'conversation_id': f"{HEAD_PREFIX}{conv_id}",
+                'base_conversation_id': conv_id,
+                'record_type': 'head',
+                'last_timestamp': summary['updated_at'],
+                'turn_count': summary['turn_count'],
+                'title': summary['title'] or '',
+                'created_at': summary['created_at']
+            }
+            if known['concept']:
+                head['concept'] = known['concept']
+                head['audience'] = known['audience']
+            if known['ttl']:
+                head['ttl'] = known['ttl']
+            try:
+                table.put_item(Item=head, ConditionExpression='attribute_not_exists(user_id)')
+                written += 1
+            except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+                pass
+    
+    logger.info(f"Backfilled {written} conversation heads")
+    return {
+        'statusCode': 200,
+        'heads_written': written
+    }
+
 def get_conversation_context(user_id, conversation_id):
     """
-    NEW: Get just the latest context (concept/audience) for a conversation
+    Get just the latest context (concept/audience) for a conversation
     This is used by the main lambda for follow-up question handling
+    
+    Reads the conversation head with a single strongly consistent GetItem, so the
+    cost does not grow with the length of the conversation.
     """
     if not conversation_id:
         return {
@@ -307,60 +974,445 @@ def get_conversation_context(user_id, conversation_id):
             'context': None
         }
     
-    table = dynamodb.Table(CONVERSATION_TABLE)
-    
     try:
         logger.info(f"Getting context for conversation: {conversation_id}")
         
-        # Get recent interactions for this conversation
-        response = table.scan(
-            FilterExpression='user_id = :user_id AND base_conversation_id = :conv_id',
-            ExpressionAttributeValues={
-                ':user_id': user_id,
-                ':conv_id': conversation_id
+        response = dynamodb_client.get_item(
+            TableName=CONVERSATION_TABLE,
+            Key={
+                'user_id': {'S': user_id},
+                'conversation_id': {'S': f"{HEAD_PREFIX}{conversation_id}"}
             },
-            Limit=10  # Only need recent interactions
+            ConsistentRead=True
         )
         
-        items = response.get('Items', [])
-        
-        if not items:
-            return {
-                'statusCode': 200,
-                'context': None
-            }
-        
-        # Sort by timestamp (most recent first)
-        sorted_items = sorted(items, key=lambda x: x.get('timestamp', ''), reverse=True)
-        
-        # Find the most recent item with a valid concept
-        for item in sorted_items:
-            concept = item.get('concept')
-            audience = item.get('audience', 'general')
-            
-            if concept and concept != 'unknown':
-                context = {
-                    'concept': concept,
-                    'audience': audience,
-                    'timestamp': item.get('timestamp')
-                }
-                
-                logger.info(f"Found context: {context}")
-                
+        if 'Item' in response:
+            head = deserialize_item(response['Item'])
+            if not head.get('concept'):
                 return {
                     'statusCode': 200,
-                    'context': clean_dynamodb_data(context)
+                    'context': None
                 }
+            
+            context = {
+                'concept': head['concept'],
+                'audience': head.get('audience', 'general'),
+                'timestamp': head.get('last_timestamp'),
+                'turn_count': head.get('turn_count', 0)
+            }
+            logger.info(f"Found context: {context}")
+            
+            return {
+                'statusCode': 200,
+                'context': context
+            }
         
-        # No valid context found
-        return {
-            'statusCode': 200,
-            'context': None
-        }
+        # Conversations stored before head items existed: read the latest turns
+        return get_legacy_conversation_context(user_id, conversation_id)
         
     except Exception as e:
         logger.error(f"Error getting conversation context: {str(e)}", exc_info=True)
         return {
             'statusCode': 500,
             'error': str(e)
-        }
\ No newline at end of file
+        }
+
+def get_legacy_conversation_context(user_id, conversation_id):
+    """Derive context from the most recent interactions when no head item exists"""
+    response = dynamodb_client.query(
+        TableName=CONVERSATION_TABLE,
+        KeyConditionExpression='user_id = :user_id AND begins_with(conversation_id, :prefix)',
+        ExpressionAttributeValues={
+            ':user_id': {'S': user_id},
+            ':prefix': {'S': f"{conversation_id}#"}
+        },
+        ScanIndexForward=False,  # Most recent first
+        Limit=10  # Only need recent interactions
+    )
+    
+    # Find the most recent item with a valid concept
+    for raw_item in response.get('Items', []):
+        record = ConversationRecord(raw_item)
+        
+        if record.concept and record.concept != 'unknown':
+            context = {
+                'concept': record.concept,
+                'audience': record.audience or 'general',
+                'timestamp': record.timestamp
+            }
+            
+            logger.info(f"Found legacy context: {context}")
+            
+            return {
+                'statusCode': 200,
+                'context': context
+            }
+    
+    # No valid context found
+    return {
+        'statusCode': 200,
+        'context': None
+    }
+
+def get_s3_client():
+    """S3 client created on first use, so cold starts of history reads stay unchanged"""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+def parse_export_range(start_date, end_date):
+    """
+    Validate an ISO date/timestamp range; returns (start, end_exclusive) strings
+    comparable with stored timestamps. A date-only end_date includes that whole day.
+    """
+    try:
+        start = datetime.fromisoformat(start_date).isoformat() if start_date else None
+        end = None
+        if end_date:
+            end_dt = datetime.fromisoformat(end_date)
+            if len(end_date) == 10:
+                end_dt += timedelta(days=1)
+            end = end_dt.isoformat()
+    except (TypeError, ValueError):
+        raise ValueError('start_date and end_date must be ISO dates or timestamps')
+    
+    if start and end and start >= end:
+        raise ValueError('start_date must be before end_date')
+    return start, end
+
+def export_filter_kwargs(start, end):
+    """
+    FilterExpression arguments selecting interactions (not head items) in the range
+    Archive markers always match; their archived turns are filtered on expansion
+    """
+    values = {':head': {'S': HEAD_PREFIX}}
+    range_conditions = []
+    if start:
+        range_conditions.append('#ts >= :start')
+        values[':start'] = {'S': start}
+    if end:
+        range_conditions.append('#ts < :end')
+        values[':end'] = {'S': end}
+    
+    kwargs = {
+        'FilterExpression': 'NOT begins_with(conversation_id, :head)',
+        'ExpressionAttributeValues': values
+    }
+    if range_conditions:
+        kwargs['FilterExpression'] += f" AND (({' AND '.join(range_conditions)}) OR record_type = :archive)"
+        kwargs['ExpressionAttributeValues'][':archive'] = {'S': 'archive'}
+        kwargs['ExpressionAttributeNames'] = {'#ts': 'timestamp'}
+    return kwargs
+
+def expand_archived(items, start, end):
+    """Replace archive markers in an item stream with their archived turns in the range"""
+    for item in items:
+        if item.get('record_type') != 'archive':
+            yield item
+            continue
+        for archived in load_archived_interactions(item['user_id'], item['base_conversation_id']):
+            timestamp = archived.get('timestamp') or ''
+            if (not start or timestamp >= start) and (not end or timestamp < end):
+                yield archived
+
+def iter_user_items(user_id, filter_kwargs):
+    """Yield one user's interactions page by page"""
+    query_kwargs = {
+        'TableName': CONVERSATION_TABLE,
+        'KeyConditionExpression': 'user_id = :uid',
+        **filter_kwargs,
+        'ExpressionAttributeValues': {**filter_kwargs['ExpressionAttributeValues'], ':uid': {'S': user_id}}
+    }
+    while True:
+        page = dynamodb_client.query(**query_kwargs)
+        for raw_item in page.get('Items', []):
+            yield deserialize_item(raw_item)
+        if 'LastEvaluatedKey' not in page:
+            return
+        query_kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+def _put_until_stopped(items, value, stop):
+    """Block on a full queue, giving up once the consumer has stopped"""
+    while not stop.is_set():
+        try:
+            items.put(value, timeout=1)
+            return
+        except queue.Full:
+            continue
+
+def iter_scan_items(filter_kwargs, segments):
+    """
+    Yield all users' interactions from a parallel scan
+    
+    Segment workers feed a bounded queue, so a slow upload applies backpressure
+    to the scan instead of buffering the table in memory.
+    """
+    items = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+    stop = threading.Event()
+    
+    def scan_segment(segment):
+        scan_kwargs = {
+            'TableName': CONVERSATION_TABLE,
+            'Segment': segment,
+            'TotalSegments': segments,
+            **filter_kwargs
+        }
+        try:
+            while not stop.is_set():
+                page = dynamodb_client.scan(**scan_kwargs)
+                for raw_item in page.get('Items', []):
+                    _put_until_stopped(items, raw_item, stop)
+                if 'LastEvaluatedKey' not in page:
+                    break
+                scan_kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+        except Exception as e:
+            _put_until_stopped(items, e, stop)
+        finally:
+            _put_until_stopped(items, _SEGMENT_DONE, stop)
+    
+    executor = ThreadPoolExecutor(max_workers=segments)
+    for segment in range(segments):
+        executor.submit(scan_segment, segment)
+    
+    finished = 0
+    try:
+        while finished < segments:
+            value = items.get()
+            if value is _SEGMENT_DONE:
+                finished += 1
+            elif isinstance(value, Exception):
+                raise value
+            else:
+                yield deserialize_item(value)
+    finally:
+        stop.set()
+        executor.shutdown(wait=False)
+
+def iter_gzip_ndjson(items, counter):
+    """Encode items as NDJSON and yield gzip-compressed chunks"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for item in items:
+        counter['items'] += 1
+        chunk = compressor.compress((json.dumps(item, cls=DecimalEncoder, default=str) + '\n').encode('utf-8'))
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+def upload_multipart(chunks, bucket, key):
+    """Upload a stream of byte chunks as one S3 object, holding at most one part in memory"""
+    s3 = get_s3_client()
+    upload_id = s3.create_multipart_upload(
+        Bucket=bucket, Key=key, ContentType='application/x-ndjson', ContentEncoding='gzip'
+    )['UploadId']
+    parts = []
+    size = 0
+    buffer = bytearray()
+    
+    def upload_part(body):
+        part_number = len(parts) + 1
+        response = s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id,
+                                  PartNumber=part_number, Body=bytes(body))
+        parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+    
+    try:
+        for chunk in chunks:
+            buffer.extend(chunk)
+            size += len(chunk)
+            if len(buffer) >= EXPORT_PART_SIZE:
+                upload_part(buffer)
+                buffer = bytearray()
+        upload_part(buffer)
+        
+        s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                     MultipartUpload={'Parts': parts})
+    except Exception:
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+    
+    return size, len(parts)
+
+def export_conversations(user_id=None, start_date=None, end_date=None):
+    """
+    Export interactions for one user, or for all users, optionally limited to a date range
+    
+    Items stream from paginated queries (one user) or a parallel scan (all users)
+    through gzip into a multipart upload, so memory stays constant regardless of
+    export size. Returns a presigned link to the gzipped NDJSON object.
+    """
+    if not KNOWLEDGE_BUCKET:
+        raise ValueError('Exports are not configured (KNOWLEDGE_BUCKET is not set)')
+    
+    start, end = parse_export_range(start_date, end_date)
+    filter_kwargs = export_filter_kwargs(start, end)
+    items = iter_user_items(user_id, filter_kwargs) if user_id else iter_scan_items(filter_kwargs, EXPORT_SCAN_SEGMENTS)
+    items = expand_archived(items, start, end)
+    
+    key = f"{EXPORT_PREFIX}{user_id or 'all-users'}/{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.ndjson.gz"
+    counter = {'items': 0}
+    started = time.time()
+    compressed_bytes, part_count = upload_multipart(iter_gzip_ndjson(items, counter), KNOWLEDGE_BUCKET, key)
+    
+    url = get_s3_client().generate_presigned_url(
+        'get_object',
+        Params={'Bucket': KNOWLEDGE_BUCKET, 'Key': key},
+        ExpiresIn=EXPORT_URL_EXPIRY_SECONDS
+    )
+    logger.info(f"Exported {counter['items']} items to s3://{KNOWLEDGE_BUCKET}/{key} "
+                f"({compressed_bytes} bytes, {part_count} parts) in {time.time() - started:.1f}s")
+    
+    return {
+        'statusCode': 200,
+        'export': {
+            'bucket': KNOWLEDGE_BUCKET,
+            'key': key,
+            'url': url,
+            'expires_in': EXPORT_URL_EXPIRY_SECONDS,
+            'items': counter['items'],
+            'compressed_bytes': compressed_bytes,
+            'parts': part_count,
+            'start_date': start,
+            'end_date_exclusive': end
+        }
+    }
+
+def archive_object_key(user_id, conversation_id):
+    """S3 key of a conversation's cold-tier object"""
+    return f"{ARCHIVE_PREFIX}{user_id}/{conversation_id}.ndjson.gz"
+
+def load_archived_interactions(user_id, conversation_id):
+    """Read a conversation's archived turns from S3, oldest first (empty if none)"""
+    if not KNOWLEDGE_BUCKET:
+        return []
+    s3 = get_s3_client()
+    try:
+        response = s3.get_object(Bucket=KNOWLEDGE_BUCKET, Key=archive_object_key(user_id, conversation_id))
+    except s3.exceptions.NoSuchKey:
+        return []
+    
+    lines = zlib.decompress(response['Body'].read(), 31).decode('utf-8').splitlines()
+    return [json.loads(line) for line in lines if line]
+
+def archive_conversation(user_id, conversation_id, cutoff):
+    """
+    Move one conversation's interactions older than cutoff to its S3 object
+    
+    The object is written before anything is deleted, and turns are merged by
+    sort key, so a run interrupted at any point is safe to repeat.
+    """
+    query_kwargs = {
+        'TableName': CONVERSATION_TABLE,
+        'KeyConditionExpression': 'user_id = :user_id AND begins_with(conversation_id, :prefix)',
+        'FilterExpression': '#ts < :cutoff AND attribute_not_exists(record_type)',
+        'ExpressionAttributeNames': {'#ts': 'timestamp'},
+        'ExpressionAttributeValues': {
+            ':user_id': {'S': user_id},
+            ':prefix': {'S': f"{conversation_id}#"},
+            ':cutoff': {'S': cutoff}
+        }
+    }
+    old_items = []
+    while True:
+        page = dynamodb_client.query(**query_kwargs)
+        old_items.extend(deserialize_item(raw_item) for raw_item in page.get('Items', []))
+        if 'LastEvaluatedKey' not in page:
+            break
+        query_kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+    
+    if not old_items:
+        return 0
+    
+    merged = {item['conversation_id']: item for item in load_archived_interactions(user_id, conversation_id)}
+    merged.update((item['conversation_id'], item) for item in old_items)
+    archived = [merged[key] for key in sorted(merged)]
+    
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+    body = compressor.compress(''.join(json.dumps(item, cls=DecimalEncoder) + '\n' for item in archived).encode('utf-8'))
+    body += compressor.flush()
+    get_s3_client().put_object(Bucket=KNOWLEDGE_BUCKET, Key=archive_object_key(user_id, conversation_id),
+                               Body=body, ContentType='application/x-ndjson', ContentEncoding='gzip')
+    
+    retention_ttl = int((datetime.now() + timedelta(days=ARCHIVE_RETENTION_DAYS)).timestamp())
+    table = dynamodb.Table(CONVERSATION_TABLE)
+    table.put_item(Item={
+        'user_id': user_id,
+        'conversation_id': f"{conversation_id}#{ARCHIVE_MARKER}",
+        'base_conversation_id': conversation_id,
+        'record_type': 'archive',
+        'query': archived[0].get('query', ''),
+        'concept': archived[-1].get('concept', 'unknown'),
+        'audience': archived[-1].get('audience', 'general'),
+        'first_timestamp': archived[0].get('timestamp', ''),
+        'timestamp': archived[-1].get('timestamp', ''),
+        'archived_turns': len(archived),
+        'ttl': retention_ttl
+    })
+    
+    with table.batch_writer() as batch:
+        for item in old_items:
+            batch.delete_item(Key={'user_id': user_id, 'conversation_id': item['conversation_id']})
+    
+    # The head must outlive the hot turns so follow-ups still find the context
+    try:
+        table.update_item(
+            Key={'user_id': user_id, 'conversation_id': f"{HEAD_PREFIX}{conversation_id}"},
+            UpdateExpression='SET #ttl = :ttl',
+            ConditionExpression='attribute_exists(user_id)',
+            ExpressionAttributeNames={'#ttl': 'ttl'},
+            ExpressionAttributeValues={':ttl': retention_ttl}
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
+    
+    return len(old_items)
+
+def archive_old_interactions(older_than_days=None, context=None):
+    """
+    Compact interactions older than N days into the S3 cold tier (scheduled job)
+    
+    A keys-only parallel scan finds conversations with old turns, then each one
+    is archived in turn. Stops early when the invocation is about to time out;
+    the next run picks up the rest.
+    """
+    if not KNOWLEDGE_BUCKET:
+        raise ValueError('Archiving is not configured (KNOWLEDGE_BUCKET is not set)')
+    
+    days = int(older_than_days or ARCHIVE_AFTER_DAYS)
+    cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+    scan_kwargs = {
+        'ProjectionExpression': 'user_id, base_conversation_id, conversation_id',
+        'FilterExpression': '#ts < :cutoff AND attribute_not_exists(record_type)',
+        'ExpressionAttributeNames': {'#ts': 'timestamp'},
+        'ExpressionAttributeValues': {':cutoff': {'S': cutoff}}
+    }
+    conversations = set()
+    for item in iter_scan_items(scan_kwargs, EXPORT_SCAN_SEGMENTS):
+        conversations.add((item['user_id'], item.get('base_conversation_id') or item['conversation_id'].rsplit('#', 1)[0]))
+    
+    archived_conversations = 0
+    archived_interactions = 0
+    remaining = len(conversations)
+    for user_id, conversation_id in sorted(conversations):
+        if context and context.get_remaining_time_in_millis() < ARCHIVE_TIME_RESERVE_MS:
+            logger.warning(f"Stopping archive run with {remaining} conversations left")
+            break
+        try:
+            archived_interactions += archive_conversation(user_id, conversation_id, cutoff)
+            archived_conversations += 1
+        except Exception as e:
+            logger.error(f"Error archiving {user_id}/{conversation_id}: {str(e)}", exc_info=True)
+        remaining -= 1
+    
+    logger.info(f"Archived {archived_interactions} interactions from {archived_conversations} conversations "
+                f"older than {cutoff}")
+    return {
+        'statusCode': 200,
+        'cutoff': cutoff,
+        'archived_conversations': archived_conversations,
+        'archived_interactions': archived_interactions,
+        'remaining_conversations': remaining
+    }
+
+# Wrapping happens once at import, so a disabled profiler adds no per-invocation work
+if profiling_configured():
+    lambda_handler = with_profiling(lambda_handler, 'conversation', extract_user_from_api_gateway_event, get_s3_client)
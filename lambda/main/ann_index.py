@@ -0,0 +1,214 @@
+# approximate nearest-neighbour index for knowledge base chunks
+"""
+IVF-PQ index over L2-normalized chunk embeddings, implemented on NumPy.
+
+Vectors are assigned to one of nlist coarse centroids (the inverted file) and
+the residual to that centroid is product-quantized into m one-byte codes. A
+query scores only the nprobe closest lists, using one m x 256 lookup table of
+inner products, so cost grows with nprobe rather than with the corpus size.
+
+Built offline by tools/build_ann_index.py and loaded by the main Lambda.
+Tuning knobs:
+    nlist / m      fixed at build time (more lists = faster, larger m = more accurate)
+    nprobe         lists scanned per query (recall vs latency)
+    refine         re-score this many candidates exactly (needs stored vectors)
+"""
+import json
+import re
+import zlib
+
+import numpy as np
+
+INDEX_VERSION = 1
+HASHING_EMBEDDING = 'hashing'
+
+
+def normalize(vectors):
+    """L2-normalize rows so inner product equals cosine similarity"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def hashing_embedding(text, dim):
+    """
+    Model-free text embedding (signed hashing of word unigrams and bigrams)
+
+    Used when no embedding endpoint is available; the index must have been
+    built with the same scheme.
+    """
+    tokens = re.findall(r'[a-z0-9²]+', text.lower())
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in features:
+        digest = zlib.crc32(feature.encode('utf-8'))
+        vector[digest % dim] += 1.0 if (digest >> 31) & 1 else -1.0
+    return normalize(vector)
+
+
+def kmeans(vectors, k, iterations=20, seed=0, batch_size=8192):
+    """Plain Lloyd's k-means on squared L2 distance; returns (k, dim) centroids"""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = assign(vectors, centroids, batch_size)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=k)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Re-seed empty clusters from random points
+        if empty.any():
+            centroids[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+    return centroids
+
+
+def assign(vectors, centroids, batch_size=8192):
+    """Index of the nearest centroid (squared L2) for every row, in batches"""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        distances = centroid_norms[None, :] - 2 * batch @ centroids.T
+        assignments[start:start + batch_size] = distances.argmin(axis=1)
+    return assignments
+
+
+def exact_search(vectors, query, k):
+    """Brute-force inner-product search; the reference for recall benchmarks"""
+    scores = vectors @ query
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return top, scores[top]
+
+
+class IVFPQIndex:
+    """Inverted-file index with product-quantized residuals (inner-product search)"""
+
+    def __init__(self, coarse_centroids, codebooks, codes, ids, list_offsets, metadata,
+                 vectors=None, info=None):
+        self.coarse_centroids = coarse_centroids  # (nlist, dim)
+        self.codebooks = codebooks                # (m, ksub, dim / m)
+        self.codes = codes                        # (n, m) uint8, grouped by list
+        self.ids = ids                            # (n,) row in metadata for each code
+        self.list_offsets = list_offsets          # (nlist + 1,) start of each list in codes
+        self.metadata = metadata                  # per-row dicts (concept_id, vector_id, ...)
+        self.vectors = vectors                    # optional (n, dim) float16 for exact refine, by id
+        self.info = info or {}
+
+    @property
+    def dim(self):
+        return self.coarse_centroids.shape[1]
+
+    @property
+    def nlist(self):
+        return self.coarse_centroids.shape[0]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, vectors, metadata, nlist=None, m=48, train_size=50000, iterations=20,
+              store_vectors=False, seed=0, info=None):
+        """Train coarse and PQ codebooks on a sample, then encode every vector"""
+        vectors = normalize(vectors)
+        n, dim = vectors.shape
+        if dim % m:
+            raise ValueError(f"Embedding dimension {dim} is not divisible by m={m}")
+        nlist = min(nlist or max(1, int(4 * np.sqrt(n))), n)
+
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, min(train_size, n), replace=False)]
+
+        coarse_centroids = kmeans(sample, nlist, iterations, seed)
+        residuals = sample - coarse_centroids[assign(sample, coarse_centroids)]
+
+        sub_dim = dim // m
+        ksub = min(256, len(sample))
+        codebooks = np.stack([
+            kmeans(np.ascontiguousarray(residuals[:, j * sub_dim:(j + 1) * sub_dim]), ksub, iterations, seed + j)
+            for j in range(m)
+        ])
+
+        lists = assign(vectors, coarse_centroids)
+        all_residuals = vectors - coarse_centroids[lists]
+        codes = np.empty((n, m), dtype=np.uint8)
+        for j in range(m):
+            codes[:, j] = assign(np.ascontiguousarray(all_residuals[:, j * sub_dim:(j + 1) * sub_dim]),
+                                 codebooks[j])
+
+        order = np.argsort(lists, kind='stable')
+        list_offsets = np.zeros(coarse_centroids.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(lists, minlength=coarse_centroids.shape[0]), out=list_offsets[1:])
+
+        return cls(coarse_centroids, codebooks, codes[order], order.astype(np.int32), list_offsets,
+                   metadata, vectors.astype(np.float16) if store_vectors else None, info)
+
+    def search(self, query, k=10, nprobe=8, refine=0):
+        """
+        Return (ids, scores) of the approximate top-k rows for a normalized query
+
+        With stored vectors and refine > k, the best `refine` PQ candidates are
+        re-scored exactly before taking the top k.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        coarse_scores = self.coarse_centroids @ query
+        nprobe = min(nprobe, self.nlist)
+        probe = np.argpartition(-coarse_scores, nprobe - 1)[:nprobe]
+
+        # <q, c + r> = <q, c> + sum_j <q_j, codeword_j>: one lookup table serves every list
+        m, _, sub_dim = self.codebooks.shape
+        lookup = np.einsum('mkd,md->mk', self.codebooks, query.reshape(m, sub_dim))
+
+        candidate_rows = [np.arange(self.list_offsets[list_id], self.list_offsets[list_id + 1]) for list_id in probe]
+        list_bias = [np.full(len(rows), coarse_scores[list_id], dtype=np.float32)
+                     for rows, list_id in zip(candidate_rows, probe)]
+        rows = np.concatenate(candidate_rows) if candidate_rows else np.empty(0, dtype=np.int64)
+        if not len(rows):
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        scores = lookup[np.arange(m)[None, :], self.codes[rows]].sum(axis=1) + np.concatenate(list_bias)
+        ids = self.ids[rows]
+
+        keep = max(k, refine) if self.vectors is not None and refine else k
+        keep = min(keep, len(scores))
+        top = np.argpartition(-scores, keep - 1)[:keep]
+        ids, scores = ids[top], scores[top]
+
+        if self.vectors is not None and refine:
+            scores = self.vectors[ids].astype(np.float32) @ query
+
+        order = np.argsort(-scores)[:k]
+        return ids[order], scores[order]
+
+    def save(self, path):
+        """Write the index as a single .npz file"""
+        arrays = {
+            'coarse_centroids': self.coarse_centroids,
+            'codebooks': self.codebooks,
+            'codes': self.codes,
+            'ids': self.ids,
+            'list_offsets': self.list_offsets,
+            'header': np.frombuffer(json.dumps({
+                'version': INDEX_VERSION,
+                'info': self.info,
+                'metadata': self.metadata
+            }).encode('utf-8'), dtype=np.uint8)
+        }
+        if self.vectors is not None:
+            arrays['vectors'] = self.vectors
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(data['header'].tobytes().decode('utf-8'))
+            if header.get('version') != INDEX_VERSION:
+                raise ValueError(f"Unsupported index version: {header.get('version')}")
+            return cls(data['coarse_centroids'], data['codebooks'], data['codes'], data['ids'],
+                       data['list_offsets'], header['metadata'],
+                       data['vectors'] if 'vectors' in data.files else None, header.get('info'))
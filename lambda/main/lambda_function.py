@@ -3,10 +3,14 @@ import json
 import boto3
 import os
 import uuid
+import time
 from datetime import datetime
 import logging
 import re
 import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from profiling import profiling_configured, with_profiling  # lambda/shared, bundled by package-lambda.sh
 
 # Configure logging
 logger = logging.getLogger()
@@ -17,26 +21,205 @@ s3 = boto3.client('s3')
 dynamodb = boto3.resource('dynamodb')
 lambda_client = boto3.client('lambda')
 sagemaker_runtime = boto3.client('sagemaker-runtime')
+sqs = boto3.client('sqs')
 
 # Get environment variables
 VECTOR_TABLE = os.environ.get('VECTOR_TABLE')
 KNOWLEDGE_BUCKET = os.environ.get('KNOWLEDGE_BUCKET')
 CONVERSATION_FUNCTION = os.environ.get('CONVERSATION_FUNCTION')
 SAGEMAKER_ENDPOINT = os.environ.get('SAGEMAKER_ENDPOINT')
+COORDINATION_TABLE = os.environ.get('COORDINATION_TABLE')
+
+# CloudWatch namespace for custom metrics (emitted as Embedded Metric Format logs)
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'TechTranslator')
+
+# Per-user admission control protecting the SageMaker endpoint
+ADMISSION_CONTROL_ENABLED = os.environ.get('ADMISSION_CONTROL_ENABLED', 'true').lower() == 'true'
+USER_RATE_PER_MINUTE = int(os.environ.get('USER_RATE_PER_MINUTE', '10'))
+USER_BURST = int(os.environ.get('USER_BURST', '5'))
+ENDPOINT_CAPACITY_PER_MINUTE = int(os.environ.get('ENDPOINT_CAPACITY_PER_MINUTE', '60'))
+SATURATION_COOLDOWN_SECONDS = 30
+ADMISSION_WINDOW_SECONDS = 60
+_user_buckets = {}  # user_id -> (tokens, updated_at)
+_endpoint_throttles = {}  # endpoint name -> when it last throttled us
+
+# Cross-container coalescing of identical in-flight queries
+COALESCING_ENABLED = os.environ.get('COALESCING_ENABLED', 'true').lower() == 'true'
+COALESCE_POLL_SECONDS = 0.25
+INFLIGHT_LEASE_SECONDS = 15  # also the longest a follower waits before taking over a silent leader's query
+COALESCED_RESULT_TTL_SECONDS = 120
+
+# Idempotent queries: a retry with the same key (or request fingerprint) replays the first response
+IDEMPOTENCY_ENABLED = os.environ.get('IDEMPOTENCY_ENABLED', 'true').lower() == 'true'
+IDEMPOTENCY_HEADER = 'idempotency-key'
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '600'))
+# Without a client key, only near-immediate repeats count as retries; a deliberate re-ask gets a new turn
+FINGERPRINT_TTL_SECONDS = int(os.environ.get('FINGERPRINT_TTL_SECONDS', '30'))
+# Outlives the function's 120 s timeout (infrastructure/lambda.yaml), so a live original is never taken over
+IDEMPOTENCY_LEASE_SECONDS = int(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '150'))
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', '20'))
+IDEMPOTENCY_POLL_SECONDS = 0.5
+
+# Async jobs: while the endpoint is saturated, queries are queued and answered by the SQS worker
+ASYNC_JOBS_ENABLED = os.environ.get('ASYNC_JOBS_ENABLED', 'true').lower() == 'true'
+JOB_QUEUE_URL = os.environ.get('JOB_QUEUE_URL')
+JOB_PREFIX = 'job#'
+JOB_TTL_SECONDS = 24 * 3600
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))  # the last attempt accepts the fallback answer
+JOB_RETRY_DELAY_SECONDS = int(os.environ.get('JOB_RETRY_DELAY_SECONDS', '10'))
+JOB_POLL_SECONDS = 2  # suggested client polling interval
+
+# Speculative prefetch: after an initial explanation, answer its likeliest generic follow-ups ahead of time
+PREFETCH_ENABLED = os.environ.get('PREFETCH_ENABLED', 'false').lower() == 'true'
+PREFETCH_FUNCTION = os.environ.get('PREFETCH_FUNCTION') or os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+PREFETCH_TOP_K = int(os.environ.get('PREFETCH_TOP_K', '2'))
+PREFETCH_BUDGET_PER_MINUTE = int(os.environ.get('PREFETCH_BUDGET_PER_MINUTE', '20'))
+PREFETCH_IDLE_SHARE = float(os.environ.get('PREFETCH_IDLE_SHARE', '0.5'))  # endpoint budget share prefetch may fill
+PREFETCH_TTL_SECONDS = int(os.environ.get('PREFETCH_TTL_SECONDS', '900'))
+PREFETCH_PREFIX = 'prefetch#'
+
+# In-container answer cache for repeated questions
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get('ANSWER_CACHE_MAX_ENTRIES', '500'))
+ANSWER_CACHE_TTL_SECONDS = int(os.environ.get('ANSWER_CACHE_TTL_SECONDS', '3600'))
+_answer_cache = OrderedDict()  # cache key -> (expires_at, answer)
+
+# Batch query settings
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '25'))
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', '4'))
+
+# Warm-up settings
+MAX_WARMUP_CONCURRENCY = int(os.environ.get('MAX_WARMUP_CONCURRENCY', '10'))
+DEFAULT_WARMUP_HOLD_MS = 100
+
+# In-container retrieval cache; knowledge base chunks change only on re-ingestion
+RETRIEVAL_CACHE_TTL_SECONDS = int(os.environ.get('RETRIEVAL_CACHE_TTL_SECONDS', '300'))
+# Vector table GSI keyed concept_id + retrieval_key ({audience or 'all'}#{type}#{vector_id})
+RETRIEVAL_INDEX = os.environ.get('RETRIEVAL_INDEX', 'concept-retrieval-index')
+GENERAL_CHUNK_PREFIX = 'all'
+_retrieval_cache = {}  # (concept, audience) -> (expires_at, chunks)
+
+# Compound questions: concepts kept per query and the shared prompt-context budget
+MAX_CONCEPTS = int(os.environ.get('MAX_CONCEPTS', '3'))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', '160'))
+CHUNK_CHAR_LIMIT = 200
+
+# Model routing: each query goes to the cheapest tier able to handle its complexity
+ROUTING_ENABLED = os.environ.get('ROUTING_ENABLED', 'true').lower() == 'true'
+SMALL_MODEL_ENDPOINT = os.environ.get('SMALL_MODEL_ENDPOINT')
+COMPLEXITY_LEVELS = ['trivial', 'simple', 'complex']
+TEMPLATE_TIER = 'template'
+DEFAULT_TIER = 'large'
+# Context-free follow-ups, most common first: type -> (canonical query, phrasings it covers)
+# Only these may get a canned (template tier) or prefetched answer; anything more specific needs a model
+GENERIC_FOLLOW_UPS = {
+    'elaboration': ('Tell me more', {
+        'tell me more', 'more', 'more please', 'more details', 'go on', 'elaborate', 'can you elaborate',
+        'please elaborate', 'tell me more about it', 'tell me more about that', 'expand on that'
+    }),
+    'example': ('Can you give me an example?', {
+        'example', 'an example', 'example please', 'give me an example', 'can you give me an example',
+        'can you give an example', 'show me an example', 'any examples', 'for instance'
+    }),
+    'clarification': ('What does that mean?', {
+        'what does that mean', 'what does it mean', 'what do you mean', 'i dont understand',
+        'can you clarify', 'clarify', 'explain that'
+    }),
+}
+GENERATION_PARAMETERS = {
+    "max_new_tokens": 200,
+    "temperature": 0.4,
+    "do_sample": True,
+    "top_p": 0.9,
+    "repetition_penalty": 1.15,
+}
+# cost is relative to one large-model call; latency_ms is the expected p50
+MODEL_TIERS = {
+    TEMPLATE_TIER: {'endpoint': None, 'cost': 0.0, 'latency_ms': 1, 'max_complexity': 'trivial',
+                    'parameters': None},
+    'small': {'endpoint': SMALL_MODEL_ENDPOINT, 'cost': 0.2, 'latency_ms': 300, 'max_complexity': 'simple',
+              'parameters': {**GENERATION_PARAMETERS, "max_new_tokens": 120, "temperature": 0.3}},
+    DEFAULT_TIER: {'endpoint': SAGEMAKER_ENDPOINT, 'cost': 1.0, 'latency_ms': 1500, 'max_complexity': 'complex',
+                   'parameters': GENERATION_PARAMETERS},
+}
+# MODEL_TIERS='{"small": {"endpoint": "flan-t5-small"}}' adjusts or adds tiers without a code change
+for _tier_name, _overrides in json.loads(os.environ.get('MODEL_TIERS') or '{}').items():
+    MODEL_TIERS.setdefault(_tier_name, {'cost': 1.0, 'latency_ms': 1500, 'max_complexity': 'complex',
+                                        'parameters': GENERATION_PARAMETERS}).update(_overrides)
+
+# Approximate nearest-neighbour concept search for queries with no keyword match
+ANN_INDEX_KEY = os.environ.get('ANN_INDEX_KEY', 'ann/index.npz')
+ANN_NPROBE = int(os.environ.get('ANN_NPROBE', '8'))
+ANN_REFINE = int(os.environ.get('ANN_REFINE', '50'))  # exact re-rank of the best PQ candidates (needs stored vectors)
+ANN_MIN_SCORE = float(os.environ.get('ANN_MIN_SCORE', '0.35'))
+ANN_TOP_K = 10
+ANN_INDEX_PATH = '/tmp/ann_index.npz'
+EMBEDDING_ENDPOINT = os.environ.get('EMBEDDING_ENDPOINT')
+_ann_index = None
+_ann_index_etag = None
+_ann_index_checked_at = 0.0  # last check of the index object, repeated after the retrieval TTL
+
+# Container lifecycle, reported by warm-up invocations
+CONTAINER_ID = uuid.uuid4().hex[:12]
+_cold_start = True
+
+# Concept and audience vocabularies used for extraction
+CONCEPT_KEYWORDS = {
+    'r-squared': [
+        'r squared', 'r-squared', 'r2', 'r²', 'coefficient of determination', 
+        'r square', 'goodness of fit', 'variance explained', 'model fit'
+    ],
+    'loss-ratio': [
+        'loss ratio', 'claims ratio', 'incurred losses', 'loss ratios',
+        'claim ratio', 'losses to premiums', 'loss rate', 'claim rate'
+    ],
+    'predictive-model': [
+        'predictive model', 'prediction model', 'machine learning', 'ml model', 
+        'models', 'modeling', 'algorithm', 'statistical model', 'data model',
+        'pricing model', 'risk model', 'glm', 'regression'
+    ]
+}
+
+AUDIENCE_KEYWORDS = {
+    'underwriter': ['underwriter', 'underwriting', 'underwriters', 'uw'],
+    'actuary': ['actuary', 'actuarial', 'actuaries', 'pricing actuary'],
+    'executive': ['executive', 'ceo', 'manager', 'leadership', 'executives', 'management', 'director']
+}
+
+UNKNOWN_CONCEPT_RESPONSE = "I can help explain data science and machine learning concepts used in insurance, such as R-squared, loss ratio, and predictive models. Could you please ask about one of these specific topics?"
 
 # CORS headers for API Gateway integration
 CORS_HEADERS = {
     'Content-Type': 'application/json',
     'Access-Control-Allow-Origin': '*',
     'Access-Control-Allow-Methods': 'OPTIONS,POST,GET',
-    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'
+    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,Idempotency-Key,X-Profile'
 }
 
 def lambda_handler(event, context):
     """Main Lambda function - FIXED user extraction"""
+    global _cold_start
+    was_cold_start = _cold_start
+    _cold_start = False
+    
+    # Scheduled warm-up pings never reach user data or SageMaker
+    if is_warmup_event(event):
+        return handle_warmup(event, context, was_cold_start)
+    
+    # Queued jobs arrive from the SQS event source mapping
+    if is_job_batch(event):
+        return handle_job_batch(event, context)
+    
+    # Speculative follow-up answers, invoked asynchronously after an initial explanation
+    if is_prefetch_event(event):
+        return handle_prefetch(event['prefetch'])
+    
     try:
         logger.info(f"Received event: {json.dumps(event)}")
         
+        job_id = (event.get('pathParameters') or {}).get('job_id')
+        if event.get('httpMethod') == 'GET' and job_id:
+            return get_job_status(job_id, extract_user_email_from_cognito(event))
+        
         # Parse request body
         body = json.loads(event.get('body', '{}')) if event.get('body') else {}
         query = body.get('query', '')
@@ -46,6 +229,10 @@ def lambda_handler(event, context):
         user_id = extract_user_email_from_cognito(event)
         logger.info(f"🎯 Extracted user_id: {user_id}")
 
+        # Batch mode: {"queries": [...]} is answered per item, in order
+        if 'queries' in body:
+            return handle_batch_query(body.get('queries'), user_id)
+
         if not query:
             return {
                 'statusCode': 400,
@@ -56,92 +243,1049 @@ def lambda_handler(event, context):
         logger.info(f"Processing query: {query} for user: {user_id}")
         
         # Check if SageMaker endpoint is configured
-        if not SAGEMAKER_ENDPOINT or SAGEMAKER_ENDPOINT in ['', 'NOT_CONFIGURED', 'PLACEHOLDER']:
-            logger.error("SageMaker endpoint not configured")
-            return {
-                'statusCode': 503,
-                'headers': CORS_HEADERS,
-                'body': json.dumps({
-                    'error': 'AI service temporarily unavailable',
-                    'message': 'SageMaker endpoint not configured. Please deploy the model first.',
-                    'concept': 'unknown',
-                    'audience': 'general'
-                })
-            }
+        if not is_endpoint_configured():
+            return endpoint_not_configured_response()
         
-        # Get conversation history to check for context
-        conversation_context = get_conversation_context(user_id, conversation_id) if conversation_id else None
-        logger.info(f"Conversation context: {conversation_context}")
+        # Retries of the same request replay the first response instead of recomputing it
+        idempotency_key, replay_ttl = request_idempotency_key(event, body, user_id, query, conversation_id)
+        return run_idempotent(idempotency_key, replay_ttl,
+                              lambda: answer_query(query, conversation_id, user_id,
+                                                   (idempotency_key, replay_ttl)),
+                              idempotent_request_hash(query, conversation_id))
+    except Exception as e:
+        logger.error(f"Error: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'headers': CORS_HEADERS,
+            'body': json.dumps({'error': f'Internal server error: {str(e)}'})
+        }
+
+def answer_query(query, conversation_id, user_id, idempotency=None, job=None):
+    """
+    Answer one query, store it in the conversation and build the API response
+    
+    While the endpoint is saturated the query is queued instead and a 202 with
+    the job id is returned. The queue worker calls this again with the job, and
+    then waits for endpoint capacity rather than queueing or degrading.
+    """
+    # Get conversation history to check for context
+    conversation_context = get_conversation_context(user_id, conversation_id) if conversation_id else None
+    logger.info(f"Conversation context: {conversation_context}")
+    
+    # Enhanced follow-up detection
+    is_follow_up, follow_up_type = detect_follow_up_question(query, conversation_context)
+    logger.info(f"Follow-up detection: {is_follow_up}, type: {follow_up_type}")
+    
+    # Extract concept and audience with better logic
+    if is_follow_up and conversation_context:
+        concept = conversation_context.get('concept', 'unknown')
+        audience = conversation_context.get('audience', 'general')
+        concepts = [concept]
+        logger.info(f"Using preserved context - Concept: {concept}, Audience: {audience}")
+    else:
+        concept_and_audience = extract_concept_and_audience(query)
+        concept = concept_and_audience['concept']
+        concepts = concept_and_audience['concepts']
+        audience = concept_and_audience['audience']
+        logger.info(f"Extracted new context - Concepts: {concepts}, Audience: {audience}")
+    
+    # No keyword match: fall back to semantic search over the knowledge base
+    if concept == 'unknown':
+        concept = find_concept_by_similarity(query) or 'unknown'
+        concepts = [concept]
+    
+    # Skip processing if concept is unknown
+    if concept == 'unknown':
+        return {
+            'statusCode': 200,
+            'headers': CORS_HEADERS,
+            'body': json.dumps({
+                'query': query,
+                'response': UNKNOWN_CONCEPT_RESPONSE,
+                'concept': 'unknown',
+                'audience': audience,
+                'conversation_id': conversation_id or new_conversation_id()
+            })
+        }
+    
+    concept_and_audience = {'concept': concept, 'concepts': concepts, 'audience': audience}
+    cache_key = answer_cache_key(query, concept, audience, follow_up_type if is_follow_up else None)
+    
+    # Every turn consumes the answers prefetched after the previous one
+    response = None
+    if prefetch_enabled() and conversation_id and job is None:
+        response = serve_prefetched_answer(take_prefetched_answers(user_id, conversation_id), query,
+                                           concept_and_audience, follow_up_type if is_follow_up else None,
+                                           conversation_context)
+        if response is not None:
+            put_cached_answer(cache_key, response)
+    if response is None:
+        response = get_cached_answer(cache_key)
+    degraded = False
+    
+    tier = route_query(query, concept_and_audience, is_follow_up, follow_up_type)[0] if response is None else None
+    
+    if response is not None:
+        logger.info("Serving answer from cache")
+    elif tier == TEMPLATE_TIER:
+        # Canned answers need neither retrieval nor inference
+        started = time.perf_counter()
+        response = template_answer(query, concept_and_audience, follow_up_type)
+        emit_metric('TierLatency', round((time.perf_counter() - started) * 1000, 3), 'Milliseconds',
+                    {'Tier': tier})
+        logger.info("Answered from template tier")
+    else:
+        # Get relevant context from DynamoDB with better filtering
+        relevant_chunks = get_relevant_context_multi(concepts, audience, query)
+        logger.info(f"Retrieved {len(relevant_chunks)} relevant chunks")
         
-        # Enhanced follow-up detection
-        is_follow_up, follow_up_type = detect_follow_up_question(query, conversation_context)
-        logger.info(f"Follow-up detection: {is_follow_up}, type: {follow_up_type}")
+        def compute_answer():
+            if job is not None:
+                reserve_job_capacity(job)
+            elif not admit_request(user_id):
+                # Over the limit while the endpoint is saturated: queue it, or answer without inference
+                if async_jobs_enabled():
+                    return None, 'queued'
+                return create_structured_fallback_response(query, concept_and_audience, relevant_chunks,
+                                                           is_follow_up, follow_up_type), 'degraded'
+            
+            # Generate response using enhanced FLAN-T5 prompting
+            throttled_before = last_endpoint_throttle()
+            answer, source = generate_answer(
+                query, 
+                concept_and_audience, 
+                relevant_chunks, 
+                is_follow_up,
+                follow_up_type,
+                conversation_context,
+                tier
+            )
+            if source == 'fallback' and last_endpoint_throttle() != throttled_before:
+                # SageMaker throttled this call: retry later rather than settle for fallback text
+                if job is not None and job['attempt'] < JOB_MAX_ATTEMPTS:
+                    raise EndpointBusy('SageMaker throttled the job')
+                if job is None and async_jobs_enabled():
+                    return None, 'queued'
+            return answer, source
         
-        # Extract concept and audience with better logic
-        if is_follow_up and conversation_context:
-            concept = conversation_context.get('concept', 'unknown')
-            audience = conversation_context.get('audience', 'general')
-            logger.info(f"Using preserved context - Concept: {concept}, Audience: {audience}")
+        # Identical queries in flight in other containers share one inference
+        response, source = run_single_flight(cache_key, compute_answer)
+        if source == 'queued':
+            conversation_id = conversation_id or new_conversation_id()
+            queued = enqueue_answer_job(query, conversation_id, user_id, idempotency)
+            if queued:
+                return queued
+            response, source = create_structured_fallback_response(query, concept_and_audience, relevant_chunks,
+                                                                   is_follow_up, follow_up_type), 'degraded'
+        if source in ('model', 'coalesced'):
+            put_cached_answer(cache_key, response)
+        degraded = source == 'degraded'
+        logger.info(f"Generated response using enhanced prompts ({source}, {tier} tier)")
+    
+    # Store conversation
+    if not conversation_id:
+        conversation_id = new_conversation_id()
+    
+    store_conversation(user_id, conversation_id, query, response, concept, audience, idempotency)
+    logger.info(f"Stored conversation: {conversation_id}")
+    
+    if prefetch_enabled() and not is_follow_up and not degraded and job is None:
+        schedule_prefetch(user_id, conversation_id, concept_and_audience)
+    
+    result = {
+        'query': query,
+        'response': response,
+        'concept': concept,
+        'audience': audience,
+        'conversation_id': conversation_id
+    }
+    if len(concepts) > 1:
+        result['concepts'] = concepts
+    if degraded:
+        result['degraded'] = True
+    
+    return {
+        'statusCode': 200,
+        'headers': CORS_HEADERS,
+        'body': json.dumps(result)
+    }
+
+def is_warmup_event(event):
+    """Warm-up events look like {"warmup": true} or {"warmup": {"concurrency": N}}"""
+    return isinstance(event, dict) and 'warmup' in event and 'httpMethod' not in event
+
+def handle_warmup(event, context, was_cold_start):
+    """
+    Answer a warm-up ping: prime this container, optionally keep more containers
+    warm by invoking this function concurrently, and report whether it was cold
+    """
+    started = time.time()
+    options = event['warmup'] if isinstance(event['warmup'], dict) else {}
+    concurrency = max(1, min(int(options.get('concurrency', 1)), MAX_WARMUP_CONCURRENCY))
+    hold_ms = int(options.get('hold_ms', DEFAULT_WARMUP_HOLD_MS))
+    
+    primed = prime_container()
+    
+    result = {
+        'statusCode': 200,
+        'warmup': True,
+        'cold_start': was_cold_start,
+        'container_id': CONTAINER_ID,
+        'primed': primed
+    }
+    
+    # Only the scheduled (root) ping fans out; the pings it sends have child=True
+    if not options.get('child'):
+        function_name = context.invoked_function_arn if context else os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+        result['fanout'] = fan_out_warmup(function_name, concurrency - 1, hold_ms)
+        result['conversation'] = invoke_warmup(CONVERSATION_FUNCTION, {'concurrency': concurrency, 'hold_ms': hold_ms})
+    
+    # Hold the container briefly so concurrent pings land on separate containers
+    remaining = hold_ms / 1000 - (time.time() - started)
+    if remaining > 0:
+        time.sleep(remaining)
+    
+    result['duration_ms'] = int((time.time() - started) * 1000)
+    logger.info(f"Warm-up: {json.dumps(result)}")
+    return result
+
+def prime_container():
+    """Load the retrieval cache for every known concept/audience pair"""
+    started = time.time()
+    entries = 0
+    for concept in CONCEPT_KEYWORDS:
+        for audience in list(AUDIENCE_KEYWORDS) + ['general']:
+            if get_relevant_context_enhanced(concept, audience, ''):
+                entries += 1
+    return {'retrieval_entries': entries, 'seconds': round(time.time() - started, 3)}
+
+def invoke_warmup(function_name, options):
+    """Send one warm-up ping and return its report (or the error)"""
+    if not function_name:
+        return {'error': 'function name not available'}
+    try:
+        response = lambda_client.invoke(
+            FunctionName=function_name,
+            InvocationType='RequestResponse',
+            Payload=json.dumps({'warmup': options})
+        )
+        return json.loads(response['Payload'].read())
+    except Exception as e:
+        logger.error(f"Warm-up ping to {function_name} failed: {str(e)}")
+        return {'error': str(e)}
+
+def fan_out_warmup(function_name, count, hold_ms):
+    """Invoke this function count times concurrently to keep that many extra containers warm"""
+    if count <= 0:
+        return {'requested': 0, 'containers': 0, 'cold_starts': 0, 'errors': 0}
+    
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        reports = list(executor.map(
+            lambda _: invoke_warmup(function_name, {'child': True, 'hold_ms': hold_ms}),
+            range(count)
+        ))
+    
+    return {
+        'requested': count,
+        'containers': len({report.get('container_id') for report in reports if report.get('container_id')}),
+        'cold_starts': sum(1 for report in reports if report.get('cold_start')),
+        'errors': sum(1 for report in reports if 'error' in report)
+    }
+
+def emit_metric(name, value=1, unit='Count', dimensions=None):
+    """Emit a custom metric as a CloudWatch Embedded Metric Format log line"""
+    dimensions = dimensions or {}
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [list(dimensions.keys())],
+                'Metrics': [{'Name': name, 'Unit': unit}]
+            }]
+        },
+        name: value,
+        **dimensions
+    }))
+
+def new_conversation_id():
+    """Time-ordered id in the frontend's chat_<epoch_ms>_<random> format, so histories sort by creation"""
+    return f"chat_{int(time.time() * 1000)}_{uuid.uuid4().hex[:9]}"
+
+def answer_cache_key(query, concept, audience, follow_up_type=None):
+    """Cache key for an answer: normalized query text plus the resolved context"""
+    normalized = ' '.join(query.lower().split())
+    return hashlib.sha256(f"{concept}|{audience}|{follow_up_type}|{normalized}".encode('utf-8')).hexdigest()
+
+def get_cached_answer(cache_key):
+    """Return a cached answer, or None on a miss"""
+    cached = _answer_cache.get(cache_key)
+    if cached and cached[0] > time.time():
+        _answer_cache.move_to_end(cache_key)
+        emit_metric('AnswerCacheHit')
+        return cached[1]
+    if cached:
+        _answer_cache.pop(cache_key, None)
+    emit_metric('AnswerCacheMiss')
+    return None
+
+def put_cached_answer(cache_key, answer):
+    """Store a model answer, evicting the least recently used entries"""
+    _answer_cache[cache_key] = (time.time() + ANSWER_CACHE_TTL_SECONDS, answer)
+    _answer_cache.move_to_end(cache_key)
+    while len(_answer_cache) > ANSWER_CACHE_MAX_ENTRIES:
+        _answer_cache.popitem(last=False)
+
+def take_local_token(user_id, cost=1):
+    """
+    In-container token bucket: a cheap first check before the shared counter
+    
+    A cost above the burst size (a large batch) needs a full bucket and leaves
+    it in debt, so the user's following requests pay for it.
+    """
+    now = time.time()
+    tokens, updated_at = _user_buckets.get(user_id, (USER_BURST, now))
+    tokens = min(USER_BURST, tokens + (now - updated_at) * USER_RATE_PER_MINUTE / 60)
+    
+    if len(_user_buckets) > 10000:
+        _user_buckets.clear()
+    
+    if tokens < min(cost, USER_BURST):
+        _user_buckets[user_id] = (tokens, now)
+        return False
+    
+    _user_buckets[user_id] = (tokens - cost, now)
+    return True
+
+def increment_window_counter(counter_key, cost=1, limit=None):
+    """
+    Add cost to a per-window counter in the coordination table
+    With a limit the update is conditional and returns False once the window is full;
+    a cost above the limit fits only into an empty window
+    """
+    window = int(time.time() // ADMISSION_WINDOW_SECONDS)
+    update_kwargs = {
+        'Key': {'pk': f"{counter_key}#{window}"},
+        'UpdateExpression': 'ADD request_count :cost SET expires_at = :expires_at',
+        'ExpressionAttributeValues': {
+            ':cost': cost,
+            ':expires_at': (window + 2) * ADMISSION_WINDOW_SECONDS
+        }
+    }
+    if limit is not None:
+        update_kwargs['ConditionExpression'] = 'attribute_not_exists(request_count) OR request_count <= :max_before'
+        update_kwargs['ExpressionAttributeValues'][':max_before'] = limit - min(cost, limit)
+    
+    try:
+        dynamodb.Table(COORDINATION_TABLE).update_item(**update_kwargs)
+        return True
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+def last_endpoint_throttle(endpoint=None):
+    """When an endpoint (by default the default tier's) last throttled us; 0.0 if it has not"""
+    return _endpoint_throttles.get(endpoint or MODEL_TIERS[DEFAULT_TIER]['endpoint'], 0.0)
+
+def endpoint_saturated():
+    """The endpoint is saturated if it throttled us recently or this window's shared budget is spent"""
+    if time.time() - last_endpoint_throttle() < SATURATION_COOLDOWN_SECONDS:
+        return True
+    if not COORDINATION_TABLE:
+        return False
+    
+    window = int(time.time() // ADMISSION_WINDOW_SECONDS)
+    response = dynamodb.Table(COORDINATION_TABLE).get_item(Key={'pk': f"endpoint#{window}"})
+    return int(response.get('Item', {}).get('request_count', 0)) >= ENDPOINT_CAPACITY_PER_MINUTE
+
+def admit_request(user_id, cost=1):
+    """
+    Decide whether a request may use fresh inference
+    
+    Users within their rate always are. Over-limit users are still admitted
+    while the endpoint has spare capacity, and turned away only when it is
+    saturated. Errors in the shared counter fail open.
+    """
+    if not ADMISSION_CONTROL_ENABLED:
+        return True
+    
+    try:
+        within_limit = take_local_token(user_id, cost)
+        if within_limit and COORDINATION_TABLE:
+            within_limit = increment_window_counter(f"user#{user_id}", cost, limit=USER_RATE_PER_MINUTE)
+        
+        if within_limit:
+            decision = 'admitted'
+        elif endpoint_saturated():
+            decision = 'throttled'
         else:
-            concept_and_audience = extract_concept_and_audience(query)
-            concept = concept_and_audience['concept']
-            audience = concept_and_audience['audience']
-            logger.info(f"Extracted new context - Concept: {concept}, Audience: {audience}")
+            decision = 'over_limit_admitted'
         
-        # Skip processing if concept is unknown
-        if concept == 'unknown':
+        if decision != 'throttled' and COORDINATION_TABLE:
+            increment_window_counter('endpoint', cost)
+    except Exception as e:
+        logger.error(f"Admission control error, admitting request: {str(e)}")
+        decision = 'admitted'
+    
+    logger.info(f"Admission decision for {user_id}: {decision}")
+    emit_metric('AdmissionDecision', dimensions={'Decision': decision})
+    return decision != 'throttled'
+
+def claim_inflight_lease(cache_key):
+    """
+    Try to become the leader for a query; returns ('leader', None),
+    ('done', answer) or ('pending', None)
+    """
+    table = dynamodb.Table(COORDINATION_TABLE)
+    now = int(time.time())
+    try:
+        table.put_item(
+            Item={
+                'pk': f"inflight#{cache_key}",
+                'status': 'pending',
+                'owner': CONTAINER_ID,
+                'expires_at': now + INFLIGHT_LEASE_SECONDS
+            },
+            # An expired lease means the previous leader died; TTL deletion is lazy
+            ConditionExpression='attribute_not_exists(pk) OR expires_at < :now',
+            ExpressionAttributeValues={':now': now}
+        )
+        return 'leader', None
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
+    
+    item = table.get_item(Key={'pk': f"inflight#{cache_key}"}, ConsistentRead=True).get('Item')
+    if item and item.get('status') == 'done':
+        return 'done', item.get('answer')
+    return 'pending', None
+
+def publish_inflight_result(cache_key, answer, source):
+    """Share the leader's model answer with waiting followers, or release the lease"""
+    table = dynamodb.Table(COORDINATION_TABLE)
+    try:
+        if source == 'model':
+            table.put_item(Item={
+                'pk': f"inflight#{cache_key}",
+                'status': 'done',
+                'answer': answer,
+                'expires_at': int(time.time()) + COALESCED_RESULT_TTL_SECONDS
+            })
+        else:
+            # Fallback text is not worth sharing; let a follower try inference itself
+            table.delete_item(
+                Key={'pk': f"inflight#{cache_key}"},
+                ConditionExpression='#owner = :me',
+                ExpressionAttributeNames={'#owner': 'owner'},
+                ExpressionAttributeValues={':me': CONTAINER_ID}
+            )
+    except Exception as e:
+        logger.error(f"Error publishing in-flight result: {str(e)}")
+
+def run_single_flight(cache_key, compute):
+    """
+    Coalesce identical queries across containers
+    
+    The first request claims a short-lived lease and runs compute(); the others
+    poll for its answer and return it with source 'coalesced'. Only the lease
+    holder computes: when the leader releases its lease (a fallback answer) or
+    lets it expire, the next follower to poll claims it and computes instead.
+    compute() returns (answer, source).
+    """
+    if not COALESCING_ENABLED or not COORDINATION_TABLE:
+        return compute()
+    
+    waited = False
+    while True:
+        try:
+            state, answer = claim_inflight_lease(cache_key)
+        except Exception as e:
+            logger.error(f"Coalescing unavailable, computing directly: {str(e)}")
+            return compute()
+        
+        if state == 'leader':
+            emit_metric('CoalesceTakeover' if waited else 'CoalesceLeader')
+            try:
+                answer, source = compute()
+            except Exception:
+                publish_inflight_result(cache_key, None, 'error')
+                raise
+            publish_inflight_result(cache_key, answer, source)
+            return answer, source
+        
+        if state == 'done':
+            emit_metric('CoalescedRequest')
+            return answer, 'coalesced'
+        
+        waited = True
+        time.sleep(COALESCE_POLL_SECONDS)
+
+def request_idempotency_key(event, body, user_id, query, conversation_id):
+    """
+    Coordination-table key identifying a /query request across retries
+    
+    Uses the client's Idempotency-Key header (or body field) and falls back to a
+    fingerprint of conversation and query; either way it is scoped to the user.
+    Returns (key, seconds the response stays replayable).
+    """
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    client_key = headers.get(IDEMPOTENCY_HEADER) or body.get('idempotency_key')
+    if client_key:
+        request_id, ttl = f"key:{str(client_key)[:128]}", IDEMPOTENCY_TTL_SECONDS
+    else:
+        request_id, ttl = f"fingerprint:{conversation_id or ''}:{query.strip()}", FINGERPRINT_TTL_SECONDS
+    return 'idem#' + hashlib.sha256(f"{user_id}\n{request_id}".encode('utf-8')).hexdigest(), ttl
+
+def idempotent_request_hash(query, conversation_id):
+    """What a key was first used for; a reused key with a different conversation or query is rejected"""
+    return hashlib.sha256(f"{conversation_id or ''}\n{query.strip()}".encode('utf-8')).hexdigest()
+
+def claim_idempotency_key(idempotency_key, request_hash=None):
+    """
+    Try to become the request that computes the response; returns ('leader', None),
+    ('done', stored_response), ('pending', None) or ('mismatch', None) when the key
+    belongs to a different request
+    """
+    table = dynamodb.Table(COORDINATION_TABLE)
+    now = int(time.time())
+    try:
+        table.put_item(
+            Item={
+                'pk': idempotency_key,
+                'status': 'pending',
+                'owner': CONTAINER_ID,
+                'request_hash': request_hash,
+                'expires_at': now + IDEMPOTENCY_LEASE_SECONDS
+            },
+            # Expired records (a dead leader or an old result) are taken over; TTL deletion is lazy
+            ConditionExpression='attribute_not_exists(pk) OR expires_at < :now',
+            ExpressionAttributeValues={':now': now}
+        )
+        return 'leader', None
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
+    
+    item = table.get_item(Key={'pk': idempotency_key}, ConsistentRead=True).get('Item')
+    if item and request_hash and item.get('request_hash') not in (None, request_hash):
+        return 'mismatch', None
+    if item and item.get('status') == 'done':
+        return 'done', json.loads(item['response'])
+    return 'pending', None
+
+def record_idempotent_response(idempotency_key, response, ttl=IDEMPOTENCY_TTL_SECONDS, request_hash=None):
+    """Keep a successful (or queued) response for replay; otherwise release the key so a retry recomputes"""
+    table = dynamodb.Table(COORDINATION_TABLE)
+    try:
+        if response.get('statusCode') in (200, 202):
+            table.put_item(Item={
+                'pk': idempotency_key,
+                'status': 'done',
+                'response': json.dumps(response),
+                'request_hash': request_hash,
+                'expires_at': int(time.time()) + ttl
+            })
+        else:
+            table.delete_item(
+                Key={'pk': idempotency_key},
+                ConditionExpression='#owner = :me',
+                ExpressionAttributeNames={'#owner': 'owner'},
+                ExpressionAttributeValues={':me': CONTAINER_ID}
+            )
+    except Exception as e:
+        logger.error(f"Error recording idempotent response: {str(e)}")
+
+def run_idempotent(idempotency_key, ttl, handle, request_hash=None):
+    """
+    Run handle() once per idempotency key
+    
+    A retry of a finished request gets the stored response back; a retry of one
+    still running waits for it, and answers 409 with Retry-After if it does not
+    finish within IDEMPOTENCY_WAIT_SECONDS. A key reused for a different request
+    (request_hash) answers 422.
+    """
+    if not IDEMPOTENCY_ENABLED or not COORDINATION_TABLE:
+        return handle()
+    
+    deadline = time.time() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        try:
+            state, stored = claim_idempotency_key(idempotency_key, request_hash)
+        except Exception as e:
+            logger.error(f"Idempotency unavailable, handling directly: {str(e)}")
+            return handle()
+        
+        if state == 'leader':
+            try:
+                response = handle()
+            except Exception:
+                record_idempotent_response(idempotency_key, {'statusCode': 500})
+                raise
+            record_idempotent_response(idempotency_key, response, ttl, request_hash)
+            return response
+        
+        if state == 'mismatch':
+            emit_metric('IdempotencyKeyReused')
             return {
-                'statusCode': 200,
+                'statusCode': 422,
                 'headers': CORS_HEADERS,
-                'body': json.dumps({
-                    'query': query,
-                    'response': "I can help explain data science and machine learning concepts used in insurance, such as R-squared, loss ratio, and predictive models. Could you please ask about one of these specific topics?",
-                    'concept': 'unknown',
-                    'audience': audience,
-                    'conversation_id': conversation_id or str(uuid.uuid4())
-                })
+                'body': json.dumps({'error': 'This Idempotency-Key was already used for a different request.'})
             }
         
-        # Get relevant context from DynamoDB with better filtering
-        relevant_chunks = get_relevant_context_enhanced(concept, audience, query)
-        logger.info(f"Retrieved {len(relevant_chunks)} relevant chunks")
+        if state == 'done':
+            emit_metric('IdempotentReplay')
+            stored['headers'] = {**stored.get('headers', {}), 'Idempotent-Replayed': 'true'}
+            return stored
         
-        # Generate response using enhanced FLAN-T5 prompting
-        response = generate_response_with_enhanced_prompts(
-            query, 
-            {'concept': concept, 'audience': audience}, 
-            relevant_chunks, 
-            is_follow_up,
-            follow_up_type,
-            conversation_context
-        )
-        logger.info("Generated response using enhanced prompts")
+        if time.time() + IDEMPOTENCY_POLL_SECONDS > deadline:
+            emit_metric('IdempotentConflict')
+            return {
+                'statusCode': 409,
+                'headers': {**CORS_HEADERS, 'Retry-After': '5', 'Access-Control-Expose-Headers': 'Retry-After'},
+                'body': json.dumps({'error': 'The original request is still being processed. Please retry shortly.'})
+            }
         
-        # Store conversation
-        if not conversation_id:
-            conversation_id = str(uuid.uuid4())
+        time.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+class EndpointBusy(Exception):
+    """Raised by the queue worker to hand a job back until the endpoint has capacity"""
+
+def async_jobs_enabled():
+    return ASYNC_JOBS_ENABLED and bool(JOB_QUEUE_URL) and bool(COORDINATION_TABLE)
+
+def enqueue_answer_job(query, conversation_id, user_id, idempotency=None):
+    """Queue a query for the worker; returns the 202 response, or None if it could not be queued"""
+    job_id = uuid.uuid4().hex
+    now = int(time.time())
+    message = {'job_id': job_id, 'query': query, 'conversation_id': conversation_id,
+               'user_id': user_id, 'queued_at': now}
+    if idempotency:
+        message['idempotency_key'], message['idempotency_ttl'] = idempotency
+    
+    try:
+        dynamodb.Table(COORDINATION_TABLE).put_item(Item={
+            'pk': f"{JOB_PREFIX}{job_id}",
+            'status': 'queued',
+            'user_id': user_id,
+            'conversation_id': conversation_id,
+            'queued_at': now,
+            'expires_at': now + JOB_TTL_SECONDS
+        })
+        sqs.send_message(QueueUrl=JOB_QUEUE_URL, MessageBody=json.dumps(message))
+    except Exception as e:
+        logger.error(f"Error queueing job, answering without inference: {str(e)}")
+        return None
+    
+    logger.info(f"Queued job {job_id} for {user_id}")
+    emit_metric('JobQueued')
+    return {
+        'statusCode': 202,
+        'headers': {
+            **CORS_HEADERS,
+            'Location': f"/jobs/{job_id}",
+            'Retry-After': str(JOB_POLL_SECONDS),
+            'Access-Control-Expose-Headers': 'Location,Retry-After'
+        },
+        'body': json.dumps({
+            'job_id': job_id,
+            'status': 'queued',
+            'query': query,
+            'conversation_id': conversation_id,
+            'poll_after_seconds': JOB_POLL_SECONDS
+        })
+    }
+
+def get_job_status(job_id, user_id):
+    """GET /jobs/{job_id}: the job's status, with the query response once it is done"""
+    item = dynamodb.Table(COORDINATION_TABLE).get_item(
+        Key={'pk': f"{JOB_PREFIX}{job_id}"}, ConsistentRead=True).get('Item')
+    
+    # Another user's job is reported as missing, not forbidden
+    if not item or item.get('user_id') != user_id:
+        return {
+            'statusCode': 404,
+            'headers': CORS_HEADERS,
+            'body': json.dumps({'error': 'Job not found'})
+        }
+    
+    body = {'job_id': job_id, 'status': item['status'], 'conversation_id': item.get('conversation_id')}
+    headers = CORS_HEADERS
+    if 'result' in item:
+        body['result'] = json.loads(item['result'])
+    else:
+        body['poll_after_seconds'] = JOB_POLL_SECONDS
+        headers = {**CORS_HEADERS, 'Retry-After': str(JOB_POLL_SECONDS)}
+    return {'statusCode': 200, 'headers': headers, 'body': json.dumps(body)}
+
+def reserve_job_capacity(job):
+    """
+    Let a queued job use the endpoint only while live traffic leaves capacity
+    
+    Jobs draw from the same per-window endpoint budget as admitted requests, so
+    the worker fills idle capacity instead of competing for it.
+    """
+    if job['attempt'] >= JOB_MAX_ATTEMPTS:
+        return
+    if COORDINATION_TABLE and not increment_window_counter('endpoint', 1, limit=ENDPOINT_CAPACITY_PER_MINUTE):
+        raise EndpointBusy('Endpoint budget for this window is spent')
+
+def is_job_batch(event):
+    records = event.get('Records') if isinstance(event, dict) else None
+    return bool(records) and records[0].get('eventSource') == 'aws:sqs'
+
+def handle_job_batch(event, context):
+    """
+    Answer queued jobs from an SQS batch
+    
+    Jobs that find the endpoint busy are reported as batch item failures and
+    become visible again after a backoff; once one does, the rest of the batch
+    is handed back without trying.
+    """
+    failures = []
+    busy = False
+    for record in event['Records']:
+        attempt = int(record.get('attributes', {}).get('ApproximateReceiveCount', '1'))
+        if not busy:
+            try:
+                process_job(json.loads(record['body']), attempt)
+                continue
+            except EndpointBusy as e:
+                logger.info(f"Deferring job: {str(e)}")
+                busy = True
+            except Exception as e:
+                logger.error(f"Job failed: {str(e)}", exc_info=True)
+                if attempt >= JOB_MAX_ATTEMPTS:
+                    # Out of attempts: let the client stop polling instead of redelivering forever
+                    fail_job(record, str(e))
+                    continue
         
-        store_conversation(user_id, conversation_id, query, response, concept, audience)
-        logger.info(f"Stored conversation: {conversation_id}")
+        emit_metric('JobDeferred')
+        defer_job(record, attempt)
+        failures.append({'itemIdentifier': record['messageId']})
+    
+    return {'batchItemFailures': failures}
+
+def process_job(job, attempt):
+    """Answer one queued query and publish the result on the job record"""
+    job = {**job, 'attempt': attempt}
+    # Redelivered messages are stored once: the key guards the Conversation Lambda's write
+    idempotency = ((job['idempotency_key'], job['idempotency_ttl']) if job.get('idempotency_key')
+                   else (f"{JOB_PREFIX}{job['job_id']}", JOB_TTL_SECONDS))
+    
+    response = answer_query(job['query'], job['conversation_id'], job['user_id'], idempotency, job)
+    status = 'done' if response.get('statusCode') == 200 else 'failed'
+    dynamodb.Table(COORDINATION_TABLE).update_item(
+        Key={'pk': f"{JOB_PREFIX}{job['job_id']}"},
+        UpdateExpression='SET #status = :status, #result = :result, completed_at = :now',
+        ExpressionAttributeNames={'#status': 'status', '#result': 'result'},
+        ExpressionAttributeValues={':status': status, ':result': response['body'], ':now': int(time.time())}
+    )
+    
+    logger.info(f"Job {job['job_id']} {status} after {attempt} attempt(s)")
+    emit_metric('JobCompleted', dimensions={'Status': status})
+    emit_metric('JobQueueTime', max(0, int(time.time()) - int(job.get('queued_at', time.time()))), 'Seconds')
+
+def fail_job(record, error):
+    """Mark a job failed and drop its message"""
+    try:
+        job_id = json.loads(record['body'])['job_id']
+        dynamodb.Table(COORDINATION_TABLE).update_item(
+            Key={'pk': f"{JOB_PREFIX}{job_id}"},
+            UpdateExpression='SET #status = :status, #result = :result, completed_at = :now',
+            ExpressionAttributeNames={'#status': 'status', '#result': 'result'},
+            ExpressionAttributeValues={
+                ':status': 'failed',
+                ':result': json.dumps({'error': f"Job failed: {error}"}),
+                ':now': int(time.time())
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error marking job failed: {str(e)}")
+    emit_metric('JobCompleted', dimensions={'Status': 'failed'})
+
+def defer_job(record, attempt):
+    """Back off a job's next delivery exponentially (the queue's visibility timeout otherwise)"""
+    try:
+        sqs.change_message_visibility(
+            QueueUrl=JOB_QUEUE_URL,
+            ReceiptHandle=record['receiptHandle'],
+            VisibilityTimeout=min(900, JOB_RETRY_DELAY_SECONDS * 2 ** (attempt - 1))
+        )
+    except Exception as e:
+        logger.error(f"Error deferring job: {str(e)}")
+
+def prefetch_enabled():
+    return PREFETCH_ENABLED and bool(PREFETCH_FUNCTION) and bool(COORDINATION_TABLE)
+
+def is_prefetch_event(event):
+    """Prefetch events look like {"prefetch": {"user_id": ..., "conversation_id": ..., ...}}"""
+    return isinstance(event, dict) and 'prefetch' in event and 'httpMethod' not in event
+
+def prefetch_key(user_id, conversation_id):
+    return PREFETCH_PREFIX + hashlib.sha256(f"{user_id}\n{conversation_id}".encode('utf-8')).hexdigest()
+
+def schedule_prefetch(user_id, conversation_id, concept_and_audience):
+    """Hand prefetching to an asynchronous invocation so the user's response is not held up"""
+    try:
+        lambda_client.invoke(
+            FunctionName=PREFETCH_FUNCTION,
+            InvocationType='Event',
+            Payload=json.dumps({'prefetch': {
+                'user_id': user_id,
+                'conversation_id': conversation_id,
+                'concept': concept_and_audience['concept'],
+                'concepts': concept_and_audience['concepts'],
+                'audience': concept_and_audience['audience']
+            }})
+        )
+    except Exception as e:
+        logger.error(f"Error scheduling prefetch: {str(e)}")
+
+def reserve_prefetch_capacity():
+    """
+    Speculative inference runs only on idle capacity and within its own budget
+    
+    It may fill the shared endpoint budget up to PREFETCH_IDLE_SHARE, leaving
+    the rest to live requests and queued jobs.
+    """
+    if time.time() - last_endpoint_throttle() < SATURATION_COOLDOWN_SECONDS:
+        return False
+    return (increment_window_counter('prefetch', 1, limit=PREFETCH_BUDGET_PER_MINUTE)
+            and increment_window_counter('endpoint', 1,
+                                         limit=max(1, int(ENDPOINT_CAPACITY_PER_MINUTE * PREFETCH_IDLE_SHARE))))
+
+def handle_prefetch(request):
+    """
+    Generate the top-k likely follow-up answers for a conversation and store them
+    
+    Follow-ups the template tier already answers instantly are skipped; the
+    first refusal from the budget or the endpoint ends the run.
+    """
+    concept_and_audience = {
+        'concept': request['concept'],
+        'concepts': request.get('concepts') or [request['concept']],
+        'audience': request['audience']
+    }
+    conversation_context = get_conversation_context(request['user_id'], request['conversation_id'])
+    
+    answers = {}
+    for follow_up_type, (query, _) in GENERIC_FOLLOW_UPS.items():
+        if len(answers) >= PREFETCH_TOP_K:
+            break
+        tier = select_tier(query, concept_and_audience, True, follow_up_type)[0]
+        if tier == TEMPLATE_TIER:
+            continue
+        if not reserve_prefetch_capacity():
+            emit_metric('PrefetchSkipped', dimensions={'FollowUpType': follow_up_type})
+            break
         
+        relevant_chunks = get_relevant_context_multi(concept_and_audience['concepts'],
+                                                     concept_and_audience['audience'], query)
+        answer, source = generate_answer(query, concept_and_audience, relevant_chunks, True, follow_up_type,
+                                         conversation_context, tier)
+        if source != 'model':
+            break
+        answers[follow_up_type] = answer
+        emit_metric('PrefetchGenerated', dimensions={'FollowUpType': follow_up_type})
+    
+    if answers:
+        dynamodb.Table(COORDINATION_TABLE).put_item(Item={
+            'pk': prefetch_key(request['user_id'], request['conversation_id']),
+            'answers': answers,
+            'concept': concept_and_audience['concept'],
+            'audience': concept_and_audience['audience'],
+            # The turn these answers follow; a prefetch finishing after the user moved on is never served
+            'after': (conversation_context or {}).get('timestamp'),
+            'expires_at': int(time.time()) + PREFETCH_TTL_SECONDS
+        })
+    logger.info(f"Prefetched {sorted(answers)} for conversation {request['conversation_id']}")
+    return {'prefetched': sorted(answers)}
+
+def take_prefetched_answers(user_id, conversation_id):
+    """Remove and return the conversation's prefetched answers (a turn consumes them once), or None"""
+    try:
+        item = dynamodb.Table(COORDINATION_TABLE).delete_item(
+            Key={'pk': prefetch_key(user_id, conversation_id)},
+            ReturnValues='ALL_OLD'
+        ).get('Attributes')
+    except Exception as e:
+        logger.error(f"Error reading prefetched answers: {str(e)}")
+        return None
+    if not item:
+        return None
+    if int(item.get('expires_at', 0)) < time.time():
+        # Past its TTL but not yet swept by DynamoDB; swept ones only show in generated - hits
+        emit_metric('PrefetchExpired', len(item.get('answers', {})))
+        return None
+    return item
+
+def serve_prefetched_answer(prefetched, query, concept_and_audience, follow_up_type, conversation_context):
+    """
+    The prefetched answer for this turn, or None
+    
+    Records PrefetchHit for a served answer and PrefetchWasted for each one
+    the turn left unused.
+    """
+    if not prefetched:
+        return None
+    answers = prefetched.get('answers', {})
+    answer = None
+    if (follow_up_type in answers and generic_follow_up(query, follow_up_type)
+            and prefetched.get('concept') == concept_and_audience['concept']
+            and prefetched.get('audience') == concept_and_audience['audience']
+            and prefetched.get('after') is not None
+            and prefetched.get('after') == (conversation_context or {}).get('timestamp')):
+        answer = answers[follow_up_type]
+        emit_metric('PrefetchHit', dimensions={'FollowUpType': follow_up_type})
+    
+    wasted = len(answers) - (1 if answer is not None else 0)
+    if wasted:
+        emit_metric('PrefetchWasted', wasted)
+    return answer
+
+def note_endpoint_error(error, endpoint):
+    """
+    Remember SageMaker throttling per endpoint
+    
+    Only the default tier's endpoint drives admission control and job deferral;
+    a throttled smaller tier is just skipped by routing for the cooldown.
+    """
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code', '')
+    if code in ('ThrottlingException', 'ServiceUnavailable', 'ModelNotReadyException') or '429' in str(error):
+        _endpoint_throttles[endpoint] = time.time()
+        emit_metric('EndpointThrottled', dimensions={'Endpoint': endpoint})
+
+def is_endpoint_configured():
+    """Check whether a real SageMaker endpoint name has been configured"""
+    return bool(SAGEMAKER_ENDPOINT) and SAGEMAKER_ENDPOINT not in ['NOT_CONFIGURED', 'PLACEHOLDER']
+
+def endpoint_not_configured_response():
+    """503 response used while no SageMaker endpoint is deployed"""
+    logger.error("SageMaker endpoint not configured")
+    return {
+        'statusCode': 503,
+        'headers': CORS_HEADERS,
+        'body': json.dumps({
+            'error': 'AI service temporarily unavailable',
+            'message': 'SageMaker endpoint not configured. Please deploy the model first.',
+            'concept': 'unknown',
+            'audience': 'general'
+        })
+    }
+
+def handle_batch_query(queries, user_id):
+    """
+    Answer a list of queries in one request
+    
+    Each entry is a query string or {"query": ..., "audience": ...}. Retrieval is
+    shared between entries with the same concept/audience and inference runs
+    concurrently. Results come back in request order; a failing entry gets an
+    "error" field instead of failing the batch. Batch answers are not stored
+    as conversation history.
+    """
+    if not isinstance(queries, list) or not queries:
         return {
-            'statusCode': 200,
+            'statusCode': 400,
             'headers': CORS_HEADERS,
-            'body': json.dumps({
-                'query': query,
-                'response': response,
-                'concept': concept,
-                'audience': audience,
-                'conversation_id': conversation_id
-            })
+            'body': json.dumps({'error': 'queries must be a non-empty list'})
         }
-    except Exception as e:
-        logger.error(f"Error: {str(e)}", exc_info=True)
+    
+    if len(queries) > MAX_BATCH_SIZE:
         return {
-            'statusCode': 500,
+            'statusCode': 400,
             'headers': CORS_HEADERS,
-            'body': json.dumps({'error': f'Internal server error: {str(e)}'})
+            'body': json.dumps({'error': f'At most {MAX_BATCH_SIZE} queries are allowed per batch'})
         }
+    
+    if not is_endpoint_configured():
+        return endpoint_not_configured_response()
+    
+    if not admit_request(user_id, cost=len(queries)):
+        return {
+            'statusCode': 429,
+            'headers': {**CORS_HEADERS, 'Retry-After': str(ADMISSION_WINDOW_SECONDS)},
+            'body': json.dumps({'error': 'Too many requests while the AI service is busy. Please retry shortly.'})
+        }
+    
+    logger.info(f"Processing batch of {len(queries)} queries for user: {user_id}")
+    
+    with ThreadPoolExecutor(max_workers=min(BATCH_MAX_WORKERS, len(queries))) as executor:
+        results = translate_batch(queries, executor)
+    
+    return {
+        'statusCode': 200,
+        'headers': CORS_HEADERS,
+        'body': json.dumps({
+            'results': results,
+            'count': len(results),
+            'errors': sum(1 for result in results if 'error' in result)
+        })
+    }
+
+def translate_batch(entries, executor, retrieval_cache=None):
+    """
+    Run extraction, retrieval and generation for a list of query entries
+    
+    Retrieval runs on the calling thread (the DynamoDB resource is not thread
+    safe) and is cached per concept/audience; generation is submitted to the
+    executor. Pass a retrieval_cache dict to share lookups across calls.
+    """
+    if retrieval_cache is None:
+        retrieval_cache = {}
+    
+    results = [None] * len(entries)
+    pending = []  # (index, query, concept_and_audience, future)
+    lookups = len(retrieval_cache)
+    
+    for index, entry in enumerate(entries):
+        query = entry.get('query') if isinstance(entry, dict) else entry
+        if not isinstance(query, str) or not query.strip():
+            results[index] = {'index': index, 'query': query, 'error': 'Query is required'}
+            continue
+        
+        concept_and_audience = extract_concept_and_audience(query)
+        if isinstance(entry, dict) and entry.get('audience'):
+            concept_and_audience['audience'] = entry['audience']
+        if concept_and_audience['concept'] == 'unknown':
+            concept_and_audience['concept'] = find_concept_by_similarity(query) or 'unknown'
+            concept_and_audience['concepts'] = [concept_and_audience['concept']]
+        concept = concept_and_audience['concept']
+        concepts = concept_and_audience['concepts']
+        audience = concept_and_audience['audience']
+        
+        if concept == 'unknown':
+            results[index] = {
+                'index': index,
+                'query': query,
+                'response': UNKNOWN_CONCEPT_RESPONSE,
+                'concept': 'unknown',
+                'audience': audience
+            }
+            continue
+        
+        # Retrieval only depends on concepts and audience, so look each combination up once
+        cache_key = (tuple(concepts), audience)
+        if cache_key not in retrieval_cache:
+            retrieval_cache[cache_key] = get_relevant_context_multi(concepts, audience, query)
+        
+        tier, _ = route_query(query, concept_and_audience)
+        future = executor.submit(generate_response_with_enhanced_prompts,
+                                 query, concept_and_audience, retrieval_cache[cache_key], tier=tier)
+        pending.append((index, query, concept_and_audience, future))
+    
+    logger.info(f"Batch retrieval: {len(retrieval_cache) - lookups} new lookups for {len(pending)} queries")
+    
+    for index, query, concept_and_audience, future in pending:
+        try:
+            results[index] = {
+                'index': index,
+                'query': query,
+                'response': future.result(),
+                'concept': concept_and_audience['concept'],
+                'audience': concept_and_audience['audience']
+            }
+        except Exception as e:
+            logger.error(f"Batch item {index} failed: {str(e)}")
+            results[index] = {'index': index, 'query': query, 'error': str(e)}
+    
+    return results
 
 def extract_user_email_from_cognito(event):
     """
@@ -257,46 +1401,21 @@ def extract_concept_and_audience(query):
     """Enhanced concept and audience extraction"""
     query_lower = query.lower()
     
-    # Enhanced concept mapping with more keywords
-    concept_keywords = {
-        'r-squared': [
-            'r squared', 'r-squared', 'r2', 'r²', 'coefficient of determination', 
-            'r square', 'goodness of fit', 'variance explained', 'model fit'
-        ],
-        'loss-ratio': [
-            'loss ratio', 'claims ratio', 'incurred losses', 'loss ratios',
-            'claim ratio', 'losses to premiums', 'loss rate', 'claim rate'
-        ],
-        'predictive-model': [
-            'predictive model', 'prediction model', 'machine learning', 'ml model', 
-            'models', 'modeling', 'algorithm', 'statistical model', 'data model',
-            'pricing model', 'risk model', 'glm', 'regression'
-        ]
-    }
-    
-    detected_concept = None
-    # Find the best matching concept (most specific first)
+    # Score every concept; compound questions keep up to MAX_CONCEPTS of them
     concept_scores = {}
-    for concept_id, keywords in concept_keywords.items():
-        score = sum(1 for keyword in keywords if keyword in query_lower)
-        if score > 0:
-            concept_scores[concept_id] = score
-    
-    if concept_scores:
-        # Pick the concept with highest score
-        detected_concept = max(concept_scores, key=concept_scores.get)
-    else:
-        detected_concept = 'unknown'
+    first_mentions = {}
+    for concept_id, keywords in CONCEPT_KEYWORDS.items():
+        positions = [query_lower.find(keyword) for keyword in keywords if keyword in query_lower]
+        if positions:
+            concept_scores[concept_id] = len(positions)
+            first_mentions[concept_id] = min(positions)
     
-    # Enhanced audience mapping
-    audience_keywords = {
-        'underwriter': ['underwriter', 'underwriting', 'underwriters', 'uw'],
-        'actuary': ['actuary', 'actuarial', 'actuaries', 'pricing actuary'],
-        'executive': ['executive', 'ceo', 'manager', 'leadership', 'executives', 'management', 'director']
-    }
+    # Highest score first; ties go to the concept mentioned first
+    ranked_concepts = sorted(concept_scores, key=lambda c: (-concept_scores[c], first_mentions[c]))[:MAX_CONCEPTS]
+    detected_concept = ranked_concepts[0] if ranked_concepts else 'unknown'
     
     detected_audience = None
-    for audience_id, keywords in audience_keywords.items():
+    for audience_id, keywords in AUDIENCE_KEYWORDS.items():
         if any(keyword in query_lower for keyword in keywords):
             detected_audience = audience_id
             break
@@ -304,7 +1423,7 @@ def extract_concept_and_audience(query):
     if not detected_audience:
         detected_audience = 'general'
     
-    return {'concept': detected_concept, 'audience': detected_audience}
+    return {'concept': detected_concept, 'concepts': ranked_concepts or ['unknown'], 'audience': detected_audience}
 
 def detect_follow_up_question(query, conversation_context):
     """Enhanced follow-up question detection with type classification"""
@@ -341,50 +1460,337 @@ def detect_follow_up_question(query, conversation_context):
     
     return False, None
 
+def classify_query_complexity(query, concept_and_audience, is_follow_up=False, follow_up_type=None):
+    """
+    Cheap complexity estimate from the follow-up type, concept count and query length
+    
+    trivial: generic example follow-ups a canned answer may cover
+    simple:  short follow-ups and short single-concept questions
+    complex: compound, comparison/application, or long questions
+    """
+    words = len(query.split())
+    if len(concept_and_audience.get('concepts') or []) > 1 or words > 25:
+        return 'complex'
+    if is_follow_up:
+        if follow_up_type == 'example' and generic_follow_up(query, follow_up_type):
+            return 'trivial'
+        if follow_up_type in ('comparison', 'application'):
+            return 'complex'
+        return 'simple' if words <= 12 else 'complex'
+    return 'simple' if words <= 8 else 'complex'
+
+def is_tier_available(tier_name, query, concept_and_audience, follow_up_type):
+    """
+    Endpoint tiers need a configured endpoint; the template tier needs a canned answer
+    
+    A smaller tier whose endpoint throttled us recently is passed over; the
+    default tier always stays available.
+    """
+    endpoint = MODEL_TIERS[tier_name].get('endpoint')
+    if tier_name == TEMPLATE_TIER:
+        return template_answer(query, concept_and_audience, follow_up_type) is not None
+    if tier_name != DEFAULT_TIER and time.time() - last_endpoint_throttle(endpoint) < SATURATION_COOLDOWN_SECONDS:
+        return False
+    return bool(endpoint) and endpoint not in ['NOT_CONFIGURED', 'PLACEHOLDER']
+
+def select_tier(query, concept_and_audience, is_follow_up=False, follow_up_type=None):
+    """Pick the cheapest available tier whose capability covers the query; returns (tier, complexity)"""
+    complexity = classify_query_complexity(query, concept_and_audience, is_follow_up, follow_up_type)
+    tier = DEFAULT_TIER
+    if ROUTING_ENABLED:
+        needed = COMPLEXITY_LEVELS.index(complexity)
+        candidates = sorted(MODEL_TIERS, key=lambda name: (MODEL_TIERS[name]['cost'], MODEL_TIERS[name]['latency_ms']))
+        for name in candidates:
+            if (COMPLEXITY_LEVELS.index(MODEL_TIERS[name]['max_complexity']) >= needed
+                    and is_tier_available(name, query, concept_and_audience, follow_up_type)):
+                tier = name
+                break
+    return tier, complexity
+
+def route_query(query, concept_and_audience, is_follow_up=False, follow_up_type=None):
+    """select_tier, recording the decision as a RoutedRequest metric"""
+    tier, complexity = select_tier(query, concept_and_audience, is_follow_up, follow_up_type)
+    emit_metric('RoutedRequest', dimensions={'Tier': tier, 'Complexity': complexity})
+    return tier, complexity
+
+def generic_follow_up(query, follow_up_type):
+    """True if the query is a context-free phrasing of the follow-up type, so a canned or prefetched answer fits it"""
+    phrasings = GENERIC_FOLLOW_UPS.get(follow_up_type, (None, set()))[1]
+    return ' '.join(re.sub(r'[^a-z ]', '', query.lower()).split()) in phrasings
+
+def template_answer(query, concept_and_audience, follow_up_type):
+    """
+    Canned example for a generic "give me an example" follow-up, or None
+    
+    Scenario and other follow-ups carry specifics (figures, comparisons) that a
+    canned text would ignore, so they always go to a model tier.
+    """
+    if follow_up_type != 'example' or not generic_follow_up(query, follow_up_type):
+        return None
+    return EXAMPLE_RESPONSES.get(concept_and_audience['concept'], {}).get(concept_and_audience['audience'])
+
+def get_ann_index():
+    """
+    The ANN index from the knowledge bucket; None if none has been built
+    
+    The object's ETag is rechecked every RETRIEVAL_CACHE_TTL_SECONDS, so a rebuilt
+    index replaces the loaded one in warm containers without a redeploy.
+    """
+    global _ann_index, _ann_index_etag, _ann_index_checked_at
+    if not KNOWLEDGE_BUCKET or time.time() - _ann_index_checked_at < RETRIEVAL_CACHE_TTL_SECONDS:
+        return _ann_index
+    
+    _ann_index_checked_at = time.time()
+    try:
+        etag = s3.head_object(Bucket=KNOWLEDGE_BUCKET, Key=ANN_INDEX_KEY)['ETag']
+        if etag != _ann_index_etag:
+            s3.download_file(KNOWLEDGE_BUCKET, ANN_INDEX_KEY, ANN_INDEX_PATH)
+            # Imported here so NumPy only loads in containers that actually use the index
+            from ann_index import IVFPQIndex
+            _ann_index = IVFPQIndex.load(ANN_INDEX_PATH)
+            _ann_index_etag = etag
+            logger.info(f"Loaded ANN index: {len(_ann_index)} chunks, {_ann_index.nlist} lists")
+    except Exception as e:
+        # Keep serving the index already loaded, if any
+        logger.warning(f"ANN index not available: {str(e)}")
+    return _ann_index
+
+def embed_query(query, index):
+    """Embed a query the same way the index was built; None if that is not possible here"""
+    from ann_index import HASHING_EMBEDDING, hashing_embedding, normalize
+    import numpy as np
+    
+    if index.info.get('embedding') == HASHING_EMBEDDING:
+        return hashing_embedding(query, index.dim)
+    if not EMBEDDING_ENDPOINT:
+        return None
+    
+    response = sagemaker_runtime.invoke_endpoint(
+        EndpointName=EMBEDDING_ENDPOINT,
+        ContentType='application/json',
+        Body=json.dumps({'inputs': query})
+    )
+    result = json.loads(response['Body'].read().decode())
+    if isinstance(result, dict):
+        result = result.get('embeddings') or result.get('vectors') or result.get('embedding')
+    
+    # Feature-extraction endpoints return token embeddings: mean-pool them
+    vector = np.asarray(result, dtype=np.float32)
+    while vector.ndim > 2:
+        vector = vector[0]
+    if vector.ndim == 2:
+        vector = vector.mean(axis=0)
+    return normalize(vector)
+
+def find_concept_by_similarity(query):
+    """
+    Resolve a query with no keyword match to the concept of its nearest chunks
+    Top-k hits above ANN_MIN_SCORE vote for their concept, weighted by score
+    """
+    index = get_ann_index()
+    if index is None:
+        return None
+    
+    try:
+        vector = embed_query(query, index)
+        if vector is None:
+            return None
+        ids, scores = index.search(vector, ANN_TOP_K, nprobe=ANN_NPROBE, refine=ANN_REFINE)
+    except Exception as e:
+        logger.error(f"ANN search error: {str(e)}")
+        return None
+    
+    votes = {}
+    for row, score in zip(ids.tolist(), scores.tolist()):
+        if score >= ANN_MIN_SCORE:
+            concept = index.metadata[row].get('concept_id')
+            votes[concept] = votes.get(concept, 0.0) + score
+    
+    if not votes:
+        emit_metric('AnnConceptMiss')
+        return None
+    
+    concept = max(votes, key=votes.get)
+    emit_metric('AnnConceptHit')
+    logger.info(f"ANN resolved concept: {concept} (score {votes[concept]:.2f})")
+    return concept
+
+def retrieval_sort_key(item):
+    """Retrieval index sort key: audience chunks group under their audience, the rest under 'all'"""
+    return f"{item.get('audience') or GENERAL_CHUNK_PREFIX}#{item['type']}#{item['vector_id']}"
+
+def query_retrieval_index(table, concept, prefix, limit):
+    """Up to `limit` chunks of one concept whose retrieval key starts with prefix"""
+    response = table.query(
+        IndexName=RETRIEVAL_INDEX,
+        KeyConditionExpression="concept_id = :concept_id AND begins_with(retrieval_key, :prefix)",
+        ExpressionAttributeValues={":concept_id": concept, ":prefix": prefix},
+        Limit=limit
+    )
+    return response.get('Items', [])
+
 def get_relevant_context_enhanced(concept, audience, query, max_items=3):
-    """Enhanced context retrieval with better filtering"""
+    """
+    Enhanced context retrieval with better filtering
+    
+    Reads exactly what prioritize_chunks can use from the retrieval index: the
+    audience's own chunks, then general chunks, whose type order (context,
+    definition, example, ...) puts the useful ones first.
+    """
+    cache_key = (concept, audience, max_items)
+    cached = _retrieval_cache.get(cache_key)
+    if cached and cached[0] > time.time():
+        return cached[1]
+    
     try:
         table = dynamodb.Table(VECTOR_TABLE)
         
-        # Query by concept_id
-        response = table.query(
-            KeyConditionExpression="concept_id = :concept_id",
-            ExpressionAttributeValues={":concept_id": concept},
-            Limit=10  # Get more initially, then filter
-        )
+        items = []
+        if audience != 'general':
+            items.extend(query_retrieval_index(table, concept, f"{audience}#", 2))
+        items.extend(query_retrieval_index(table, concept, f"{GENERAL_CHUNK_PREFIX}#", max_items))
         
-        items = response.get('Items', [])
+        if not items:
+            # Rows written before the index existed; backfill with tools/migrate_vector_keys.py
+            emit_metric('RetrievalIndexMiss')
+            response = table.query(
+                KeyConditionExpression="concept_id = :concept_id",
+                ExpressionAttributeValues={":concept_id": concept},
+                Limit=10  # Get more initially, then filter
+            )
+            items = response.get('Items', [])
         if not items:
             return []
         
-        # Enhanced prioritization logic
-        prioritized_items = []
-        
-        # 1. Exact audience matches get highest priority
-        audience_matches = [item for item in items if item.get('audience') == audience]
-        prioritized_items.extend(audience_matches[:2])  # Top 2 audience matches
-        
-        # 2. Add definition if not already included
-        if not any(item.get('type') == 'definition' for item in prioritized_items):
-            definition_items = [item for item in items if item.get('type') == 'definition']
-            if definition_items:
-                prioritized_items.append(definition_items[0])
-        
-        # 3. Add context/examples if space remains
-        remaining_slots = max_items - len(prioritized_items)
-        if remaining_slots > 0:
-            other_items = [item for item in items 
-                          if item not in prioritized_items 
-                          and item.get('type') in ['context', 'example', 'technical']]
-            prioritized_items.extend(other_items[:remaining_slots])
-        
-        # Convert to expected format
-        return [{'item': item, 'similarity': 1.0} for item in prioritized_items[:max_items]]
+        chunks = prioritize_chunks(items, audience, max_items)
+        _retrieval_cache[cache_key] = (time.time() + RETRIEVAL_CACHE_TTL_SECONDS, chunks)
+        return chunks
         
     except Exception as e:
         logger.error(f"Error getting enhanced context: {str(e)}")
         return []
 
+def prioritize_chunks(items, audience, max_items=3):
+    """Pick audience matches first, then a definition, then context/examples"""
+    # Enhanced prioritization logic
+    prioritized_items = []
+        
+    # 1. Exact audience matches get highest priority
+    audience_matches = [item for item in items if item.get('audience') == audience]
+    prioritized_items.extend(audience_matches[:2])  # Top 2 audience matches
+    
+    # 2. Add definition if not already included
+    if not any(item.get('type') == 'definition' for item in prioritized_items):
+        definition_items = [item for item in items if item.get('type') == 'definition']
+        if definition_items:
+            prioritized_items.append(definition_items[0])
+    
+    # 3. Add context/examples if space remains
+    remaining_slots = max_items - len(prioritized_items)
+    if remaining_slots > 0:
+        other_items = [item for item in items 
+                      if item not in prioritized_items 
+                      and item.get('type') in ['context', 'example', 'technical']]
+        prioritized_items.extend(other_items[:remaining_slots])
+    
+    # Convert to expected format
+    return [{'item': item, 'similarity': 1.0} for item in prioritized_items[:max_items]]
+
+def batch_get_concept_chunks(concepts, audience):
+    """
+    Fetch the chunks prioritize_chunks draws on for several concepts in one BatchGetItem
+    Returns {concept: [items]} in priority order; vector ids follow the ingestion notebook
+    """
+    suffixes = ([audience, f"action-{audience}"] if audience != 'general' else []) + ['definition', 'context']
+    request = {
+        VECTOR_TABLE: {
+            'Keys': [{'concept_id': concept, 'vector_id': f"{concept}-{suffix}"}
+                     for concept in concepts for suffix in suffixes],
+            # Skip the embedding, by far the largest attribute
+            'ProjectionExpression': 'concept_id, vector_id, title, #text, #type, audience',
+            'ExpressionAttributeNames': {'#text': 'text', '#type': 'type'}
+        }
+    }
+    
+    items_by_concept = {concept: [] for concept in concepts}
+    for attempt in range(3):
+        response = dynamodb.batch_get_item(RequestItems=request)
+        for item in response.get('Responses', {}).get(VECTOR_TABLE, []):
+            items_by_concept.setdefault(item['concept_id'], []).append(item)
+        request = response.get('UnprocessedKeys')
+        if not request:
+            break
+        time.sleep(0.05 * 2 ** attempt)
+    
+    rank = {suffix: position for position, suffix in enumerate(suffixes)}
+    for concept, items in items_by_concept.items():
+        items.sort(key=lambda item: rank.get(item['vector_id'][len(concept) + 1:], len(rank)))
+    return items_by_concept
+
+def get_relevant_context_multi(concepts, audience, query, max_items=3):
+    """
+    Context for one or more concepts, merged best-first across concepts
+    
+    Concepts missing from the retrieval cache are fetched together in a single
+    BatchGetItem, so a compound question costs one round trip, not one per concept.
+    """
+    if len(concepts) == 1:
+        return get_relevant_context_enhanced(concepts[0], audience, query, max_items)
+    
+    per_concept = {}
+    missing = []
+    for concept in concepts:
+        cached = _retrieval_cache.get((concept, audience, max_items))
+        if cached and cached[0] > time.time():
+            per_concept[concept] = cached[1]
+        else:
+            missing.append(concept)
+    
+    if missing:
+        try:
+            fetched = batch_get_concept_chunks(missing, audience)
+        except Exception as e:
+            logger.error(f"Error getting multi-concept context: {str(e)}")
+            fetched = {}
+        for concept in missing:
+            chunks = prioritize_chunks(fetched.get(concept, []), audience, max_items)
+            per_concept[concept] = chunks
+            if chunks:
+                _retrieval_cache[(concept, audience, max_items)] = (time.time() + RETRIEVAL_CACHE_TTL_SECONDS, chunks)
+    
+    # Every concept's best chunk comes before any concept's second-best
+    merged = []
+    for rank in range(max_items):
+        for concept in concepts:
+            if rank < len(per_concept[concept]):
+                merged.append(per_concept[concept][rank])
+    return merged
+
+def build_context_text(relevant_chunks, token_budget=None):
+    """
+    Join cleaned chunk texts for the prompt until the token budget is spent
+    Tokens are estimated at four characters each, close enough for FLAN-T5's 512-token input
+    """
+    token_budget = CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    concepts = {chunk['item'].get('concept_id') for chunk in relevant_chunks}
+    # A single concept keeps its two best chunks; compound questions share the budget
+    max_chunks = 2 if len(concepts) <= 1 else len(relevant_chunks)
+    
+    context_text = ""
+    remaining = token_budget * 4
+    for chunk in relevant_chunks[:max_chunks]:
+        # Clean the text before using it in prompts
+        item_text = clean_chunk_text(chunk['item']['text'])
+        if len(item_text) > CHUNK_CHAR_LIMIT:
+            item_text = item_text[:CHUNK_CHAR_LIMIT] + "..."
+        if len(item_text) > remaining:
+            if remaining < 80:
+                break
+            item_text = item_text[:remaining] + "..."
+        context_text += f"{item_text}\n\n"
+        remaining -= len(item_text)
+    return context_text
+
 # Include all other functions from your original code...
 def create_structured_fallback_response(query, concept_and_audience, relevant_chunks, 
                                       is_follow_up=False, follow_up_type=None):
@@ -460,23 +1866,28 @@ def clean_chunk_text(text):
     return cleaned_text
 
 def generate_response_with_enhanced_prompts(query, concept_and_audience, relevant_chunks, 
-                                          is_follow_up=False, follow_up_type=None, conversation_context=None):
+                                          is_follow_up=False, follow_up_type=None, conversation_context=None,
+                                          tier=DEFAULT_TIER):
     """Enhanced response generation - CLEAN VERSION"""
+    response, _ = generate_answer(query, concept_and_audience, relevant_chunks,
+                                  is_follow_up, follow_up_type, conversation_context, tier)
+    return response
+
+def generate_answer(query, concept_and_audience, relevant_chunks, 
+                    is_follow_up=False, follow_up_type=None, conversation_context=None, tier=DEFAULT_TIER):
+    """
+    Generate an answer on the given model tier and report its source: 'model' or 'fallback'
+    
+    A smaller tier that fails or returns an unusable answer is retried once on the default tier.
+    """
     try:
         concept = concept_and_audience['concept']
         audience = concept_and_audience['audience']
-        concept_display = concept.replace('-', ' ').title()
+        concepts = concept_and_audience.get('concepts') or [concept]
+        concept_display = ' and '.join(c.replace('-', ' ').title() for c in concepts)
         
         # Build clean context from relevant chunks
-        context_text = ""
-        if relevant_chunks:
-            for chunk in relevant_chunks[:2]:
-                item_text = chunk['item']['text']
-                # Clean the text before using it in prompts
-                item_text = clean_chunk_text(item_text)
-                if len(item_text) > 200:
-                    item_text = item_text[:200] + "..."
-                context_text += f"{item_text}\n\n"
+        context_text = build_context_text(relevant_chunks)
         
         # Generate prompts
         if is_follow_up and follow_up_type:
@@ -485,26 +1896,24 @@ def generate_response_with_enhanced_prompts(query, concept_and_audience, relevan
         else:
             prompt = create_initial_prompt(query, concept_display, audience, context_text)
         
-        # FLAN-T5 parameters
+        # FLAN-T5 parameters for the chosen tier
+        model_tier = MODEL_TIERS[tier]
         payload = {
             "inputs": prompt,
-            "parameters": {
-                "max_new_tokens": 200,
-                "temperature": 0.4,
-                "do_sample": True,
-                "top_p": 0.9,
-                "repetition_penalty": 1.15,
-            }
+            "parameters": model_tier['parameters']
         }
         
         # Call SageMaker endpoint
+        started = time.perf_counter()
         response = sagemaker_runtime.invoke_endpoint(
-            EndpointName=SAGEMAKER_ENDPOINT,
+            EndpointName=model_tier['endpoint'],
             ContentType='application/json',
             Body=json.dumps(payload)
         )
         
         result = json.loads(response['Body'].read().decode())
+        emit_metric('TierLatency', round((time.perf_counter() - started) * 1000, 3), 'Milliseconds',
+                    {'Tier': tier})
         
         # Handle response format
         if isinstance(result, list) and len(result) > 0:
@@ -522,15 +1931,26 @@ def generate_response_with_enhanced_prompts(query, concept_and_audience, relevan
         
         # Use fallback if response is too short
         if not generated_text or len(generated_text) < 30:
+            if tier != DEFAULT_TIER:
+                emit_metric('RouteEscalated', dimensions={'Tier': tier})
+                return generate_answer(query, concept_and_audience, relevant_chunks,
+                                       is_follow_up, follow_up_type, conversation_context)
             return create_structured_fallback_response(query, concept_and_audience, relevant_chunks, 
-                                                     is_follow_up, follow_up_type)
+                                                     is_follow_up, follow_up_type), 'fallback'
         
-        return generated_text
+        return generated_text, 'model'
         
     except Exception as e:
-        logger.error(f"Response generation error: {str(e)}")
+        logger.error(f"Response generation error on {tier} tier: {str(e)}")
+        note_endpoint_error(e, MODEL_TIERS.get(tier, {}).get('endpoint'))
+        if tier != DEFAULT_TIER:
+            # A model error, timeout or throttle on the smaller endpoint says nothing about the default one
+            emit_metric('RouteEscalated', dimensions={'Tier': tier})
+            return generate_answer(query, concept_and_audience, relevant_chunks,
+                                   is_follow_up, follow_up_type, conversation_context)
         return create_structured_fallback_response(query, concept_and_audience, relevant_chunks, 
-                                                 is_follow_up, follow_up_type)
+                                                 is_follow_up, follow_up_type), 'fallback'
+
 
 def create_initial_prompt(query, concept_display, audience, context_text):
     """Create optimized initial explanation prompts for FLAN-T5"""
@@ -681,24 +2101,25 @@ Implementation guidance:"""
     
     return follow_up_prompts.get(follow_up_type, follow_up_prompts['elaboration'])
 
+# Canned examples by concept and audience, shared by the fallback and the template tier
+EXAMPLE_RESPONSES = {
+    'r-squared': {
+        'underwriter': "Example: Your auto insurance pricing model has an R-squared of 0.68. This means 68% of premium differences across policies are explained by your rating factors (age, location, vehicle type). The remaining 32% represents unexplained variation - potentially missed risk factors that competitors might be capturing.",
+        'actuary': "Example: In your homeowners GLM, an R-squared of 0.75 indicates strong model performance. Compare this to industry benchmarks (typically 0.60-0.80 for property). Higher R-squared suggests your variable selection and model specification are capturing the key risk drivers effectively.",
+        'executive': "Example: Your commercial lines pricing model achieved R-squared of 0.72, compared to 0.65 last year. This 7-point improvement translates to better risk selection, potentially reducing loss ratios by 2-3 percentage points and improving underwriting margins."
+    },
+    'loss-ratio': {
+        'underwriter': "Example: Your personal auto book shows a 78% loss ratio. With a 25% expense ratio, your combined ratio is 103% - meaning you're losing 3 cents on every premium dollar. You need rate increases or tighter underwriting guidelines to achieve profitability.",
+        'actuary': "Example: Analyzing loss ratios by coverage: collision at 65%, comprehensive at 45%, liability at 85%. The high liability ratio indicates potential adverse selection or inadequate pricing for this coverage, requiring detailed analysis of claim frequency and severity trends.",
+        'executive': "Example: Loss ratio increased from 72% to 78% over six quarters. This 6-point deterioration, if sustained, reduces underwriting profit by $12M annually on a $200M premium book, significantly impacting your competitive position and ROE."
+    }
+}
+
 def create_example_response(concept, audience, chunk):
     """Create example-focused responses"""
-    examples = {
-        'r-squared': {
-            'underwriter': "Example: Your auto insurance pricing model has an R-squared of 0.68. This means 68% of premium differences across policies are explained by your rating factors (age, location, vehicle type). The remaining 32% represents unexplained variation - potentially missed risk factors that competitors might be capturing.",
-            'actuary': "Example: In your homeowners GLM, an R-squared of 0.75 indicates strong model performance. Compare this to industry benchmarks (typically 0.60-0.80 for property). Higher R-squared suggests your variable selection and model specification are capturing the key risk drivers effectively.",
-            'executive': "Example: Your commercial lines pricing model achieved R-squared of 0.72, compared to 0.65 last year. This 7-point improvement translates to better risk selection, potentially reducing loss ratios by 2-3 percentage points and improving underwriting margins."
-        },
-        'loss-ratio': {
-            'underwriter': "Example: Your personal auto book shows a 78% loss ratio. With a 25% expense ratio, your combined ratio is 103% - meaning you're losing 3 cents on every premium dollar. You need rate increases or tighter underwriting guidelines to achieve profitability.",
-            'actuary': "Example: Analyzing loss ratios by coverage: collision at 65%, comprehensive at 45%, liability at 85%. The high liability ratio indicates potential adverse selection or inadequate pricing for this coverage, requiring detailed analysis of claim frequency and severity trends.",
-            'executive': "Example: Loss ratio increased from 72% to 78% over six quarters. This 6-point deterioration, if sustained, reduces underwriting profit by $12M annually on a $200M premium book, significantly impacting your competitive position and ROE."
-        }
-    }
-    
     concept_key = concept.lower().replace(' ', '-')
-    if concept_key in examples and audience in examples[concept_key]:
-        return examples[concept_key][audience]
+    if concept_key in EXAMPLE_RESPONSES and audience in EXAMPLE_RESPONSES[concept_key]:
+        return EXAMPLE_RESPONSES[concept_key][audience]
     else:
         return f"Here's a practical example of {concept} for {audience}s: {chunk['text'][:200]}..."
 
@@ -724,13 +2145,13 @@ def create_scenario_response(concept, audience, chunk, query):
 
 # Keep existing helper functions
 def get_conversation_context(user_id, conversation_id):
-    """Get the last concept/audience from conversation history"""
+    """Get the last concept/audience (and when the last turn was stored) from the conversation head record"""
     if not conversation_id:
         return None
     
     try:
         payload = {
-            'action': 'get',
+            'action': 'get_context',
             'user_id': user_id,
             'conversation_id': conversation_id
         }
@@ -743,15 +2164,15 @@ def get_conversation_context(user_id, conversation_id):
         
         result = json.loads(response['Payload'].read())
         
-        if result.get('statusCode') == 200 and result.get('conversations'):
-            conversations = result['conversations']
-            if conversations:
-                for conv in sorted(conversations, key=lambda x: x.get('timestamp', ''), reverse=True):
-                    if conv.get('concept') and conv.get('concept') != 'unknown':
-                        return {
-                            'concept': conv.get('concept'),
-                            'audience': conv.get('audience', 'general')
-                        }
+        context = result.get('context') if result.get('statusCode') == 200 else None
+        if context and context.get('concept') and context.get('concept') != 'unknown':
+            return {
+                'concept': context.get('concept'),
+                'audience': context.get('audience', 'general'),
+                # Identifies the latest turn, so prefetched answers can tell they are stale
+                'timestamp': context.get('timestamp'),
+                'turn_count': context.get('turn_count')
+            }
         
         return None
         
@@ -759,8 +2180,8 @@ def get_conversation_context(user_id, conversation_id):
         logger.error(f"Error getting conversation context: {str(e)}")
         return None
 
-def store_conversation(user_id, conversation_id, query, response, concept, audience):
-    """Store conversation in DynamoDB via the Conversation Lambda"""
+def store_conversation(user_id, conversation_id, query, response, concept, audience, idempotency=None):
+    """Store conversation in DynamoDB via the Conversation Lambda (once per idempotency key)"""
     try:
         payload = {
             'action': 'store',
@@ -771,6 +2192,9 @@ def store_conversation(user_id, conversation_id, query, response, concept, audie
             'concept': concept,
             'audience': audience
         }
+        if idempotency:
+            # The store is skipped for a key already written within its replay window
+            payload['idempotency_key'], payload['idempotency_ttl'] = idempotency
         
         response = lambda_client.invoke(
             FunctionName=CONVERSATION_FUNCTION,
@@ -781,4 +2205,8 @@ def store_conversation(user_id, conversation_id, query, response, concept, audie
         return json.loads(response['Payload'].read())
     except Exception as e:
         logger.error(f"Error storing conversation: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+# Wrapping happens once at import, so a disabled profiler adds no per-invocation work
+if profiling_configured():
+    lambda_handler = with_profiling(lambda_handler, 'main', extract_user_email_from_cognito, lambda: s3)
@@ -0,0 +1,117 @@
+# opt-in profiling shared by the Lambda handlers
+"""
+Runs selected invocations under cProfile and tracemalloc, uploads the profile
+to the knowledge bucket and logs a one-line summary.
+
+package-lambda.sh copies this module next to each function's lambda_function.py.
+An invocation is profiled when PROFILING_ENABLED samples it (PROFILING_SAMPLE_RATE)
+or an allow-listed user sends the X-Profile: 1 header (PROFILING_ALLOWED_USERS).
+"""
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import random
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+logger = logging.getLogger()
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0.01'))
+PROFILING_ALLOWED_USERS = {user.strip() for user in os.environ.get('PROFILING_ALLOWED_USERS', '').split(',') if user.strip()}
+PROFILING_PREFIX = os.environ.get('PROFILING_PREFIX', 'profiling/')
+PROFILE_HEADER = 'x-profile'
+KNOWLEDGE_BUCKET = os.environ.get('KNOWLEDGE_BUCKET')
+
+
+def profiling_configured():
+    """Handlers are only wrapped when sampling or an allow list is set"""
+    return PROFILING_ENABLED or bool(PROFILING_ALLOWED_USERS)
+
+
+def profiling_trigger(event, extract_user):
+    """Why this invocation should be profiled ('header' or 'sampled'), or None"""
+    if PROFILING_ALLOWED_USERS and isinstance(event, dict):
+        headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+        if headers.get(PROFILE_HEADER) in ('1', 'true') and extract_user(event) in PROFILING_ALLOWED_USERS:
+            return 'header'
+    if PROFILING_ENABLED and random.random() < PROFILING_SAMPLE_RATE:
+        return 'sampled'
+    return None
+
+
+def publish_profile(profiler, snapshot, summary, function_name, get_s3_client):
+    """Write the profile to /tmp, upload it to the knowledge bucket and log a summary line"""
+    request_id = summary['request_id']
+    stats = pstats.Stats(profiler)
+    hottest = sorted(stats.stats.items(), key=lambda entry: entry[1][2], reverse=True)[:3]
+    summary['top_functions'] = [
+        f"{os.path.basename(filename)}:{line}({name}) {timing[2] * 1000:.1f}ms"
+        for (filename, line, name), timing in hottest
+    ]
+
+    prof_path = f"/tmp/profile-{request_id}.prof"
+    report_path = f"/tmp/profile-{request_id}.txt"
+    try:
+        profiler.dump_stats(prof_path)
+        with open(report_path, 'w') as report:
+            report.write(json.dumps(summary, indent=2) + '\n\n')
+            pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(40)
+            report.write('\nTop allocations by line:\n')
+            for statistic in snapshot.statistics('lineno')[:20]:
+                report.write(f"{statistic}\n")
+
+        if KNOWLEDGE_BUCKET:
+            key_prefix = f"{PROFILING_PREFIX}{function_name}/{datetime.utcnow().strftime('%Y/%m/%d')}/{request_id}"
+            s3 = get_s3_client()
+            s3.upload_file(prof_path, KNOWLEDGE_BUCKET, f"{key_prefix}.prof")
+            s3.upload_file(report_path, KNOWLEDGE_BUCKET, f"{key_prefix}.txt")
+            summary['s3_key'] = f"{key_prefix}.prof"
+    except Exception as e:
+        logger.error(f"Error publishing profile: {str(e)}")
+    finally:
+        for path in (prof_path, report_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    logger.info(f"PROFILE {json.dumps(summary)}")
+
+
+def with_profiling(handler, function_name, extract_user, get_s3_client):
+    """
+    Wrap a Lambda handler so selected invocations run under cProfile and tracemalloc
+
+    extract_user maps an API Gateway event to the user checked against the
+    allow list; get_s3_client returns the client used for the upload.
+    """
+    @functools.wraps(handler)
+    def profiled_handler(event, context):
+        trigger = profiling_trigger(event, extract_user)
+        if not trigger:
+            return handler(event, context)
+
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            return handler(event, context)
+        finally:
+            profiler.disable()
+            duration_ms = (time.perf_counter() - started) * 1000
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            publish_profile(profiler, snapshot, {
+                'request_id': getattr(context, 'aws_request_id', None) or uuid.uuid4().hex,
+                'trigger': trigger,
+                'duration_ms': round(duration_ms, 1),
+                'peak_memory_kb': round(peak / 1024, 1)
+            }, function_name, get_s3_client)
+
+    return profiled_handler
@@ -29,13 +29,15 @@ package_lambda() {
   # Create a temporary directory
   mkdir -p /tmp/lambda-package
   
-  # Copy Lambda files to the temporary directory
+  # Copy Lambda files (handler plus any helper modules, and modules shared by all functions)
+  cp lambda/shared/*.py /tmp/lambda-package/
+  cp lambda/$func_name/*.py /tmp/lambda-package/
   cp lambda/$func_name/$handler_file /tmp/lambda-package/lambda_function.py
   cp lambda/$func_name/requirements.txt /tmp/lambda-package/
   
-  # Install dependencies
+  # Install dependencies as Linux wheels for the Lambda runtime (NumPy is compiled)
   cd /tmp/lambda-package
-  pip install -r requirements.txt -t .
+  pip install -r requirements.txt -t . --platform manylinux2014_x86_64 --python-version 3.9 --only-binary=:all:
   
   # Zip the package
   zip -r /tmp/$func_name.zip .
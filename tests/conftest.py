@@ -0,0 +1,95 @@
+# shared fixtures: the main Lambda wired to the in-memory stand-ins in tools/local_stubs,
+# the Conversation Lambda against moto's DynamoDB and S3
+import importlib.util
+import os
+import sys
+from collections import Counter
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_LAMBDA = os.path.join(REPO_ROOT, 'lambda', 'main', 'lambda_function.py')
+CONVERSATION_LAMBDA = os.path.join(REPO_ROOT, 'lambda', 'conversation', 'lambda_function.py')
+sys.path.insert(0, os.path.join(REPO_ROOT, 'tools'))
+sys.path.insert(0, os.path.dirname(MAIN_LAMBDA))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'lambda', 'shared'))
+
+CONVERSATION_FUNCTION = 'local-conversation'
+MAIN_FUNCTION = 'local-main'
+COORDINATION_TABLE = 'local-coordination'
+CONVERSATION_TABLE = 'local-conversations'
+KNOWLEDGE_BUCKET = 'local-knowledge-base'
+
+
+def load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def main_lambda(monkeypatch):
+    """A freshly imported main Lambda (module state is per test) running against the stubs"""
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('SAGEMAKER_ENDPOINT', 'local-stub')
+    monkeypatch.setenv('VECTOR_TABLE', 'local-vector-storage')
+    monkeypatch.setenv('CONVERSATION_FUNCTION', CONVERSATION_FUNCTION)
+    monkeypatch.setenv('COORDINATION_TABLE', COORDINATION_TABLE)
+    monkeypatch.setenv('PREFETCH_FUNCTION', MAIN_FUNCTION)
+    monkeypatch.delenv('SMALL_MODEL_ENDPOINT', raising=False)
+    monkeypatch.delenv('JOB_QUEUE_URL', raising=False)
+
+    module = load_module('main_lambda_function', MAIN_LAMBDA)
+
+    from local_stubs import StubConversationFunction, StubDynamoDB, StubLambdaClient, StubSageMakerRuntime
+
+    module.conversation = StubConversationFunction()
+    module.dynamodb = StubDynamoDB(module.VECTOR_TABLE, seed_vectors=True,
+                                   key_schemas={COORDINATION_TABLE: ('pk', None)})
+    module.lambda_client = StubLambdaClient({
+        CONVERSATION_FUNCTION: module.conversation,
+        MAIN_FUNCTION: lambda event: module.lambda_handler(event, None)
+    })
+    module.sagemaker_runtime = StubSageMakerRuntime()
+
+    module.metrics = Counter()
+
+    def record_metric(name, value=1, unit='Count', dimensions=None):
+        module.metrics[name] += value
+        if dimensions:
+            module.metrics[f"{name}:{','.join(str(v) for v in dimensions.values())}"] += value
+
+    module.emit_metric = record_metric
+    return module
+
+
+@pytest.fixture
+def conversation_lambda(monkeypatch):
+    """A freshly imported Conversation Lambda with its tables and bucket in moto"""
+    moto = pytest.importorskip('moto')
+    import boto3
+
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('CONVERSATION_TABLE', CONVERSATION_TABLE)
+    monkeypatch.setenv('COORDINATION_TABLE', COORDINATION_TABLE)
+    monkeypatch.setenv('KNOWLEDGE_BUCKET', KNOWLEDGE_BUCKET)
+
+    with moto.mock_aws():
+        client = boto3.client('dynamodb')
+        client.create_table(
+            TableName=CONVERSATION_TABLE, BillingMode='PAY_PER_REQUEST',
+            AttributeDefinitions=[{'AttributeName': 'user_id', 'AttributeType': 'S'},
+                                  {'AttributeName': 'conversation_id', 'AttributeType': 'S'}],
+            KeySchema=[{'AttributeName': 'user_id', 'KeyType': 'HASH'},
+                       {'AttributeName': 'conversation_id', 'KeyType': 'RANGE'}])
+        client.create_table(
+            TableName=COORDINATION_TABLE, BillingMode='PAY_PER_REQUEST',
+            AttributeDefinitions=[{'AttributeName': 'pk', 'AttributeType': 'S'}],
+            KeySchema=[{'AttributeName': 'pk', 'KeyType': 'HASH'}])
+        boto3.client('s3').create_bucket(Bucket=KNOWLEDGE_BUCKET)
+
+        module = load_module('conversation_lambda_function', CONVERSATION_LAMBDA)
+        yield module
@@ -0,0 +1,30 @@
+import json
+import time
+
+USER = 'batch@example.com'
+
+
+def batch_of(main_lambda, size):
+    assert size > main_lambda.USER_BURST
+    return [f"What is loss ratio? ({index})" for index in range(size)]
+
+
+def test_batch_larger_than_burst_is_charged_to_the_user(main_lambda):
+    result = main_lambda.handle_batch_query(batch_of(main_lambda, 8), USER)
+
+    assert result['statusCode'] == 200
+    assert main_lambda.metrics['AdmissionDecision:admitted'] == 1
+    # The batch left the bucket in debt, so the next request is over the limit
+    assert main_lambda.admit_request(USER)
+    assert main_lambda.metrics['AdmissionDecision:over_limit_admitted'] == 1
+
+
+def test_batch_larger_than_burst_is_admitted_while_saturated(main_lambda):
+    main_lambda._endpoint_throttles[main_lambda.SAGEMAKER_ENDPOINT] = time.time()
+
+    result = main_lambda.handle_batch_query(batch_of(main_lambda, 8), USER)
+
+    assert result['statusCode'] == 200
+    assert json.loads(result['body'])['count'] == 8
+    # Once charged, the user is throttled until the bucket refills
+    assert not main_lambda.admit_request(USER)
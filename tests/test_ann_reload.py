@@ -0,0 +1,60 @@
+import pytest
+
+pytest.importorskip('numpy')
+import ann_index  # noqa: E402
+
+
+class StubBucket:
+    """The index object in the knowledge bucket; its ETag changes on each upload"""
+
+    def __init__(self):
+        self.etag = '"v1"'
+        self.downloads = 0
+
+    def head_object(self, Bucket, Key):
+        return {'ETag': self.etag}
+
+    def download_file(self, Bucket, Key, Filename):
+        self.downloads += 1
+
+
+class FakeIndex:
+    nlist = 1
+
+    def __init__(self, name):
+        self.name = name
+
+    def __len__(self):
+        return 0
+
+
+def test_rebuilt_index_replaces_the_loaded_one(main_lambda, monkeypatch):
+    bucket = StubBucket()
+    main_lambda.s3 = bucket
+    main_lambda.KNOWLEDGE_BUCKET = 'local-knowledge-base'
+    main_lambda.RETRIEVAL_CACHE_TTL_SECONDS = 0
+    loaded = iter(['first index', 'rebuilt index'])
+    monkeypatch.setattr(ann_index.IVFPQIndex, 'load', classmethod(lambda cls, path: FakeIndex(next(loaded))))
+
+    assert main_lambda.get_ann_index().name == 'first index'
+    assert main_lambda.get_ann_index().name == 'first index'
+    assert bucket.downloads == 1
+
+    bucket.etag = '"v2"'
+    assert main_lambda.get_ann_index().name == 'rebuilt index'
+    assert bucket.downloads == 2
+
+
+def test_index_is_kept_when_the_recheck_fails(main_lambda, monkeypatch):
+    bucket = StubBucket()
+    main_lambda.s3 = bucket
+    main_lambda.KNOWLEDGE_BUCKET = 'local-knowledge-base'
+    main_lambda.RETRIEVAL_CACHE_TTL_SECONDS = 0
+    monkeypatch.setattr(ann_index.IVFPQIndex, 'load', classmethod(lambda cls, path: FakeIndex('index')))
+    index = main_lambda.get_ann_index()
+
+    def unavailable(Bucket, Key):
+        raise RuntimeError('S3 unavailable')
+
+    bucket.head_object = unavailable
+    assert main_lambda.get_ann_index() is index
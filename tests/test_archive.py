@@ -0,0 +1,68 @@
+import gzip
+import json
+
+import boto3
+
+USER = 'archive@example.com'
+
+
+def store(conversation_lambda, conversation_id, query):
+    conversation_lambda.store_conversation(USER, conversation_id, query, f"Answer to {query}",
+                                           'loss-ratio', 'underwriter')
+
+
+def archive_everything(conversation_lambda):
+    # A negative age puts the cutoff in the future, so every stored turn is old enough
+    return conversation_lambda.archive_old_interactions(older_than_days=-1)
+
+
+def queries(conversation_lambda, conversation_id):
+    items = conversation_lambda.get_conversation(USER, conversation_id)['conversations']
+    return [item['query'] for item in items]
+
+
+def hot_items(conversation_lambda):
+    table = boto3.resource('dynamodb').Table(conversation_lambda.CONVERSATION_TABLE)
+    return table.scan()['Items']
+
+
+def test_archive_read_new_turn_rearchive_export(conversation_lambda):
+    for query in ('What is loss ratio?', 'Give me an example', 'Tell me more'):
+        store(conversation_lambda, 'chat_1', query)
+    store(conversation_lambda, 'chat_2', 'What is R-squared?')
+
+    result = archive_everything(conversation_lambda)
+    assert (result['archived_conversations'], result['archived_interactions']) == (2, 4)
+    # Only the archive markers and heads stay hot
+    assert sorted(item.get('record_type') for item in hot_items(conversation_lambda)) == \
+        ['archive', 'archive', 'head', 'head']
+    assert queries(conversation_lambda, 'chat_1') == ['What is loss ratio?', 'Give me an example', 'Tell me more']
+
+    store(conversation_lambda, 'chat_1', 'How is it calculated?')
+    assert queries(conversation_lambda, 'chat_1')[-1] == 'How is it calculated?'
+    assert len(queries(conversation_lambda, 'chat_1')) == 4
+
+    result = archive_everything(conversation_lambda)
+    assert (result['archived_conversations'], result['archived_interactions']) == (1, 1)
+    assert queries(conversation_lambda, 'chat_1') == ['What is loss ratio?', 'Give me an example', 'Tell me more',
+                                                     'How is it calculated?']
+    # Follow-ups still resolve their context from the head
+    context = conversation_lambda.get_conversation_context(USER, 'chat_1')['context']
+    assert context['concept'] == 'loss-ratio'
+    assert context['turn_count'] == 4
+
+    export = conversation_lambda.export_conversations(USER)['export']
+    body = boto3.client('s3').get_object(Bucket=export['bucket'], Key=export['key'])['Body'].read()
+    exported = [json.loads(line) for line in gzip.decompress(body).decode('utf-8').splitlines()]
+    assert export['items'] == 5
+    assert sorted(item['query'] for item in exported) == sorted([
+        'What is loss ratio?', 'Give me an example', 'Tell me more', 'How is it calculated?', 'What is R-squared?'])
+
+
+def test_archive_leaves_recent_turns_hot(conversation_lambda):
+    store(conversation_lambda, 'chat_1', 'What is loss ratio?')
+
+    result = conversation_lambda.archive_old_interactions(older_than_days=7)
+
+    assert result['archived_interactions'] == 0
+    assert queries(conversation_lambda, 'chat_1') == ['What is loss ratio?']
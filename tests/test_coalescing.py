@@ -0,0 +1,46 @@
+import json
+import threading
+import time
+
+from local_stubs import ServiceProfile, StubSageMakerRuntime
+
+
+def ask(main_lambda, query, user):
+    event = {
+        'httpMethod': 'POST',
+        'body': json.dumps({'query': query}),
+        'requestContext': {'authorizer': {'claims': {'email': user}}}
+    }
+    result = main_lambda.lambda_handler(event, None)
+    assert result['statusCode'] == 200
+    return json.loads(result['body'])
+
+
+def test_concurrent_identical_queries_share_one_inference(main_lambda):
+    main_lambda.sagemaker_runtime = StubSageMakerRuntime(ServiceProfile(latency='fixed:500'))
+    answers = []
+    askers = [threading.Thread(target=lambda user=user: answers.append(ask(main_lambda, 'What is loss ratio?', user)))
+              for user in ('first@example.com', 'second@example.com')]
+    for asker in askers:
+        asker.start()
+    for asker in askers:
+        asker.join()
+
+    assert main_lambda.sagemaker_runtime.invocations == 1
+    assert main_lambda.metrics['CoalesceLeader'] == 1
+    assert main_lambda.metrics['CoalescedRequest'] == 1
+    assert answers[0]['response'] == answers[1]['response']
+
+
+def test_follower_takes_over_an_expired_lease(main_lambda):
+    # A leader that died without publishing: its lease runs out a second from now
+    main_lambda.dynamodb.Table(main_lambda.COORDINATION_TABLE).put_item(Item={
+        'pk': 'inflight#query', 'status': 'pending', 'owner': 'dead-container', 'expires_at': int(time.time())
+    })
+    calls = []
+
+    answer, source = main_lambda.run_single_flight('query', lambda: calls.append(1) or ('answer', 'model'))
+
+    assert (answer, source) == ('answer', 'model')
+    assert calls == [1]
+    assert main_lambda.metrics['CoalesceTakeover'] == 1
@@ -0,0 +1,41 @@
+USER = 'history@example.com'
+
+
+def store(conversation_lambda, conversation_id, query, user=USER):
+    return conversation_lambda.store_conversation(user, conversation_id, query, f"Answer to {query}",
+                                                  'loss-ratio', 'underwriter')
+
+
+def read_all_summaries(conversation_lambda, limit):
+    conversations, cursor = [], None
+    while True:
+        page = conversation_lambda.get_conversation(USER, None, limit=limit, cursor=cursor, view='summary')
+        conversations.extend(page['conversations'])
+        cursor = page['next_cursor']
+        if not cursor:
+            return conversations
+
+
+def test_summary_pages_hold_each_conversation_once(conversation_lambda):
+    for turn in range(3):
+        store(conversation_lambda, 'chat_1', f"What is loss ratio {turn}")
+    store(conversation_lambda, 'b1d0c6a2-uuid-style', 'What is R-squared?')
+    store(conversation_lambda, 'chat_1', 'Tell me more')
+
+    summaries = read_all_summaries(conversation_lambda, limit=1)
+
+    assert [summary['conversation_id'] for summary in summaries] == ['chat_1', 'b1d0c6a2-uuid-style']
+    assert summaries[0]['turn_count'] == 4
+    assert summaries[0]['title'] == 'What is loss ratio 0'
+    assert summaries[1]['turn_count'] == 1
+
+
+def test_summary_of_one_conversation(conversation_lambda):
+    store(conversation_lambda, 'chat_1', 'What is loss ratio?')
+    store(conversation_lambda, 'chat_1', 'Give me an example')
+
+    page = conversation_lambda.get_conversation(USER, 'chat_1', view='summary')
+
+    assert len(page['conversations']) == 1
+    assert page['conversations'][0]['turn_count'] == 2
+    assert page['next_cursor'] is None
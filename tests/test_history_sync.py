@@ -0,0 +1,129 @@
+import json
+
+import boto3
+import pytest
+
+USER = 'sync@example.com'
+
+
+def store(conversation_lambda, conversation_id, query, concept='loss-ratio'):
+    conversation_lambda.store_conversation(USER, conversation_id, query, f"Answer to {query}", concept, 'underwriter')
+
+
+def get(conversation_lambda, etag=None, **params):
+    event = {
+        'httpMethod': 'GET',
+        'queryStringParameters': params,
+        'headers': {'If-None-Match': etag} if etag else {},
+        'requestContext': {'authorizer': {'claims': {'email': USER}}}
+    }
+    result = conversation_lambda.lambda_handler(event, None)
+    body = json.loads(result['body']) if result['body'] else None
+    return result['statusCode'], result['headers'].get('ETag'), body
+
+
+def table(conversation_lambda):
+    return boto3.resource('dynamodb').Table(conversation_lambda.CONVERSATION_TABLE)
+
+
+def test_unchanged_history_answers_304(conversation_lambda):
+    store(conversation_lambda, 'chat_1', 'What is loss ratio?')
+    status, etag, body = get(conversation_lambda, view='summary', since='')
+    assert status == 200 and etag == body['version']
+
+    assert get(conversation_lambda, etag, view='summary', since=body['synced_at'])[0] == 304
+
+    store(conversation_lambda, 'chat_1', 'Tell me more')
+    status, new_etag, _ = get(conversation_lambda, etag, view='summary', since=body['synced_at'])
+    assert status == 200 and new_etag != etag
+
+
+def test_summary_delta_returns_changes_and_live_ids(conversation_lambda):
+    store(conversation_lambda, 'chat_1', 'What is loss ratio?')
+    store(conversation_lambda, 'chat_2', 'What is R-squared?', 'r-squared')
+    _, _, first = get(conversation_lambda, view='summary', since='')
+    assert {summary['conversation_id'] for summary in first['conversations']} == {'chat_1', 'chat_2'}
+
+    store(conversation_lambda, 'chat_2', 'Tell me more', 'r-squared')
+    _, _, delta = get(conversation_lambda, view='summary', since=first['synced_at'])
+    assert [summary['conversation_id'] for summary in delta['conversations']] == ['chat_2']
+    assert delta['conversations'][0]['turn_count'] == 2
+    assert set(delta['conversation_ids']) == {'chat_1', 'chat_2'}
+
+    # An expired conversation drops out of the live ids, so clients prune it
+    table(conversation_lambda).delete_item(Key={'user_id': USER, 'conversation_id': 'HEAD#chat_1'})
+    _, _, delta = get(conversation_lambda, view='summary', since=delta['synced_at'])
+    assert delta['conversations'] == []
+    assert delta['conversation_ids'] == ['chat_2']
+
+
+def test_conversation_delta_returns_only_newer_turns(conversation_lambda):
+    store(conversation_lambda, 'chat_1', 'What is loss ratio?')
+    _, _, first = get(conversation_lambda, conversation_id='chat_1', since='')
+    assert [item['query'] for item in first['conversations']] == ['What is loss ratio?']
+
+    store(conversation_lambda, 'chat_1', 'Tell me more')
+    _, _, delta = get(conversation_lambda, conversation_id='chat_1', since=first['synced_at'])
+    assert [item['query'] for item in delta['conversations']] == ['Tell me more']
+
+
+def test_cursor_pages_skip_the_heads_query(conversation_lambda, monkeypatch):
+    for turn in range(3):
+        store(conversation_lambda, 'chat_1', f"Question {turn}")
+    _, _, first = get(conversation_lambda, conversation_id='chat_1', limit='2')
+    assert first['next_cursor']
+
+    def no_heads(*args, **kwargs):
+        raise AssertionError('heads read for a cursor page')
+
+    monkeypatch.setattr(conversation_lambda, 'load_conversation_heads', no_heads)
+    status, etag, page = get(conversation_lambda, conversation_id='chat_1', limit='2', cursor=first['next_cursor'])
+    assert status == 200 and etag is None
+    assert [item['query'] for item in page['conversations']] == ['Question 2']
+
+
+def test_head_tracks_latest_turn_and_known_concept(conversation_lambda):
+    store(conversation_lambda, 'chat_1', 'What is loss ratio for an underwriter?')
+    store(conversation_lambda, 'chat_1', 'Tell me more', concept='unknown')
+    head = table(conversation_lambda).get_item(Key={'user_id': USER, 'conversation_id': 'HEAD#chat_1'})['Item']
+    assert head['turn_count'] == 2
+    assert head['concept'] == 'loss-ratio'
+    assert head['title'] == 'What is loss ratio for an unde...'
+
+    # A late store with an older timestamp is counted but does not move the head back
+    latest = head['last_timestamp']
+    conversation_lambda.update_conversation_head(table(conversation_lambda), USER, 'chat_1', 'Late question',
+                                                 'r-squared', 'actuary', '2000-01-01T00:00:00', 0)
+    head = table(conversation_lambda).get_item(Key={'user_id': USER, 'conversation_id': 'HEAD#chat_1'})['Item']
+    assert head['turn_count'] == 3
+    assert head['last_timestamp'] == latest
+    assert head['concept'] == 'loss-ratio'
+
+
+def test_backfill_writes_missing_heads_once(conversation_lambda):
+    for index, (query, concept) in enumerate([('What is loss ratio?', 'loss-ratio'), ('Tell me more', 'unknown')]):
+        timestamp = f"2024-01-0{index + 1}T00:00:00"
+        table(conversation_lambda).put_item(Item={
+            'user_id': USER, 'conversation_id': f"legacy#{timestamp}", 'base_conversation_id': 'legacy',
+            'query': query, 'response': '...', 'concept': concept, 'audience': 'underwriter',
+            'timestamp': timestamp, 'ttl': 4102444800
+        })
+    store(conversation_lambda, 'chat_1', 'What is R-squared?', 'r-squared')
+
+    assert conversation_lambda.backfill_conversation_heads(USER)['heads_written'] == 1
+    assert conversation_lambda.backfill_conversation_heads()['heads_written'] == 0
+
+    summaries = {summary['conversation_id']: summary
+                 for summary in conversation_lambda.get_conversation(USER, None, view='summary')['conversations']}
+    assert summaries['legacy']['turn_count'] == 2
+    assert summaries['legacy']['title'] == 'What is loss ratio?'
+    assert summaries['legacy']['updated_at'] == '2024-01-02T00:00:00'
+    assert summaries['chat_1']['turn_count'] == 1
+    assert conversation_lambda.get_conversation_context(USER, 'legacy')['context']['concept'] == 'loss-ratio'
+
+
+def test_invalid_summary_cursor_is_rejected(conversation_lambda):
+    status, _, body = get(conversation_lambda, view='summary', cursor='not-a-cursor')
+    assert status == 400
+    with pytest.raises(ValueError):
+        conversation_lambda.decode_summary_cursor('W10')
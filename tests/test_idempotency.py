@@ -0,0 +1,72 @@
+import json
+import threading
+import time
+
+from local_stubs import ServiceProfile, StubSageMakerRuntime
+
+USER = 'idempotency@example.com'
+
+
+def ask(main_lambda, query, key, conversation_id='chat_idem'):
+    event = {
+        'httpMethod': 'POST',
+        'headers': {'Idempotency-Key': key},
+        'body': json.dumps({'query': query, 'conversation_id': conversation_id}),
+        'requestContext': {'authorizer': {'claims': {'email': USER}}}
+    }
+    return main_lambda.lambda_handler(event, None)
+
+
+def test_retry_replays_the_first_response(main_lambda):
+    first = ask(main_lambda, 'What is loss ratio?', 'key-1')
+    invocations = main_lambda.sagemaker_runtime.invocations
+
+    retry = ask(main_lambda, 'What is loss ratio?', 'key-1')
+
+    assert retry['statusCode'] == 200
+    assert retry['headers']['Idempotent-Replayed'] == 'true'
+    assert json.loads(retry['body']) == json.loads(first['body'])
+    assert main_lambda.sagemaker_runtime.invocations == invocations
+    assert main_lambda.conversation.stored == 1
+
+
+def test_concurrent_retry_waits_for_the_original(main_lambda):
+    slow = ServiceProfile(latency='fixed:300')
+    main_lambda.sagemaker_runtime = StubSageMakerRuntime(slow)
+    responses = []
+    original = threading.Thread(target=lambda: responses.append(ask(main_lambda, 'What is loss ratio?', 'key-2')))
+    original.start()
+    while not slow.calls:
+        time.sleep(0.01)
+
+    retry = ask(main_lambda, 'What is loss ratio?', 'key-2')
+    original.join()
+
+    assert retry['statusCode'] == 200
+    assert retry['headers']['Idempotent-Replayed'] == 'true'
+    assert json.loads(retry['body']) == json.loads(responses[0]['body'])
+    assert main_lambda.sagemaker_runtime.invocations == 1
+
+
+def test_retry_of_a_stuck_original_answers_409(main_lambda):
+    main_lambda.IDEMPOTENCY_WAIT_SECONDS = 0.5
+    key, _ = main_lambda.request_idempotency_key({'headers': {'Idempotency-Key': 'key-3'}}, {}, USER,
+                                                 'What is loss ratio?', 'chat_idem')
+    main_lambda.claim_idempotency_key(key, main_lambda.idempotent_request_hash('What is loss ratio?', 'chat_idem'))
+
+    retry = ask(main_lambda, 'What is loss ratio?', 'key-3')
+
+    assert retry['statusCode'] == 409
+    assert retry['headers']['Retry-After'] == '5'
+    assert main_lambda.sagemaker_runtime.invocations == 0
+
+
+def test_key_reused_for_another_question_is_rejected(main_lambda):
+    ask(main_lambda, 'What is loss ratio?', 'key-4')
+    invocations = main_lambda.sagemaker_runtime.invocations
+
+    reused = ask(main_lambda, 'What is R-squared?', 'key-4')
+
+    assert reused['statusCode'] == 422
+    assert main_lambda.sagemaker_runtime.invocations == invocations
+    assert main_lambda.metrics['IdempotencyKeyReused'] == 1
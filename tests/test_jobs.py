@@ -0,0 +1,90 @@
+import json
+
+from local_stubs import ServiceProfile, StubQueue, StubSageMakerRuntime
+
+USER = 'jobs@example.com'
+
+
+def enable_jobs(main_lambda):
+    main_lambda.JOB_QUEUE_URL = 'local-jobs'
+    main_lambda.JOB_RETRY_DELAY_SECONDS = 0
+    main_lambda.sqs = StubQueue()
+    return main_lambda.sqs
+
+
+def api(main_lambda, method, body=None, job_id=None):
+    event = {
+        'httpMethod': method,
+        'requestContext': {'authorizer': {'claims': {'email': USER}}}
+    }
+    if body is not None:
+        event['body'] = json.dumps(body)
+    if job_id is not None:
+        event['pathParameters'] = {'job_id': job_id}
+    result = main_lambda.lambda_handler(event, None)
+    return result['statusCode'], json.loads(result['body'])
+
+
+def run_worker(main_lambda, queue):
+    event = queue.receive_event()
+    result = main_lambda.lambda_handler(event, None)
+    queue.settle(event, result)
+    return result
+
+
+def queue_a_query(main_lambda):
+    # SageMaker throttles, so the query is deferred to the worker instead of answered with fallback text
+    main_lambda.sagemaker_runtime = StubSageMakerRuntime(ServiceProfile(throttle_rate=1.0, seed=1))
+    status, body = api(main_lambda, 'POST', {'query': 'What is loss ratio?'})
+    assert status == 202 and body['status'] == 'queued'
+    main_lambda.sagemaker_runtime = StubSageMakerRuntime()
+    return body
+
+
+def test_queued_query_is_answered_by_the_worker(main_lambda):
+    queue = enable_jobs(main_lambda)
+    queued = queue_a_query(main_lambda)
+    assert api(main_lambda, 'GET', job_id=queued['job_id'])[1]['status'] == 'queued'
+
+    assert run_worker(main_lambda, queue) == {'batchItemFailures': []}
+
+    status, job = api(main_lambda, 'GET', job_id=queued['job_id'])
+    assert status == 200 and job['status'] == 'done'
+    assert job['result']['conversation_id'] == queued['conversation_id']
+    assert main_lambda.sagemaker_runtime.invocations == 1
+    assert len(queue) == 0
+
+
+def test_busy_endpoint_defers_the_job(main_lambda):
+    queue = enable_jobs(main_lambda)
+    queued = queue_a_query(main_lambda)
+    main_lambda.ENDPOINT_CAPACITY_PER_MINUTE = 0
+
+    result = run_worker(main_lambda, queue)
+
+    assert len(result['batchItemFailures']) == 1
+    assert main_lambda.metrics['JobDeferred'] == 1
+    assert main_lambda.sagemaker_runtime.invocations == 0
+    assert len(queue) == 1
+    assert api(main_lambda, 'GET', job_id=queued['job_id'])[1]['status'] == 'queued'
+
+
+def test_job_fails_on_its_last_attempt(main_lambda, monkeypatch):
+    queue = enable_jobs(main_lambda)
+    queued = queue_a_query(main_lambda)
+    main_lambda.JOB_MAX_ATTEMPTS = 2
+
+    def broken_retrieval(*args, **kwargs):
+        raise RuntimeError('vector table unavailable')
+
+    monkeypatch.setattr(main_lambda, 'get_relevant_context_multi', broken_retrieval)
+
+    assert len(run_worker(main_lambda, queue)['batchItemFailures']) == 1
+    assert api(main_lambda, 'GET', job_id=queued['job_id'])[1]['status'] == 'queued'
+
+    assert run_worker(main_lambda, queue) == {'batchItemFailures': []}
+    status, job = api(main_lambda, 'GET', job_id=queued['job_id'])
+    assert job['status'] == 'failed'
+    assert 'vector table unavailable' in job['result']['error']
+    assert main_lambda.metrics['JobCompleted:failed'] == 1
+    assert len(queue) == 0
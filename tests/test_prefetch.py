@@ -0,0 +1,47 @@
+import json
+
+USER = 'prefetch@example.com'
+CONVERSATION = 'chat_prefetch'
+
+
+def ask(main_lambda, query):
+    event = {
+        'httpMethod': 'POST',
+        'body': json.dumps({'query': query, 'conversation_id': CONVERSATION}),
+        'requestContext': {'authorizer': {'claims': {'email': USER}}}
+    }
+    result = main_lambda.lambda_handler(event, None)
+    assert result['statusCode'] == 200
+    return json.loads(result['body'])
+
+
+def explain_with_prefetch(main_lambda):
+    main_lambda.PREFETCH_ENABLED = True
+    ask(main_lambda, 'What is loss ratio for an underwriter?')
+    main_lambda.lambda_client.join_events()
+    assert main_lambda.metrics['PrefetchGenerated'] > 0
+
+
+def test_generic_follow_up_is_served_from_prefetch(main_lambda):
+    explain_with_prefetch(main_lambda)
+    invocations = main_lambda.sagemaker_runtime.invocations
+
+    ask(main_lambda, 'Tell me more')
+
+    assert main_lambda.metrics['PrefetchHit'] == 1
+    assert main_lambda.sagemaker_runtime.invocations == invocations
+
+
+def test_intervening_turn_invalidates_prefetch(main_lambda):
+    explain_with_prefetch(main_lambda)
+    # Another turn was stored while the prefetch was still running, so it never consumed it
+    main_lambda.conversation({'action': 'store', 'user_id': USER, 'conversation_id': CONVERSATION,
+                              'query': 'How is it calculated?', 'response': '...',
+                              'concept': 'loss-ratio', 'audience': 'underwriter'})
+    invocations = main_lambda.sagemaker_runtime.invocations
+
+    ask(main_lambda, 'Tell me more')
+
+    assert main_lambda.metrics['PrefetchHit'] == 0
+    assert main_lambda.metrics['PrefetchWasted'] == main_lambda.metrics['PrefetchGenerated']
+    assert main_lambda.sagemaker_runtime.invocations > invocations
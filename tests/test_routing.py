@@ -0,0 +1,41 @@
+from botocore.exceptions import ClientError
+from local_stubs import ServiceProfile, StubSageMakerRuntime
+
+SMALL_ENDPOINT = 'local-small'
+CONTEXT = {'concept': 'loss-ratio', 'concepts': ['loss-ratio'], 'audience': 'underwriter'}
+CHUNKS = [{'item': {'concept_id': 'loss-ratio', 'text': 'Loss ratio is incurred losses divided by earned premium.'},
+           'score': 1.0}]
+
+
+class FailingSmallEndpoint(StubSageMakerRuntime):
+    """The small endpoint rejects every request with a model error"""
+
+    def invoke_endpoint(self, EndpointName, ContentType, Body, **kwargs):
+        if EndpointName == SMALL_ENDPOINT:
+            raise ClientError({'Error': {'Code': 'ModelError', 'Message': 'Received server error (500)'}},
+                              'InvokeEndpoint')
+        return super().invoke_endpoint(EndpointName, ContentType, Body, **kwargs)
+
+
+def test_small_tier_model_error_escalates_to_large(main_lambda):
+    main_lambda.MODEL_TIERS['small']['endpoint'] = SMALL_ENDPOINT
+    main_lambda.sagemaker_runtime = FailingSmallEndpoint()
+
+    answer, source = main_lambda.generate_answer('What is loss ratio?', CONTEXT, CHUNKS, tier='small')
+
+    assert source == 'model'
+    assert main_lambda.sagemaker_runtime.invocations_by_endpoint['local-stub'] == 1
+    assert main_lambda.metrics['RouteEscalated'] == 1
+
+
+def test_small_tier_throttle_does_not_saturate_the_large_endpoint(main_lambda):
+    main_lambda.MODEL_TIERS['small']['endpoint'] = SMALL_ENDPOINT
+    main_lambda.sagemaker_runtime = StubSageMakerRuntime(
+        endpoint_profiles={SMALL_ENDPOINT: ServiceProfile(throttle_rate=1.0, seed=1)})
+
+    answer, source = main_lambda.generate_answer('What is loss ratio?', CONTEXT, CHUNKS, tier='small')
+
+    assert source == 'model'
+    assert not main_lambda.endpoint_saturated()
+    # Routing passes over the throttled small tier until its cooldown ends
+    assert main_lambda.select_tier('What is loss ratio?', CONTEXT)[0] == main_lambda.DEFAULT_TIER
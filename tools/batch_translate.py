@@ -0,0 +1,237 @@
+# offline bulk translation job
+"""
+Pre-generate explanations for many (term, audience) pairs with the main
+Lambda's pipeline (concept/audience extraction, retrieval, prompt building
+and generation).
+
+Input is JSONL, one record per line:
+    {"term": "loss ratio", "audience": "executive"}
+    {"query": "How does R-squared affect pricing for underwriters?"}
+
+Output is a directory or S3 prefix of part-NNNNN.jsonl files plus a
+_checkpoint.json manifest. Each part is written once its records are done,
+so rerunning the same command resumes after the last completed part.
+
+Usage:
+    python tools/batch_translate.py --input s3://bucket/terms.jsonl --output s3://bucket/translations/
+    python tools/batch_translate.py --input terms.jsonl --output out/ --stub
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'lambda', 'main'))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'lambda', 'shared'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger('batch_translate')
+
+CHECKPOINT_NAME = '_checkpoint.json'
+
+
+def parse_s3_uri(uri):
+    """Split s3://bucket/key into (bucket, key)"""
+    bucket, _, key = uri[len('s3://'):].partition('/')
+    return bucket, key
+
+
+class OutputLocation:
+    """Local directory or S3 prefix holding part files and the checkpoint"""
+
+    def __init__(self, uri, s3_client=None):
+        self.uri = uri
+        self.s3 = s3_client
+        self.is_s3 = uri.startswith('s3://')
+        if self.is_s3:
+            self.bucket, prefix = parse_s3_uri(uri)
+            self.prefix = prefix if not prefix or prefix.endswith('/') else prefix + '/'
+        else:
+            os.makedirs(uri, exist_ok=True)
+
+    def write(self, name, text):
+        if self.is_s3:
+            self.s3.put_object(Bucket=self.bucket, Key=self.prefix + name, Body=text.encode('utf-8'))
+        else:
+            # Write-then-rename so a crash never leaves a half-written file behind
+            path = os.path.join(self.uri, name)
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(path + '.tmp', path)
+
+    def read(self, name):
+        if self.is_s3:
+            try:
+                response = self.s3.get_object(Bucket=self.bucket, Key=self.prefix + name)
+            except self.s3.exceptions.NoSuchKey:
+                return None
+            return response['Body'].read().decode('utf-8')
+
+        path = os.path.join(self.uri, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+
+
+def iter_input_lines(uri, s3_client=None):
+    """Stream input lines from a local file or S3 object without loading it whole"""
+    if uri.startswith('s3://'):
+        bucket, key = parse_s3_uri(uri)
+        body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+        for line in body.iter_lines():
+            yield line.decode('utf-8')
+    else:
+        with open(uri, encoding='utf-8') as f:
+            for line in f:
+                yield line.rstrip('\n')
+
+
+def build_query(record):
+    """Turn an input record into the natural-language query the pipeline expects"""
+    if record.get('query'):
+        return record['query']
+
+    term = record.get('term') or ''
+    audience = record.get('audience')
+    return f"Explain {term} to an insurance {audience}" if audience else f"Explain {term}"
+
+
+def translate_chunk(lambda_function, lines, first_line_number, executor, retrieval_cache):
+    """Translate one chunk of input lines, returning output records in input order"""
+    records = []  # (record, needs_translation)
+    entries = []
+    for offset, line in enumerate(lines):
+        line_number = first_line_number + offset
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError('record is not a JSON object')
+        except ValueError as e:
+            records.append(({'line': line_number, 'error': f'Invalid input record: {e}'}, False))
+            continue
+
+        record['line'] = line_number
+        records.append((record, True))
+        entries.append({'query': build_query(record), 'audience': record.get('audience')})
+
+    results = iter(lambda_function.translate_batch(entries, executor, retrieval_cache))
+
+    output = []
+    for record, needs_translation in records:
+        if needs_translation:
+            result = next(results)
+            result.pop('index', None)
+            record = {**record, **result}
+        output.append(record)
+    return output
+
+
+def run(args):
+    if args.stub:
+        # Everything stays in-process: no AWS credentials or endpoint needed
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+        os.environ['SAGEMAKER_ENDPOINT'] = 'local-stub'
+        os.environ.setdefault('VECTOR_TABLE', 'local-vector-storage')
+
+    import boto3
+    import lambda_function
+
+    if args.stub:
+        from local_stubs import StubDynamoDB, StubSageMakerRuntime
+        lambda_function.sagemaker_runtime = StubSageMakerRuntime()
+        lambda_function.dynamodb = StubDynamoDB(lambda_function.VECTOR_TABLE, seed_vectors=True)
+    elif not lambda_function.is_endpoint_configured():
+        raise SystemExit('SAGEMAKER_ENDPOINT is not configured (use --stub to run locally)')
+
+    lambda_function.logger.setLevel(logging.WARNING)
+
+    s3_client = boto3.client('s3') if args.input.startswith('s3://') or args.output.startswith('s3://') else None
+    output = OutputLocation(args.output, s3_client)
+
+    checkpoint = json.loads(output.read(CHECKPOINT_NAME) or '{}')
+    if checkpoint and checkpoint.get('input') != args.input:
+        raise SystemExit(f"{args.output} holds a checkpoint for {checkpoint.get('input')}, not {args.input}")
+
+    lines_done = checkpoint.get('lines_done', 0)
+    part_number = checkpoint.get('parts_written', 0)
+    if lines_done:
+        logger.info(f"Resuming after {lines_done} input lines ({part_number} parts already written)")
+
+    stats = {'records': 0, 'errors': 0, 'unknown_concept': 0}
+    retrieval_cache = {}
+    started = time.time()
+
+    def flush(chunk_lines, first_line_number):
+        nonlocal part_number, lines_done
+        chunk_output = translate_chunk(lambda_function, chunk_lines, first_line_number, executor, retrieval_cache)
+
+        output.write(f"part-{part_number:05d}.jsonl",
+                     ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in chunk_output))
+        part_number += 1
+        lines_done = first_line_number + len(chunk_lines) - 1
+        output.write(CHECKPOINT_NAME, json.dumps({
+            'input': args.input,
+            'lines_done': lines_done,
+            'parts_written': part_number
+        }))
+
+        stats['records'] += len(chunk_output)
+        stats['errors'] += sum(1 for record in chunk_output if 'error' in record)
+        stats['unknown_concept'] += sum(1 for record in chunk_output if record.get('concept') == 'unknown')
+        elapsed = time.time() - started
+        logger.info(f"Checkpoint {part_number}: {stats['records']} records this run, "
+                    f"{stats['records'] / elapsed:.1f} records/s")
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        chunk_lines = []
+        chunk_start = lines_done + 1
+        for line_number, line in enumerate(iter_input_lines(args.input, s3_client), start=1):
+            if line_number <= lines_done:
+                continue
+            if not chunk_lines:
+                chunk_start = line_number
+            chunk_lines.append(line)
+            if len(chunk_lines) >= args.checkpoint_every:
+                flush(chunk_lines, chunk_start)
+                chunk_lines = []
+        if chunk_lines:
+            flush(chunk_lines, chunk_start)
+
+    elapsed = time.time() - started
+    summary = {
+        **stats,
+        'lines_done': lines_done,
+        'parts_written': part_number,
+        'elapsed_seconds': round(elapsed, 2),
+        'records_per_second': round(stats['records'] / elapsed, 2) if elapsed > 0 else None,
+        'retrieval_lookups': len(retrieval_cache)
+    }
+    logger.info(f"Batch translation finished: {json.dumps(summary)}")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-generate TechTranslator explanations from JSONL')
+    parser.add_argument('--input', required=True, help='Input JSONL file path or s3://bucket/key')
+    parser.add_argument('--output', required=True, help='Output directory or s3://bucket/prefix/')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent inference calls (default: 4)')
+    parser.add_argument('--checkpoint-every', type=int, default=100,
+                        help='Input lines per output part / checkpoint (default: 100)')
+    parser.add_argument('--stub', action='store_true',
+                        help='Use the in-memory SageMaker and vector-table stand-ins')
+    args = parser.parse_args(argv)
+
+    summary = run(args)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,415 @@
+# concurrency load test for the main Lambda
+"""
+Drive the main Lambda's lambda_handler from many concurrent workers against
+the in-memory stand-ins in local_stubs, sweeping concurrency levels and
+reporting throughput with p50/p95/p99 latency per level. Runs fully offline.
+
+Each stand-in service (DynamoDB, Lambda invoke, SageMaker) gets its own
+latency distribution and throttling rate, so saturation, admission control
+and coalescing behave as they would against AWS.
+
+All workers share one imported module, i.e. one container: the answer and
+retrieval caches are cleared before each level but shared within it.
+
+With --async-jobs, queries the endpoint cannot take are queued (202) and
+worker threads drain the queue through the same handler, as the SQS event
+source mapping would; the report adds the queued share and drain time.
+With --prefetch, initial explanations trigger speculative follow-up answers
+in the background and the report adds their hit rate and wasted inference.
+
+Usage:
+    python tools/load_test.py --concurrency 1,4,16,32 --requests 200
+    python tools/load_test.py --sagemaker-throttle 0.2 --async-jobs --job-workers 2
+    python tools/load_test.py --prefetch --follow-up-ratio 0.5
+    python tools/load_test.py --save-baseline load_baseline.json
+    python tools/load_test.py --baseline load_baseline.json --tolerance 0.2
+
+No baseline is committed: latency and throughput depend on the machine, so
+record one with --save-baseline before comparing against it.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'lambda', 'main'))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'lambda', 'shared'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger('load_test')
+
+CONVERSATION_FUNCTION = 'local-conversation'
+COORDINATION_TABLE = 'local-coordination'
+SMALL_MODEL_ENDPOINT = 'local-stub-small'
+JOB_QUEUE_URL = 'local-jobs'
+MAIN_FUNCTION = 'local-main'
+JOB_DRAIN_TIMEOUT_SECONDS = 120
+
+QUERY_TEMPLATES = [
+    "What is {concept} for {audience}s?",
+    "Explain {concept} to an insurance {audience}",
+    "How does {concept} matter to an {audience}?"
+]
+FOLLOW_UPS = ["Can you give me an example?", "Tell me more", "Why does it matter?"]
+CONCEPT_NAMES = ['R-squared', 'loss ratio', 'predictive model']
+AUDIENCES = ['underwriter', 'actuary', 'executive']
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Workload:
+    """
+    Generates API Gateway events for a pool of simulated users
+
+    A repeat_ratio share of new questions comes from a small hot set that the
+    answer cache and coalescing can serve; the rest are unique. Users continue
+    their current conversation with a follow-up with probability follow_up_ratio.
+    """
+
+    def __init__(self, users, repeat_ratio, follow_up_ratio, seed=None):
+        self.users = [f"loadtest-{index}@example.com" for index in range(users)]
+        self.repeat_ratio = repeat_ratio
+        self.follow_up_ratio = follow_up_ratio
+        self.conversations = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._unique = 0
+
+    def next_event(self):
+        with self._lock:
+            user = self._random.choice(self.users)
+            conversation_id = self.conversations.get(user)
+            if conversation_id and self._random.random() < self.follow_up_ratio:
+                query = self._random.choice(FOLLOW_UPS)
+            else:
+                conversation_id = str(uuid.uuid4())
+                self.conversations[user] = conversation_id
+                query = self._random.choice(QUERY_TEMPLATES).format(
+                    concept=self._random.choice(CONCEPT_NAMES), audience=self._random.choice(AUDIENCES))
+                if self._random.random() >= self.repeat_ratio:
+                    self._unique += 1
+                    query = f"{query} (case {self._unique})"
+
+        return {
+            'httpMethod': 'POST',
+            'body': json.dumps({'query': query, 'conversation_id': conversation_id}),
+            'requestContext': {'authorizer': {'claims': {'email': user}}}
+        }
+
+
+def build_environment(args):
+    """Import the main Lambda wired to stand-ins with the configured profiles"""
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ['SAGEMAKER_ENDPOINT'] = 'local-stub'
+    os.environ.setdefault('VECTOR_TABLE', 'local-vector-storage')
+    os.environ['CONVERSATION_FUNCTION'] = CONVERSATION_FUNCTION
+    os.environ['COORDINATION_TABLE'] = COORDINATION_TABLE
+    # Model routing only has a small tier to pick when one is simulated
+    if args.small_model_latency:
+        os.environ['SMALL_MODEL_ENDPOINT'] = SMALL_MODEL_ENDPOINT
+    else:
+        os.environ.pop('SMALL_MODEL_ENDPOINT', None)
+    if args.async_jobs:
+        os.environ['JOB_QUEUE_URL'] = JOB_QUEUE_URL
+        os.environ['JOB_RETRY_DELAY_SECONDS'] = '1'
+    else:
+        os.environ.pop('JOB_QUEUE_URL', None)
+    os.environ['PREFETCH_ENABLED'] = 'true' if args.prefetch else 'false'
+    os.environ['PREFETCH_FUNCTION'] = MAIN_FUNCTION
+    os.environ['PREFETCH_BUDGET_PER_MINUTE'] = str(args.prefetch_budget)
+    # Jobs and prefetch only use the endpoint budget a run of this length leaves spare
+    if args.async_jobs or args.prefetch:
+        os.environ['ENDPOINT_CAPACITY_PER_MINUTE'] = str(args.endpoint_capacity)
+
+    import lambda_function
+    from local_stubs import (ServiceProfile, StubConversationFunction, StubDynamoDB,
+                             StubLambdaClient, StubQueue, StubSageMakerRuntime)
+
+    profiles = {
+        'dynamodb': ServiceProfile(args.dynamodb_latency, args.dynamodb_throttle, args.seed),
+        'lambda': ServiceProfile(args.lambda_latency, args.lambda_throttle, args.seed),
+        'sagemaker': ServiceProfile(args.sagemaker_latency, args.sagemaker_throttle, args.seed)
+    }
+    endpoint_profiles = {}
+    if args.small_model_latency:
+        profiles['sagemaker-small'] = ServiceProfile(args.small_model_latency, args.sagemaker_throttle, args.seed)
+        endpoint_profiles[SMALL_MODEL_ENDPOINT] = profiles['sagemaker-small']
+
+    lambda_function.dynamodb = StubDynamoDB(lambda_function.VECTOR_TABLE, seed_vectors=True,
+                                            profile=profiles['dynamodb'],
+                                            key_schemas={COORDINATION_TABLE: ('pk', None)})
+    lambda_function.lambda_client = StubLambdaClient({
+        CONVERSATION_FUNCTION: StubConversationFunction(),
+        # Prefetch invokes the main function asynchronously
+        MAIN_FUNCTION: lambda event: lambda_function.lambda_handler(event, None)
+    }, profiles['lambda'])
+    lambda_function.sagemaker_runtime = StubSageMakerRuntime(profiles['sagemaker'], endpoint_profiles)
+    lambda_function.sqs = StubQueue(visibility_timeout=5)
+
+    # Keep the Lambda's own logging and EMF output out of the report
+    logging.getLogger().setLevel(logging.CRITICAL)
+    logger.setLevel(logging.INFO)
+    return lambda_function, profiles
+
+
+def reset_container_state(lambda_function):
+    """Start every level from an empty cache, a fresh rate limiter and no saturation"""
+    lambda_function._answer_cache.clear()
+    lambda_function._retrieval_cache.clear()
+    lambda_function._user_buckets.clear()
+    lambda_function._endpoint_throttles.clear()
+    lambda_function.dynamodb.tables.pop(COORDINATION_TABLE, None)
+
+
+def drain_jobs(lambda_function, queue, stop, batch_size=5):
+    """Worker loop standing in for the SQS event source mapping"""
+    while not stop.is_set():
+        event = queue.receive_event(batch_size)
+        if event is None:
+            time.sleep(0.05)
+            continue
+        queue.settle(event, lambda_function.lambda_handler(event, None))
+
+
+def run_level(lambda_function, profiles, workload, concurrency, requests, job_workers=0, prefetch=False):
+    """Run one concurrency level and return its summary point"""
+    reset_container_state(lambda_function)
+    calls_before = {name: profile.calls for name, profile in profiles.items()}
+    throttled_before = {name: profile.throttled for name, profile in profiles.items()}
+
+    metrics = Counter()
+    metrics_lock = threading.Lock()
+
+    def record_metric(name, value=1, unit='Count', dimensions=None):
+        label = name if not dimensions else f"{name}:{','.join(str(v) for v in dimensions.values())}"
+        with metrics_lock:
+            metrics[label] += value
+
+    lambda_function.emit_metric = record_metric
+
+    def one_request(_):
+        event = workload.next_event()
+        started = time.perf_counter()
+        try:
+            result = lambda_function.lambda_handler(event, None)
+        except Exception as e:
+            return time.perf_counter() - started, 'exception', False, str(e)
+        elapsed = time.perf_counter() - started
+        body = json.loads(result.get('body') or '{}')
+        return elapsed, result.get('statusCode'), bool(body.get('degraded')), None
+
+    queue = lambda_function.sqs
+    stop = threading.Event()
+    workers = [threading.Thread(target=drain_jobs, args=(lambda_function, queue, stop), daemon=True)
+               for _ in range(job_workers)]
+    for worker in workers:
+        worker.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(one_request, range(requests)))
+    wall_time = time.perf_counter() - started
+
+    drain_started = time.perf_counter()
+    while workers and len(queue) and time.perf_counter() - drain_started < JOB_DRAIN_TIMEOUT_SECONDS:
+        time.sleep(0.1)
+    drain_time = time.perf_counter() - drain_started
+    stop.set()
+    for worker in workers:
+        worker.join()
+    lambda_function.lambda_client.join_events()
+
+    latencies_ms = sorted(outcome[0] * 1000 for outcome in outcomes)
+    errors = [outcome for outcome in outcomes if outcome[1] not in (200, 202)]
+    if errors:
+        logger.warning(f"Concurrency {concurrency}: {len(errors)} failed requests, e.g. {errors[0][1]} {errors[0][3]}")
+
+    point = {
+        'concurrency': concurrency,
+        'requests': requests,
+        'throughput_rps': round(requests / wall_time, 2),
+        'p50_ms': round(percentile(latencies_ms, 50), 1),
+        'p95_ms': round(percentile(latencies_ms, 95), 1),
+        'p99_ms': round(percentile(latencies_ms, 99), 1),
+        'mean_ms': round(sum(latencies_ms) / len(latencies_ms), 1),
+        'error_rate': round(len(errors) / requests, 4),
+        'degraded_rate': round(sum(1 for outcome in outcomes if outcome[2]) / requests, 4),
+        'inference_calls': sum(profile.calls - calls_before[name] for name, profile in profiles.items()
+                               if name.startswith('sagemaker')),
+        'throttled': {name: profile.throttled - throttled_before[name] for name, profile in profiles.items()},
+        'metrics': dict(sorted(metrics.items()))
+    }
+    if prefetch:
+        generated = sum(value for label, value in metrics.items() if label.startswith('PrefetchGenerated'))
+        hits = sum(value for label, value in metrics.items() if label.startswith('PrefetchHit'))
+        point['prefetch_generated'] = generated
+        point['prefetch_hit_rate'] = round(hits / generated, 4) if generated else 0.0
+        # Answers no turn used, including those left to expire by conversations that ended
+        point['prefetch_wasted'] = generated - hits
+    if job_workers:
+        point['queued_rate'] = round(sum(1 for outcome in outcomes if outcome[1] == 202) / requests, 4)
+        point['jobs_pending'] = len(queue)
+        point['drain_s'] = round(drain_time, 2)
+    return point
+
+
+def compare_with_baseline(points, baseline, tolerance, min_latency_delta_ms):
+    """List regressions of the current run against a stored baseline"""
+    regressions = []
+    baseline_points = {point['concurrency']: point for point in baseline.get('points', [])}
+    for point in points:
+        reference = baseline_points.get(point['concurrency'])
+        if not reference:
+            continue
+        for field in ('p50_ms', 'p95_ms', 'p99_ms'):
+            limit = reference[field] * (1 + tolerance)
+            # Tiny absolute differences on fast paths are scheduler noise, not regressions
+            if point[field] > limit and point[field] - reference[field] >= min_latency_delta_ms:
+                regressions.append(f"concurrency {point['concurrency']}: {field} {point[field]} > "
+                                   f"baseline {reference[field]} (+{tolerance:.0%})")
+        if point['throughput_rps'] < reference['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"concurrency {point['concurrency']}: throughput {point['throughput_rps']} rps < "
+                               f"baseline {reference['throughput_rps']} rps (-{tolerance:.0%})")
+        if point['error_rate'] > reference['error_rate'] + 0.01:
+            regressions.append(f"concurrency {point['concurrency']}: error rate {point['error_rate']} > "
+                               f"baseline {reference['error_rate']}")
+    return regressions
+
+
+def print_curve(points):
+    """Throughput vs latency table, one row per concurrency level"""
+    jobs = any('queued_rate' in point for point in points)
+    prefetch = any('prefetch_hit_rate' in point for point in points)
+    header = f"{'conc':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'degraded':>9} {'inference':>9}"
+    if jobs:
+        header += f" {'queued':>7} {'drain s':>8}"
+    if prefetch:
+        header += f" {'prefetched':>10} {'pf hits':>8} {'pf wasted':>9}"
+    print(header)
+    print('-' * len(header))
+    for point in points:
+        row = (f"{point['concurrency']:>5} {point['throughput_rps']:>8.1f} {point['p50_ms']:>8.1f} "
+               f"{point['p95_ms']:>8.1f} {point['p99_ms']:>8.1f} {point['error_rate']:>7.1%} "
+               f"{point['degraded_rate']:>9.1%} {point['inference_calls']:>9}")
+        if jobs:
+            row += f" {point['queued_rate']:>7.1%} {point['drain_s']:>8.1f}"
+        if prefetch:
+            row += (f" {point['prefetch_generated']:>10} {point['prefetch_hit_rate']:>8.1%} "
+                    f"{point['prefetch_wasted']:>9}")
+        print(row)
+
+
+def run(args):
+    lambda_function, profiles = build_environment(args)
+    workload = Workload(args.users, args.repeat_ratio, args.follow_up_ratio, args.seed)
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    points = []
+    for concurrency in levels:
+        logger.info(f"Running {args.requests} requests at concurrency {concurrency}")
+        points.append(run_level(lambda_function, profiles, workload, concurrency, args.requests,
+                                args.job_workers if args.async_jobs else 0, args.prefetch))
+
+    config = {
+        'requests_per_level': args.requests,
+        'users': args.users,
+        'repeat_ratio': args.repeat_ratio,
+        'follow_up_ratio': args.follow_up_ratio,
+        'profiles': {name: profile.to_dict() for name, profile in profiles.items()}
+    }
+    if args.prefetch:
+        config['prefetch'] = {'budget': args.prefetch_budget, 'endpoint_capacity': args.endpoint_capacity}
+    if args.async_jobs:
+        config['async_jobs'] = {'job_workers': args.job_workers, 'endpoint_capacity': args.endpoint_capacity}
+    report = {'config': config, 'points': points}
+
+    print_curve(points)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote results to {args.output}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Saved baseline to {args.save_baseline}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != config:
+            logger.warning('Baseline was recorded with a different configuration; comparison may be misleading')
+        regressions = compare_with_baseline(points, baseline, args.tolerance, args.min_latency_delta_ms)
+        for regression in regressions:
+            logger.error(f"REGRESSION {regression}")
+        if not regressions:
+            logger.info('No regressions against baseline')
+
+    return report, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline concurrency load test for the main TechTranslator Lambda')
+    parser.add_argument('--concurrency', default='1,4,16,32', help='Comma-separated worker counts (default: 1,4,16,32)')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per concurrency level (default: 100)')
+    parser.add_argument('--users', type=int, default=50, help='Simulated users (default: 50)')
+    parser.add_argument('--repeat-ratio', type=float, default=0.3,
+                        help='Share of new questions drawn from a small hot set (default: 0.3)')
+    parser.add_argument('--follow-up-ratio', type=float, default=0.3,
+                        help='Chance a user continues their conversation with a follow-up (default: 0.3)')
+    parser.add_argument('--dynamodb-latency', default='lognormal:6:0.5', help='DynamoDB latency spec in ms')
+    parser.add_argument('--lambda-latency', default='lognormal:20:0.4', help='Lambda invoke latency spec in ms')
+    parser.add_argument('--sagemaker-latency', default='lognormal:150:0.4', help='SageMaker latency spec in ms')
+    parser.add_argument('--small-model-latency',
+                        help='Simulate a small routing-tier endpoint with this latency spec in ms (default: off)')
+    parser.add_argument('--dynamodb-throttle', type=float, default=0.0, help='DynamoDB throttling probability')
+    parser.add_argument('--lambda-throttle', type=float, default=0.0, help='Lambda invoke throttling probability')
+    parser.add_argument('--sagemaker-throttle', type=float, default=0.0, help='SageMaker throttling probability')
+    parser.add_argument('--async-jobs', action='store_true',
+                        help='Queue queries the endpoint cannot take and drain them with job workers')
+    parser.add_argument('--job-workers', type=int, default=2, help='Job worker threads with --async-jobs (default: 2)')
+    parser.add_argument('--endpoint-capacity', type=int, default=600,
+                        help='Endpoint budget per minute shared by requests, jobs and prefetch '
+                             'with --async-jobs/--prefetch (default: 600)')
+    parser.add_argument('--prefetch', action='store_true',
+                        help='Prefetch likely follow-up answers after initial explanations')
+    parser.add_argument('--prefetch-budget', type=int, default=20,
+                        help='Speculative inferences per minute with --prefetch (default: 20)')
+    parser.add_argument('--seed', type=int, default=7, help='Random seed for workload and stand-ins (default: 7)')
+    parser.add_argument('--output', help='Write the full report as JSON')
+    parser.add_argument('--baseline', help='Compare against a report saved with --save-baseline')
+    parser.add_argument('--save-baseline', help='Save this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative slowdown before flagging a regression (default: 0.2)')
+    parser.add_argument('--min-latency-delta-ms', type=float, default=10.0,
+                        help='Ignore latency increases smaller than this (default: 10)')
+    args = parser.parse_args(argv)
+    if args.baseline and not os.path.isfile(args.baseline):
+        parser.error(f"baseline {args.baseline} not found; record one on this machine first with "
+                     f"--save-baseline {args.baseline}")
+
+    _, regressions = run(args)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,571 @@
+# local stand-ins for the AWS services used by the Lambdas
+"""
+In-memory replacements for SageMaker runtime, DynamoDB, Lambda invoke and the
+SQS job queue so the Lambda pipeline can run offline (batch jobs, load tests,
+local experiments).
+
+Swap them into an imported lambda_function module, e.g.:
+
+    lambda_function.sagemaker_runtime = StubSageMakerRuntime()
+    lambda_function.dynamodb = StubDynamoDB(seed_vectors=True)
+
+Each stand-in accepts a ServiceProfile that injects latency and throttling:
+
+    StubSageMakerRuntime(ServiceProfile('lognormal:150:0.4', throttle_rate=0.02))
+"""
+import copy
+import io
+import json
+import operator
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+
+# Small knowledge base mirroring the chunk layout written by rag-implementation.ipynb
+SEED_CONCEPTS = {
+    'r-squared': {
+        'title': 'R-squared',
+        'definition': "R-squared (R²) measures how much of the premium variation your pricing model explains. Values range from 0 (explains nothing) to 1 (perfect prediction).",
+        'context': "R-squared shows pricing model quality. High R-squared (above 0.7) indicates strong risk factor selection.",
+        'audiences': {
+            'underwriter': "R-squared tells you how well your pricing captures risk. R-squared of 0.75 means your model explains 75% of why premiums differ across policies.",
+            'actuary': "When building GLMs, R-squared helps validate model performance versus complexity trade-offs. Use adjusted R-squared when comparing models.",
+            'executive': "R-squared measures how well your pricing model works. R-squared of 0.8 means you're capturing 80% of what drives premium differences."
+        }
+    },
+    'loss-ratio': {
+        'title': 'Loss Ratio',
+        'definition': "Loss ratio is incurred losses divided by earned premiums. A 70% loss ratio means 70 cents of every premium dollar goes to claims.",
+        'context': "Loss ratio is the core profitability metric in insurance. Combined with the expense ratio it determines underwriting profit.",
+        'audiences': {
+            'underwriter': "Loss ratio tells you whether the risks you write are priced adequately. Rising loss ratios call for tighter guidelines or rate changes.",
+            'actuary': "Loss ratios drive rate indications. Develop losses to ultimate and trend them before comparing against the permissible loss ratio.",
+            'executive': "Loss ratio shows how much of revenue is consumed by claims. A 5-point improvement on a $200M book adds $10M of underwriting profit."
+        }
+    },
+    'predictive-model': {
+        'title': 'Predictive Model',
+        'definition': "A predictive model uses historical data to estimate future outcomes such as claim frequency, severity or policyholder retention.",
+        'context': "Insurers use predictive models for pricing, underwriting triage, fraud detection and claims reserving.",
+        'audiences': {
+            'underwriter': "Predictive models score each submission so you can focus review time on the risks most likely to produce losses.",
+            'actuary': "GLMs and gradient boosted models are validated with holdout data, lift charts and stability checks before filing.",
+            'executive': "Predictive models improve risk selection and pricing precision, which protects margins and supports profitable growth."
+        }
+    }
+}
+
+
+RETRIEVAL_INDEX = 'concept-retrieval-index'
+
+
+def build_seed_vector_items():
+    """Build vector-table items for the seed knowledge base"""
+    items = []
+    for concept_id, concept in SEED_CONCEPTS.items():
+        items.append({'concept_id': concept_id, 'vector_id': f"{concept_id}-definition",
+                      'title': concept['title'], 'text': concept['definition'], 'type': 'definition'})
+        items.append({'concept_id': concept_id, 'vector_id': f"{concept_id}-context",
+                      'title': concept['title'], 'text': concept['context'], 'type': 'context'})
+        for audience, text in concept['audiences'].items():
+            items.append({'concept_id': concept_id, 'vector_id': f"{concept_id}-{audience}",
+                          'title': concept['title'], 'text': text, 'type': 'audience', 'audience': audience})
+    # Same layout as retrieval_sort_key in the main Lambda
+    for item in items:
+        item['retrieval_key'] = f"{item.get('audience') or 'all'}#{item['type']}#{item['vector_id']}"
+    return items
+
+
+class ServiceProfile:
+    """
+    Latency distribution and throttling probability for one stubbed service
+
+    Latency specs, in milliseconds:
+        fixed:MS, uniform:LOW:HIGH, lognormal:MEDIAN:SIGMA, exponential:MEAN
+    """
+
+    def __init__(self, latency='fixed:0', throttle_rate=0.0, seed=None):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self._sample = self.parse_latency(latency)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+
+    @staticmethod
+    def parse_latency(spec):
+        """Turn a latency spec into a sampler returning milliseconds"""
+        kind, _, params = spec.partition(':')
+        values = [float(value) for value in params.split(':')] if params else []
+        if kind == 'fixed' and len(values) == 1:
+            return lambda rng: values[0]
+        if kind == 'uniform' and len(values) == 2:
+            return lambda rng: rng.uniform(values[0], values[1])
+        if kind == 'lognormal' and len(values) == 2:
+            return lambda rng: values[0] * rng.lognormvariate(0, values[1])
+        if kind == 'exponential' and len(values) == 1:
+            return lambda rng: rng.expovariate(1 / values[0]) if values[0] > 0 else 0
+        raise ValueError(f"Invalid latency spec: {spec}")
+
+    def apply(self, operation_name, throttle_code):
+        """Sleep for a sampled latency, then maybe raise a throttling error"""
+        with self._lock:
+            self.calls += 1
+            delay_ms = self._sample(self._random)
+            throttle = self._random.random() < self.throttle_rate
+            if throttle:
+                self.throttled += 1
+
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+        if throttle:
+            raise ClientError({'Error': {'Code': throttle_code, 'Message': 'Rate exceeded (injected)'}},
+                              operation_name)
+
+    def to_dict(self):
+        return {'latency': self.latency, 'throttle_rate': self.throttle_rate}
+
+
+class StubSageMakerRuntime:
+    """
+    Stand-in for the sagemaker-runtime client that echoes a deterministic answer
+
+    endpoint_profiles gives individual endpoints (e.g. a small routing tier)
+    their own latency/throttling; other endpoints use profile.
+    """
+
+    def __init__(self, profile=None, endpoint_profiles=None):
+        self.invocations = 0
+        self.invocations_by_endpoint = Counter()
+        self.profile = profile
+        self.endpoint_profiles = endpoint_profiles or {}
+        self._lock = threading.Lock()
+
+    def invoke_endpoint(self, EndpointName, ContentType, Body, **kwargs):
+        profile = self.endpoint_profiles.get(EndpointName, self.profile)
+        if profile:
+            profile.apply('InvokeEndpoint', 'ThrottlingException')
+        with self._lock:
+            self.invocations += 1
+            self.invocations_by_endpoint[EndpointName] += 1
+
+        payload = json.loads(Body)
+        task_line = payload.get('inputs', '').split('\n', 1)[0].replace('Task: ', '').rstrip('.')
+        generated_text = f"[stub:{EndpointName}] {task_line}. This is a locally generated placeholder explanation."
+
+        return {
+            'ContentType': 'application/json',
+            'Body': io.BytesIO(json.dumps([{'generated_text': generated_text}]).encode('utf-8'))
+        }
+
+
+def _attribute_name(operand):
+    """Name of a boto3 Key/Attr operand"""
+    return getattr(operand, 'name', operand)
+
+
+_COMPARISONS = {
+    '=': operator.eq,
+    '<>': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge
+}
+
+
+def _evaluate_clause(clause, item, values, names):
+    """Evaluate one clause of a condition string: a function call or a comparison"""
+    function = re.match(r'(attribute_exists|attribute_not_exists|begins_with)\(\s*([^,\s)]+)\s*(?:,\s*(:\w+)\s*)?\)$',
+                        clause)
+    if function:
+        function_name, name, placeholder = function.groups()
+        name = names.get(name, name)
+        if function_name == 'attribute_exists':
+            return name in item
+        if function_name == 'attribute_not_exists':
+            return name not in item
+        return str(item.get(name, '')).startswith(values[placeholder])
+
+    comparison = re.match(r'(\S+)\s*(<>|<=|>=|=|<|>)\s*(:\w+)$', clause)
+    if not comparison:
+        raise NotImplementedError(f"Unsupported condition in stub: {clause}")
+    name, comparison_operator, placeholder = comparison.groups()
+    name = names.get(name, name)
+    if name not in item:
+        return comparison_operator == '<>'
+    return _COMPARISONS[comparison_operator](item[name], values[placeholder])
+
+
+def evaluate_condition(condition, item, values=None, names=None):
+    """
+    Evaluate a boto3 condition object, or a condition string such as
+    'attribute_not_exists(pk) OR expires_at < :now' with ExpressionAttributeValues
+    and ExpressionAttributeNames, against an item
+    """
+    if condition is None:
+        return True
+
+    if isinstance(condition, str):
+        # AND binds tighter than OR; parentheses are not supported
+        return any(
+            all(_evaluate_clause(clause.strip(), item, values or {}, names or {})
+                for clause in alternative.split(' AND '))
+            for alternative in condition.split(' OR ')
+        )
+
+    expression = condition.get_expression()
+    operator = expression['operator']
+    operands = expression['values']
+
+    if operator == 'AND':
+        return all(evaluate_condition(operand, item, values) for operand in operands)
+    if operator == 'OR':
+        return any(evaluate_condition(operand, item, values) for operand in operands)
+    if operator == 'NOT':
+        return not evaluate_condition(operands[0], item, values)
+
+    name = _attribute_name(operands[0])
+    present = name in item
+    current = item.get(name)
+
+    if operator == 'attribute_exists':
+        return present
+    if operator == 'attribute_not_exists':
+        return not present
+    if operator == '<>':
+        return current != operands[1]
+    if not present:
+        return False
+    if operator == '=':
+        return current == operands[1]
+    if operator == '<':
+        return current < operands[1]
+    if operator == '<=':
+        return current <= operands[1]
+    if operator == '>':
+        return current > operands[1]
+    if operator == '>=':
+        return current >= operands[1]
+    if operator == 'BETWEEN':
+        return operands[1] <= current <= operands[2]
+    if operator == 'begins_with':
+        return str(current).startswith(operands[1])
+    if operator == 'IN':
+        return current in operands[1]
+    if operator == 'contains':
+        return operands[1] in current
+
+    raise NotImplementedError(f"Unsupported condition operator in stub: {operator}")
+
+
+class ConditionalCheckFailedException(ClientError):
+    """Raised by StubTable when a ConditionExpression does not hold"""
+
+    def __init__(self, operation_name):
+        super().__init__({'Error': {'Code': 'ConditionalCheckFailedException',
+                                    'Message': 'The conditional request failed'}}, operation_name)
+
+
+class StubTable:
+    """Minimal in-memory DynamoDB table supporting the calls the Lambdas make"""
+
+    def __init__(self, name, hash_key, range_key=None, items=None, profile=None, indexes=None):
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.indexes = indexes or {}  # index name -> sort key (same hash key, sparse)
+        self.profile = None
+        self._items = {}
+        self._lock = threading.Lock()
+        for item in items or []:
+            self.put_item(Item=item)
+        # Seed items load instantly; injected latency applies from here on
+        self.profile = profile
+
+    def _key(self, item):
+        return (item[self.hash_key], item.get(self.range_key) if self.range_key else None)
+
+    def _apply_profile(self, operation_name):
+        if self.profile:
+            self.profile.apply(operation_name, 'ProvisionedThroughputExceededException')
+
+    def _check_condition(self, operation_name, key, condition, values, names):
+        """Raise unless the condition holds for the current item; call with the lock held"""
+        if condition and not evaluate_condition(condition, self._items.get(key) or {}, values, names):
+            raise ConditionalCheckFailedException(operation_name)
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeValues=None,
+                 ExpressionAttributeNames=None, **kwargs):
+        self._apply_profile('PutItem')
+        key = self._key(Item)
+        with self._lock:
+            self._check_condition('PutItem', key, ConditionExpression,
+                                  ExpressionAttributeValues, ExpressionAttributeNames)
+            self._items[key] = copy.deepcopy(Item)
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        self._apply_profile('GetItem')
+        with self._lock:
+            item = self._items.get(self._key(Key))
+        return {'Item': copy.deepcopy(item)} if item is not None else {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeValues=None,
+                    ExpressionAttributeNames=None, **kwargs):
+        """Supports SET a = :v, ADD a :v and REMOVE a clauses"""
+        self._apply_profile('UpdateItem')
+        values = ExpressionAttributeValues or {}
+        names = ExpressionAttributeNames or {}
+        key = self._key(Key)
+        with self._lock:
+            self._check_condition('UpdateItem', key, ConditionExpression, values, names)
+            item = copy.deepcopy(self._items.get(key)) or copy.deepcopy(Key)
+            clauses = re.findall(r'(SET|ADD|REMOVE)\s+(.*?)(?=\s+(?:SET|ADD|REMOVE)\s|$)', UpdateExpression.strip())
+            for action, body in clauses:
+                for part in body.split(','):
+                    part = part.strip()
+                    if action == 'SET':
+                        name, placeholder = [token.strip() for token in part.split('=')]
+                        item[names.get(name, name)] = values[placeholder]
+                    elif action == 'ADD':
+                        name, placeholder = part.split()
+                        name = names.get(name, name)
+                        item[name] = item.get(name, 0) + values[placeholder]
+                    else:
+                        item.pop(names.get(part, part), None)
+            self._items[key] = item
+        return {}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeValues=None,
+                    ExpressionAttributeNames=None, ReturnValues='NONE', **kwargs):
+        self._apply_profile('DeleteItem')
+        key = self._key(Key)
+        with self._lock:
+            self._check_condition('DeleteItem', key, ConditionExpression,
+                                  ExpressionAttributeValues, ExpressionAttributeNames)
+            old = self._items.pop(key, None)
+        return {'Attributes': old} if ReturnValues == 'ALL_OLD' and old is not None else {}
+
+    def query(self, KeyConditionExpression, ExpressionAttributeValues=None, Limit=None,
+              ScanIndexForward=True, ExclusiveStartKey=None, FilterExpression=None, IndexName=None, **kwargs):
+        self._apply_profile('Query')
+        sort_key = self.indexes[IndexName] if IndexName else self.range_key
+        with self._lock:
+            matches = [item for item in self._items.values()
+                       if (not IndexName or sort_key in item)
+                       and evaluate_condition(KeyConditionExpression, item, ExpressionAttributeValues)]
+
+        if sort_key:
+            matches.sort(key=lambda item: item.get(sort_key), reverse=not ScanIndexForward)
+
+        if ExclusiveStartKey:
+            start = self._key(ExclusiveStartKey)
+            positions = [index for index, item in enumerate(matches) if self._key(item) == start]
+            matches = matches[positions[0] + 1:] if positions else matches
+
+        last_evaluated_key = None
+        if Limit is not None and len(matches) > Limit:
+            matches = matches[:Limit]
+            last = matches[-1]
+            last_evaluated_key = {self.hash_key: last[self.hash_key]}
+            if self.range_key:
+                last_evaluated_key[self.range_key] = last[self.range_key]
+
+        # Like DynamoDB, Limit applies before the filter
+        items = [copy.deepcopy(item) for item in matches if evaluate_condition(FilterExpression, item)]
+
+        response = {'Items': items, 'Count': len(items), 'ScannedCount': len(matches)}
+        if last_evaluated_key:
+            response['LastEvaluatedKey'] = last_evaluated_key
+        return response
+
+
+class _StubNamespace:
+    """Attribute bag used to mimic boto3's resource.meta.client.exceptions"""
+
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class StubDynamoDB:
+    """
+    Stand-in for boto3.resource('dynamodb') holding StubTables by name
+
+    key_schemas maps table names to (hash_key, range_key) for tables that do not
+    use the conversation-history schema, e.g. {'coordination': ('pk', None)}.
+    """
+
+    def __init__(self, vector_table_name=None, seed_vectors=False, profile=None, key_schemas=None):
+        self.tables = {}
+        self.profile = profile
+        self.key_schemas = key_schemas or {}
+        self.meta = _StubNamespace(client=_StubNamespace(exceptions=_StubNamespace(
+            ConditionalCheckFailedException=ConditionalCheckFailedException)))
+        if seed_vectors:
+            self.tables[vector_table_name] = StubTable(vector_table_name, 'concept_id', 'vector_id',
+                                                       build_seed_vector_items(), profile,
+                                                       indexes={RETRIEVAL_INDEX: 'retrieval_key'})
+
+    def Table(self, name):
+        if name not in self.tables:
+            # Unknown tables default to the conversation-history key schema
+            hash_key, range_key = self.key_schemas.get(name, ('user_id', 'conversation_id'))
+            self.tables[name] = StubTable(name, hash_key, range_key, profile=self.profile)
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        """Whole items for every key that exists; projections are ignored and nothing is left unprocessed"""
+        if self.profile:
+            self.profile.apply('BatchGetItem', 'ProvisionedThroughputExceededException')
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            with table._lock:
+                found = [table._items.get(table._key(key)) for key in request['Keys']]
+            responses[name] = [copy.deepcopy(item) for item in found if item is not None]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+
+class StubConversationFunction:
+    """In-memory Conversation Lambda answering the store and get_context actions"""
+
+    def __init__(self):
+        self.contexts = {}  # (user_id, conversation_id) -> context
+        self.stored = 0
+        self.idempotency_keys = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        action = event.get('action')
+        key = (event.get('user_id'), event.get('conversation_id'))
+        if action == 'store':
+            with self._lock:
+                idempotency_key = event.get('idempotency_key')
+                if idempotency_key in self.idempotency_keys:
+                    return {'statusCode': 200, 'conversation_id': event.get('conversation_id'), 'duplicate': True}
+                if idempotency_key:
+                    self.idempotency_keys.add(idempotency_key)
+                self.stored += 1
+                previous = self.contexts.get(key, {})
+                self.contexts[key] = {
+                    'concept': event.get('concept'),
+                    'audience': event.get('audience', 'general'),
+                    'timestamp': datetime.now().isoformat(),
+                    'turn_count': previous.get('turn_count', 0) + 1
+                }
+            return {'statusCode': 200, 'conversation_id': event.get('conversation_id')}
+        if action == 'get_context':
+            with self._lock:
+                context = copy.deepcopy(self.contexts.get(key))
+            return {'statusCode': 200, 'context': context}
+        return {'statusCode': 400, 'body': json.dumps({'error': f"Unknown action: {action}"})}
+
+
+class StubLambdaClient:
+    """Stand-in for the lambda client dispatching invocations to in-process handlers"""
+
+    def __init__(self, handlers, profile=None):
+        self.handlers = handlers  # function name -> callable(event) returning a dict
+        self.profile = profile
+        self._events = []  # threads running asynchronous ('Event') invocations
+
+    def invoke(self, FunctionName, Payload, InvocationType='RequestResponse', **kwargs):
+        if self.profile:
+            self.profile.apply('Invoke', 'TooManyRequestsException')
+
+        handler = self.handlers.get(FunctionName)
+        if handler is None:
+            raise ClientError({'Error': {'Code': 'ResourceNotFoundException',
+                                         'Message': f"Function not found: {FunctionName}"}}, 'Invoke')
+
+        if InvocationType == 'Event':
+            # Like Lambda, return at once and run the invocation in the background
+            thread = threading.Thread(target=handler, args=(json.loads(Payload),), daemon=True)
+            thread.start()
+            self._events.append(thread)
+            return {'StatusCode': 202, 'Payload': io.BytesIO(b'')}
+        result = handler(json.loads(Payload))
+        return {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(result, default=str).encode('utf-8'))}
+
+    def join_events(self, timeout=None):
+        """Wait for the asynchronous invocations started so far"""
+        while self._events:
+            self._events.pop().join(timeout)
+
+
+class StubQueue:
+    """
+    In-memory stand-in for the sqs client and the SQS event source mapping
+
+    receive_event() hands out visible messages as a Lambda SQS event and hides
+    them for visibility_timeout seconds; settle() deletes the ones the handler
+    did not report as batchItemFailures, like the event source mapping does.
+    """
+
+    def __init__(self, visibility_timeout=30, profile=None):
+        self.visibility_timeout = visibility_timeout
+        self.profile = profile
+        self.sent = 0
+        self.deleted = 0
+        self._messages = {}  # message id -> {'body', 'receive_count', 'visible_at'}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._messages)
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        if self.profile:
+            self.profile.apply('SendMessage', 'ThrottlingException')
+        with self._lock:
+            self._next_id += 1
+            message_id = f"msg-{self._next_id}"
+            self._messages[message_id] = {'body': MessageBody, 'receive_count': 0, 'visible_at': 0.0}
+            self.sent += 1
+        return {'MessageId': message_id}
+
+    def change_message_visibility(self, QueueUrl, ReceiptHandle, VisibilityTimeout, **kwargs):
+        with self._lock:
+            if ReceiptHandle in self._messages:
+                self._messages[ReceiptHandle]['visible_at'] = time.time() + VisibilityTimeout
+
+    def delete_message(self, QueueUrl, ReceiptHandle, **kwargs):
+        with self._lock:
+            if self._messages.pop(ReceiptHandle, None) is not None:
+                self.deleted += 1
+
+    def receive_event(self, batch_size=10):
+        """A Lambda SQS event with up to batch_size visible messages, or None"""
+        now = time.time()
+        records = []
+        with self._lock:
+            for message_id, message in self._messages.items():
+                if message['visible_at'] > now:
+                    continue
+                message['receive_count'] += 1
+                message['visible_at'] = now + self.visibility_timeout
+                records.append({
+                    'messageId': message_id,
+                    'receiptHandle': message_id,
+                    'body': message['body'],
+                    'attributes': {'ApproximateReceiveCount': str(message['receive_count'])},
+                    'eventSource': 'aws:sqs'
+                })
+                if len(records) == batch_size:
+                    break
+        return {'Records': records} if records else None
+
+    def settle(self, event, result):
+        """Delete the event's messages except the reported batch item failures"""
+        failed = {failure['itemIdentifier'] for failure in (result or {}).get('batchItemFailures', [])}
+        for record in event['Records']:
+            if record['messageId'] not in failed:
+                self.delete_message(None, record['receiptHandle'])
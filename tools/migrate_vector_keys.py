@@ -0,0 +1,92 @@
+# vector table retrieval-key backfill
+"""
+Add the retrieval_key attribute that the concept-retrieval-index GSI is keyed
+on to vector-table rows written before the index existed. The main Lambda
+reads context with begins_with queries on that index and only falls back to
+the unindexed concept query for rows this tool has not reached yet.
+
+Safe to rerun: rows whose key is already correct are skipped, and each update
+is conditional on the row still existing.
+
+Usage:
+    python tools/migrate_vector_keys.py --table tech-translator-dynamodb-vector-storage --dry-run
+    python tools/migrate_vector_keys.py --table tech-translator-dynamodb-vector-storage
+"""
+import argparse
+import logging
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'lambda', 'main'))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'lambda', 'shared'))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger('migrate_vector_keys')
+
+# Only the key inputs are read; embeddings stay on the server
+SCAN_PROJECTION = 'concept_id, vector_id, #type, audience, retrieval_key'
+
+
+def iter_rows(table):
+    """Scan the table's key attributes page by page"""
+    scan_kwargs = {'ProjectionExpression': SCAN_PROJECTION, 'ExpressionAttributeNames': {'#type': 'type'}}
+    while True:
+        page = table.scan(**scan_kwargs)
+        yield from page.get('Items', [])
+        if 'LastEvaluatedKey' not in page:
+            return
+        scan_kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+
+def migrate(table, retrieval_sort_key, dry_run=False):
+    """Set retrieval_key where it is missing or stale; returns counts"""
+    counts = {'scanned': 0, 'updated': 0, 'skipped': 0, 'untyped': 0}
+    for row in iter_rows(table):
+        counts['scanned'] += 1
+        if not row.get('type'):
+            # Without a type the row cannot be placed in the index; it stays reachable via the fallback
+            counts['untyped'] += 1
+            logger.warning(f"No type on {row['concept_id']}/{row['vector_id']}, leaving it unindexed")
+            continue
+
+        key = retrieval_sort_key(row)
+        if row.get('retrieval_key') == key:
+            counts['skipped'] += 1
+            continue
+
+        counts['updated'] += 1
+        if dry_run:
+            logger.info(f"Would set {row['concept_id']}/{row['vector_id']} -> {key}")
+            continue
+        try:
+            table.update_item(
+                Key={'concept_id': row['concept_id'], 'vector_id': row['vector_id']},
+                UpdateExpression='SET retrieval_key = :key',
+                ConditionExpression='attribute_exists(vector_id)',
+                ExpressionAttributeValues={':key': key}
+            )
+        except table.meta.client.exceptions.ConditionalCheckFailedException:
+            # Deleted by a re-ingestion while we were scanning
+            counts['updated'] -= 1
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backfill retrieval_key on TechTranslator vector-table rows')
+    parser.add_argument('--table', required=True, help='Vector table to migrate')
+    parser.add_argument('--dry-run', action='store_true', help='Report the changes without writing them')
+    args = parser.parse_args(argv)
+
+    import boto3
+    os.environ.setdefault('VECTOR_TABLE', args.table)
+    from lambda_function import retrieval_sort_key
+
+    counts = migrate(boto3.resource('dynamodb').Table(args.table), retrieval_sort_key, args.dry_run)
+    logger.info(f"{'Dry run: ' if args.dry_run else ''}scanned {counts['scanned']}, "
+                f"{'would update' if args.dry_run else 'updated'} {counts['updated']}, "
+                f"already current {counts['skipped']}, without type {counts['untyped']}")
+
+
+if __name__ == '__main__':
+    main()